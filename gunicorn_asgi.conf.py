@@ -0,0 +1,32 @@
+# gunicorn_asgi.conf.py
+#
+# تشغيل المشروع تحت ASGI بعمال uvicorn:
+#     gunicorn myproject.asgi:application -c gunicorn_asgi.conf.py
+#
+# كل الإعدادات قابلة للتغيير من متغيرات البيئة.
+
+import multiprocessing
+import os
+
+bind               = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers            = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class       = 'uvicorn.workers.UvicornWorker'
+# عامل async واحد يخدم آلاف الاتصالات المفتوحة من الأجهزة
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+keepalive          = int(os.environ.get('GUNICORN_KEEPALIVE', 30))
+timeout            = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout   = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+accesslog          = os.environ.get('GUNICORN_ACCESSLOG', '-')
+
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=myproject.settings',
+    'PTPAY_ASYNC_DEVICE_ENDPOINTS=1',
+]
+
+
+def post_worker_init(worker):
+    # بعد ما العامل حمّل التطبيق (django.setup) وقبل أول طلب: كاش المسارات والمحطات
+    # وحالة المناطق (payments/warmup.py). PTPAY_WARMUP=0 يقفله.
+    if os.environ.get('PTPAY_WARMUP', '1') == '1':
+        from payments.warmup import warm_up
+        warm_up()
@@ -0,0 +1,32 @@
+# gunicorn_wsgi.conf.py
+#
+# تشغيل المشروع تحت WSGI بعمال threads (gthread):
+#     gunicorn myproject.wsgi:application -c gunicorn_wsgi.conf.py
+#
+# كل الإعدادات قابلة للتغيير من متغيرات البيئة.
+
+import multiprocessing
+import os
+
+bind             = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers          = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class     = 'gthread'
+threads          = int(os.environ.get('GUNICORN_THREADS', 8))
+keepalive        = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout          = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+accesslog        = os.environ.get('GUNICORN_ACCESSLOG', '-')
+
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=myproject.settings',
+    # سعة الـ load shedding = الطلبات الجارية اللي العامل يقدر يشيلها = threads
+    f'PTPAY_LOAD_SHED_WSGI_THREADS={threads}',
+]
+
+
+def post_worker_init(worker):
+    # نفس تسخين gunicorn_asgi.conf.py: بعد django.setup وقبل أول طلب (payments/warmup.py).
+    # PTPAY_WARMUP=0 يقفله.
+    if os.environ.get('PTPAY_WARMUP', '1') == '1':
+        from payments.warmup import warm_up
+        warm_up()
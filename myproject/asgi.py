@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Run with uvicorn workers under gunicorn:
+    gunicorn myproject.asgi:application -c gunicorn_asgi.conf.py
 """
 
 import os
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# تحت ASGI استخدم النسخ الـ async من endpoints الأجهزة (payments/async_views.py)
+os.environ.setdefault('PTPAY_ASYNC_DEVICE_ENDPOINTS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,617 @@
+# myproject/middleware.py
+
+"""
+قياس أداء كل طلب على مستوى الـ view:
+  - histogram للـ latency وعدد استعلامات الـ DB لكل (view, method)
+  - مجموع زمن الاستعلامات وحجم الـ response
+  - كاشف للطلبات البطيئة و N+1 (نفس SQL template بيتكرر) حسب حدود PERF_* في settings
+
+القيم في الذاكرة لكل process وتتعرض بصيغة Prometheus على /metrics/،
+وكل طلب يتسجّل سطر JSON في logger 'ptpay.perf' (RotatingFileHandler في settings).
+
+و LoadSheddingMiddleware: لما الـ worker يتشبّع يرفض الأقل أولوية الأول
+(تاريخ وتقارير ← telemetry ← تحكم الرحلات) ويسيب مساحة لتحصيل الأجرة.
+
+و CompressionMiddleware: gzip (أو brotli لو متسطب) للردود الأكبر من COMPRESSION_MIN_BYTES.
+"""
+
+import asyncio
+import bisect
+import contextvars
+import fnmatch
+import functools
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger      = logging.getLogger('ptpay.perf')
+shed_logger = logging.getLogger('ptpay.loadshed')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS   = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ============================
+# Registry (لكل process)
+# ============================
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts  = [0] * (len(buckets) + 1)   # آخر خانة = +Inf
+        self.total   = 0.0
+        self.count   = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self.latency    = {}          # (view, method) -> _Histogram
+        self.queries    = {}          # (view, method) -> _Histogram
+        self.requests   = Counter()   # (view, method, status) -> n
+        self.query_time = Counter()   # (view, method) -> seconds
+        self.bytes_out  = Counter()   # (view, method) -> bytes
+        self.slow       = Counter()   # (view, method) -> n
+        self.n_plus_one = Counter()   # (view, method) -> n
+        self.shed       = Counter()   # (priority class,) -> n
+        self.in_flight  = {}          # (priority class,) -> n (gauge)
+
+    def record(self, key, status, seconds, n_queries, query_seconds, size, slow, n_plus_one):
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = _Histogram(LATENCY_BUCKETS)
+                self.queries[key] = _Histogram(QUERY_BUCKETS)
+            self.latency[key].observe(seconds)
+            self.queries[key].observe(n_queries)
+            self.requests[key + (str(status),)] += 1
+            self.query_time[key] += query_seconds
+            self.bytes_out[key]  += size
+            if slow:
+                self.slow[key] += 1
+            if n_plus_one:
+                self.n_plus_one[key] += 1
+
+    # ---------- Prometheus text format ----------
+    def render(self):
+        with self._lock:
+            lines = []
+            self._histogram(lines, 'ptpay_request_duration_seconds', 'Request latency per view.', self.latency)
+            self._histogram(lines, 'ptpay_request_db_queries', 'DB queries per request per view.', self.queries)
+            self._counter(lines, 'ptpay_requests_total', 'Requests per view and status.',
+                          self.requests, ('view', 'method', 'status'))
+            self._counter(lines, 'ptpay_db_query_seconds_total', 'Time spent in DB queries per view.',
+                          self.query_time)
+            self._counter(lines, 'ptpay_response_bytes_total', 'Response body bytes per view.', self.bytes_out)
+            self._counter(lines, 'ptpay_slow_requests_total', 'Requests over PERF_SLOW_REQUEST_MS.', self.slow)
+            self._counter(lines, 'ptpay_n_plus_one_requests_total',
+                          'Requests that repeated one SQL statement PERF_N_PLUS_ONE_THRESHOLD+ times.',
+                          self.n_plus_one)
+            self._counter(lines, 'ptpay_shed_requests_total', 'Requests rejected by load shedding per class.',
+                          self.shed, ('class',))
+            lines += ['# HELP ptpay_in_flight_requests Requests in progress per priority class.',
+                      '# TYPE ptpay_in_flight_requests gauge']
+            for key, value in sorted(self.in_flight.items()):
+                lines.append(f'ptpay_in_flight_requests{self._labels(("class",), key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def record_shed(self, priority):
+        with self._lock:
+            self.shed[(priority,)] += 1
+
+    def set_in_flight(self, counts):
+        with self._lock:
+            self.in_flight = {(priority,): n for priority, n in counts.items()}
+
+    @staticmethod
+    def _labels(names, values, extra=''):
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}'
+
+    def _histogram(self, lines, name, help_text, data):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key, hist in sorted(data.items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                cumulative += count
+                le = self._labels(('view', 'method'), key, f'le="{bound}"')
+                lines.append(f'{name}_bucket{le} {cumulative}')
+            labels = self._labels(('view', 'method'), key)
+            lines.append(f'{name}_sum{labels} {hist.total:.6f}')
+            lines.append(f'{name}_count{labels} {hist.count}')
+
+    def _counter(self, lines, name, help_text, data, names=('view', 'method')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, value in sorted(data.items()):
+            lines.append(f'{name}{self._labels(names, key)} {value:g}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+# ============================
+# Middleware
+# ============================
+class _QueryRecorder:
+    """يعدّ الاستعلامات ويجمع زمنها، ويعدّ كل SQL template (بدون params)."""
+    def __init__(self):
+        self.count     = 0
+        self.seconds   = 0.0
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count   += 1
+            self.seconds += time.perf_counter() - start
+            self.templates[sql] += 1
+
+
+# الـ recorder بتاع الطلب الحالي في contextvar مش execute_wrapper على اتصالات الـ thread:
+# تحت ASGI استعلامات الـ view (sync_to_async) بتشتغل في thread غير اللي بدأ الطلب،
+# والـ contextvars بتتنقل معاها
+_recorder = contextvars.ContextVar('ptpay_query_recorder', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_counter(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install_query_counter():
+    """_count_query على كل اتصال: الجديدة من connection_created، والمفتوحة في الـ thread ده دلوقتي."""
+    connection_created.connect(_install_counter, dispatch_uid='ptpay.perf.count_query')
+    for connection in connections.all(initialized_only=True):
+        _install_counter(connection)
+
+
+class _ObservedStream:
+    """iterator بيعدّ البايتات، و close() (من response.close()) ينادي callback(bytes) مرة واحدة."""
+    def __init__(self, content, callback):
+        self.content  = content
+        self.callback = callback
+        self.size     = 0
+        self.closed   = False
+
+    def __iter__(self):
+        for chunk in self.content:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.callback(self.size)
+
+
+class _AsyncObservedStream(_ObservedStream):
+    __iter__ = None   # StreamingHttpResponse يعرف إنه async من إن iter() بيفشل
+
+    async def __aiter__(self):
+        async for chunk in self.content:
+            self.size += len(chunk)
+            yield chunk
+
+
+def on_stream_end(response, callback):
+    """
+    StreamingHttpResponse: الـ view لسه ما قرتش حاجة لما الـ middleware يرجع، الاستعلامات
+    والزمن بيحصلوا وقت ما السيرفر يلف على الـ body. نلف الـ iterator (sync أو async)
+    و callback(bytes) تتنادى لما الـ server يقفل الـ response: بعد آخر chunk أو لما العميل يقطع،
+    حتى لو الـ body ما اتقراش خالص.
+    """
+    wrapper = _AsyncObservedStream if response.is_async else _ObservedStream
+    response.streaming_content = wrapper(response.streaming_content, callback)
+    return response
+
+
+class PerformanceMiddleware:
+    """
+    يُضاف في أول MIDDLEWARE عشان يقيس الطلب كله، sync (WSGI) أو async (ASGI) من غير
+    ما Django يلف باقي السلسلة في sync_to_async. الردود الـ streaming (export) تتقاس
+    لحد ما الـ body يخلص. PERF_METRICS_ENABLED=False يعطّله بالكامل.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled      = _setting('PERF_METRICS_ENABLED', True)
+        self.async_mode   = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if self.enabled:
+            install_query_counter()
+
+    def _skip(self, request):
+        return not self.enabled or request.path == _setting('PERF_METRICS_PATH', '/metrics/')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self._skip(request):
+            return self.get_response(request)
+
+        recorder = _QueryRecorder()
+        token    = _recorder.set(recorder)
+        start    = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _recorder.reset(token)
+            raise
+        return self._finish(request, response, start, recorder, token)
+
+    async def __acall__(self, request):
+        if self._skip(request):
+            return await self.get_response(request)
+
+        recorder = _QueryRecorder()
+        token    = _recorder.set(recorder)
+        start    = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _recorder.reset(token)
+            raise
+        return self._finish(request, response, start, recorder, token)
+
+    def _finish(self, request, response, start, recorder, token):
+        if not response.streaming:
+            _recorder.reset(token)
+            self._record(request, response, time.perf_counter() - start, recorder, len(response.content))
+            return response
+
+        # الـ recorder يفضل شغال لحد آخر chunk (الـ set(None) بدل reset: ممكن نكون في context تاني)
+        def done(size):
+            _recorder.set(None)
+            self._record(request, response, time.perf_counter() - start, recorder, size)
+        return on_stream_end(response, done)
+
+    def _record(self, request, response, seconds, recorder, size):
+        match = getattr(request, 'resolver_match', None)
+        view  = (match.view_name or match._func_path) if match else 'unmatched'
+        key   = (view, request.method)
+
+        slow_ms   = _setting('PERF_SLOW_REQUEST_MS', 500)
+        max_q     = _setting('PERF_MAX_QUERIES', 50)
+        repeat_at = _setting('PERF_N_PLUS_ONE_THRESHOLD', 10)
+
+        repeated = [(sql, n) for sql, n in recorder.templates.most_common(3) if n >= repeat_at]
+        slow     = seconds * 1000 >= slow_ms or recorder.count > max_q
+
+        registry.record(key, response.status_code, seconds, recorder.count,
+                        recorder.seconds, size, slow, bool(repeated))
+
+        entry = {
+            'view':     view,
+            'method':   request.method,
+            'path':     request.path,
+            'status':   response.status_code,
+            'ms':       round(seconds * 1000, 2),
+            'queries':  recorder.count,
+            'db_ms':    round(recorder.seconds * 1000, 2),
+            'bytes':    size,
+        }
+        if slow or repeated:
+            entry['slow']       = slow
+            entry['repeated']   = [{'sql': sql[:200], 'count': n} for sql, n in repeated]
+            logger.warning(json.dumps(entry, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+# ============================
+# Load shedding
+# ============================
+# LOAD_SHED_CAPACITY الافتراضي تحت ASGI (اتصالات جارية لكل worker)
+ASYNC_CAPACITY = 64
+
+
+class _Gate:
+    """
+    عدّاد الطلبات الجارية لكل فئة في الـ process. الفئة تدخل لو:
+      - إجمالي الجاري < LOAD_SHED_CAPACITY × نصيب الفئة (الأقل أولوية نصيبها أصغر
+        فبتترفض الأول وتسيب الباقي للأعلى)
+      - وجاري الفئة نفسها < حدها (0 = من غير حد)
+    """
+    def __init__(self):
+        self.counts = Counter()
+        self.total  = 0
+        self._cond  = threading.Condition()
+
+    def _admits(self, priority, rule, capacity):
+        return (self.total < capacity * rule['share']
+                and (not rule['max_in_flight'] or self.counts[priority] < rule['max_in_flight']))
+
+    def enter(self, priority, rule, capacity):
+        """True لو الطلب دخل. defer_ms > 0: يستنى مكان بدل الرفض الفوري."""
+        deadline = time.monotonic() + rule.get('defer_ms', 0) / 1000.0
+        with self._cond:
+            while not self._admits(priority, rule, capacity):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._admit(priority)
+        return True
+
+    async def aenter(self, priority, rule, capacity):
+        """enter() من غير ما نقفل الـ event loop: نجرب، ولو مفيش مكان نستنى بـ asyncio.sleep لحد defer_ms."""
+        deadline = time.monotonic() + rule.get('defer_ms', 0) / 1000.0
+        while True:
+            with self._cond:
+                if self._admits(priority, rule, capacity):
+                    self._admit(priority)
+                    return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, 0.005))
+
+    def _admit(self, priority):
+        self.counts[priority] += 1
+        self.total            += 1
+        registry.set_in_flight(self.counts)
+
+    def leave(self, priority):
+        with self._cond:
+            self.counts[priority] -= 1
+            self.total            -= 1
+            registry.set_in_flight(self.counts)
+            self._cond.notify_all()
+
+
+gate = _Gate()
+
+
+def classify(view_name):
+    """فئة الأولوية للـ url name من LOAD_SHED_VIEWS (fnmatch)، وإلا 'default'."""
+    for priority, patterns in _setting('LOAD_SHED_VIEWS', {}).items():
+        if any(fnmatch.fnmatchcase(view_name, pattern) for pattern in patterns):
+            return priority
+    return 'default'
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_once(message):
+    # مرة لكل process مهما اتعمل handler جديد (test client، runserver reload)
+    shed_logger.warning(message)
+
+
+class LoadSheddingMiddleware:
+    """
+    بعد PerformanceMiddleware (الـ 503 يبان في المقاييس) وقبل أي middleware بيلمس الـ DB.
+    القرار في process_view لأن الفئة من الـ url name. LOAD_SHED_CAPACITY = 0 يعطّله.
+    sync أو async: تحت ASGI الانتظار (defer_ms) بـ asyncio.sleep مش بيقفل الـ event loop.
+    تحت WSGI الجاري عمره ما يعدّي عدد threads الـ worker (LOAD_SHED_WSGI_THREADS)، فالسعة
+    بتتقص عليه (وهي الافتراضي)، و thread واحد = مفيش shedding خالص؛ التحذير وقت الإقلاع
+    بس لو LOAD_SHED_CAPACITY متحددة وده حصل.
+    الطلب يسيب مكانه لما الرد يخلص، والـ streaming (export) لما آخر chunk يطلع.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode   = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django بيلف process_view الـ sync في sync_to_async؛ الـ async بتتنادى على طول
+            self.process_view = self._aprocess_view
+        else:
+            self._warn_sync_capacity()
+
+    def _warn_sync_capacity(self):
+        # بس لو السعة متحددة صراحة ومش هتتطبق: الافتراضي هو عدد الـ threads من غير تحذير
+        capacity = _setting('LOAD_SHED_CAPACITY', None)
+        threads  = _setting('LOAD_SHED_WSGI_THREADS', 1)
+        if not capacity:
+            return
+        if threads <= 1:
+            _warn_once("load shedding is inactive: a single-threaded WSGI worker never has another request "
+                       "in flight. Run threaded workers (gunicorn --threads N, PTPAY_LOAD_SHED_WSGI_THREADS=N) "
+                       "or the ASGI server.")
+        elif capacity > threads:
+            _warn_once(f"LOAD_SHED_CAPACITY={capacity} capped to the worker's {threads} threads "
+                       "(PTPAY_LOAD_SHED_WSGI_THREADS).")
+
+    def _capacity(self):
+        capacity = _setting('LOAD_SHED_CAPACITY', None)
+        if self.async_mode:
+            return ASYNC_CAPACITY if capacity is None else capacity
+        threads = _setting('LOAD_SHED_WSGI_THREADS', 1)
+        return threads if capacity is None else min(capacity, threads)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._leave(request)
+            raise
+        return self._release(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._leave(request)
+            raise
+        return self._release(request, response)
+
+    def _release(self, request, response):
+        if getattr(request, '_shed_priority', None) is None:
+            return response
+        if response.streaming:
+            return on_stream_end(response, lambda size: self._leave(request))
+        self._leave(request)
+        return response
+
+    @staticmethod
+    def _leave(request):
+        priority = getattr(request, '_shed_priority', None)
+        if priority is not None:
+            request._shed_priority = None
+            gate.leave(priority)
+
+    def _rule(self, request):
+        """(priority, rule, capacity) للطلب، أو None لو مش محكوم."""
+        capacity = self._capacity()
+        if not capacity:
+            return None
+        match    = request.resolver_match
+        priority = classify(match.view_name if match and match.view_name else '')
+        rule     = _setting('LOAD_SHED_CLASSES', {}).get(priority)
+        if rule is None:
+            return None
+        return priority, rule, capacity
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        ruled = self._rule(request)
+        if ruled is None:
+            return None
+        if gate.enter(*ruled):
+            request._shed_priority = ruled[0]
+            return None
+        return self._reject(*ruled[:2])
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ruled = self._rule(request)
+        if ruled is None:
+            return None
+        if await gate.aenter(*ruled):
+            request._shed_priority = ruled[0]
+            return None
+        return self._reject(*ruled[:2])
+
+    @staticmethod
+    def _reject(priority, rule):
+        registry.record_shed(priority)
+        response = HttpResponse(
+            json.dumps({'detail': 'Server is busy, retry later.'}),
+            content_type='application/json', status=503,
+        )
+        response['Retry-After'] = str(rule.get('retry_after', 1))
+        return response
+
+
+# ============================
+# Compression
+# ============================
+_accepts_br = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware بتاع Django بحد أدنى للحجم من settings بدل 200 بايت:
+      - الردود الأصغر من COMPRESSION_MIN_BYTES (0 يعطّله) تطلع زي ما هي، الضغط مش مستاهل
+      - بس الأنواع في COMPRESSION_TYPES (JSON / نص)، والصور و wire.py الثنائي لأ
+      - views في COMPRESSION_SKIP_VIEWS (ردود فيها tokens) ما تتضغطش: BREACH
+      - brotli لو الموديول متسطب والعميل باعت Accept-Encoding: br، وإلا gzip
+    بعد PerformanceMiddleware: ptpay_response_bytes_total بيعدّ البايتات المضغوطة.
+    تحت ASGI الردود اللي مش هتتضغط ترجع من غير ما تعدّي على thread، والضغط نفسه
+    في thread pool مش في الـ event loop ولا في الـ thread بتاع الـ views.
+    """
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if not self._compressible(request, response):
+            return response
+        if response.streaming:
+            # الضغط بيحصل وقت الـ iteration؛ هنا بس بنلف الـ iterator
+            return self._compress(request, response)
+        return await sync_to_async(self._compress, thread_sensitive=False)(request, response)
+
+    def process_response(self, request, response):
+        if not self._compressible(request, response):
+            return response
+        return self._compress(request, response)
+
+    def _compressible(self, request, response):
+        min_bytes = _setting('COMPRESSION_MIN_BYTES', 0)
+        if not min_bytes or response.has_header('Content-Encoding'):
+            return False
+        if not response.streaming and len(response.content) < min_bytes:
+            return False
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if not any(fnmatch.fnmatch(content_type, p) for p in _setting('COMPRESSION_TYPES', ())):
+            return False
+        match = getattr(request, 'resolver_match', None)
+        view  = match.view_name if match and match.view_name else ''
+        return not any(fnmatch.fnmatch(view, p) for p in _setting('COMPRESSION_SKIP_VIEWS', ()))
+
+    def _compress(self, request, response):
+        if (brotli is not None and not response.streaming
+                and _accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return self._brotli(response)
+        return super().process_response(request, response)
+
+    def _brotli(self, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=_setting('COMPRESSION_BROTLI_QUALITY', 4))
+        if len(compressed) >= len(response.content):
+            return response
+        response.content                   = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics/ بصيغة Prometheus: Authorization: Bearer <PERF_METRICS_TOKEN> للـ scraper،
+    أو session لمستخدم staff. غير كده 403، حتى لو التوكن مش متحدد.
+    """
+    token  = _setting('PERF_METRICS_TOKEN', '')
+    bearer = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(bearer.encode(), f'Bearer {token}'.encode())):
+        user = getattr(request, 'user', None)
+        if not (user and user.is_staff):
+            return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
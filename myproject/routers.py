@@ -0,0 +1,273 @@
+# myproject/routers.py
+
+"""
+توجيه القراءة التقيلة (سجلّات الدفع، القوائم، changelists الـ admin) لـ replica
+بعيد عن مسار الكتابة، مع read-your-writes: العميل اللي لسه كاتب حاجة يقرأ من
+الـ primary لمدة READ_REPLICA_STICKY_SECONDS (أقصى تأخير متوقع للـ replica).
+
+- ReplicaRouter في DATABASE_ROUTERS: القراءة تروح للـ alias المحدد في الـ context
+  الحالي وإلا للـ default، والكتابة دايمًا للـ default.
+- ReplicaRoutingMiddleware يحدد الـ alias لكل طلب GET/HEAD على view في READ_REPLICA_VIEWS.
+- use_replica() / use_primary() لأي كود تاني (أوامر، تقارير).
+
+وتقسيم أفقي بالمحافظة (ShardRouter): كل shard قاعدة بيانات كاملة لتطبيق payments
+(عملاء، محافظ، رحلات، مدفوعات ...) لمحافظة أو أكثر، والـ default فيه دليل الـ shards
+(ShardDirectory) وباقي تطبيقات Django. الـ shard الحالي في context (use_shard)
+بيحدده ShardRoutingMiddleware (payments/sharding.py) من مفاتيح الطلب.
+"""
+
+import fnmatch
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .middleware import on_stream_end
+
+_read_alias  = ContextVar('read_alias', default=None)
+_shard_alias = ContextVar('shard_alias', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# backends كل process فيها نسخته: الكتابة في worker ما تبانش للـ worker اللي هيخدم القراءة
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def replica_alias():
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_replica():
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def use_primary():
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def sharding_enabled():
+    return bool(getattr(settings, 'SHARDS', None))
+
+
+def current_shard():
+    """الـ alias اللي كتابات payments رايحة له دلوقتي."""
+    return _shard_alias.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias):
+    token = _shard_alias.set(alias)
+    try:
+        yield
+    finally:
+        _shard_alias.reset(token)
+
+
+# موديلات payments اللي مكانها الـ default دايمًا
+GLOBAL_MODELS = {'sharddirectory'}
+
+
+class ShardRouter:
+    """
+    أول router في DATABASE_ROUTERS. بدون SHARDS يرجّع None ويسيب القرار للي بعده.
+    """
+    def _shard_for(self, model, hints):
+        if not sharding_enabled() or model._meta.app_label != 'payments':
+            return None
+        if model._meta.model_name in GLOBAL_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # object متحمّل من shard يفضل فيه (علاقات، save بعد التعديل)
+            return instance._state.db
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not sharding_enabled():
+            return None
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding_enabled():
+            return None
+        if db in settings.SHARDS:
+            # الـ shard فيه جداول payments بس (من غير الدليل)
+            return app_label == 'payments' and model_name not in GLOBAL_MODELS
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # جوه معاملة على الـ primary نقرأ منه (نشوف كتاباتنا اللي لسه ما اتعملهاش commit)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # نفس البيانات على الاتنين
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # الـ replica بياخد الـ schema مع البيانات من التكرار
+        return db == DEFAULT_DB_ALIAS
+
+
+# ============================
+# Middleware
+# ============================
+def _client_key(request):
+    """
+    هوية العميل للـ stickiness: التوكن (JWT) وإلا جلسة الـ admin وإلا الـ IP
+    (بنفس قواعد TRUSTED_PROXIES بتاعة الـ throttling). بنخزن hash بس.
+    """
+    from payments.throttling import client_ip
+
+    raw = (request.headers.get('Authorization')
+           or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+           or client_ip(request))
+    return 'replica-sticky:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def sticky_cache():
+    return caches[getattr(settings, 'READ_REPLICA_STICKY_CACHE', 'default')]
+
+
+def check_sticky_cache():
+    """
+    read-your-writes بيعتمد إن علامة الكتابة تبان لكل الـ workers، فمع replica لازم
+    READ_REPLICA_STICKY_CACHE يكون cache مشترك (Redis / Memcached / DB)، وإلا نوقف الإقلاع.
+    """
+    if replica_alias() is None:
+        return
+    name    = getattr(settings, 'READ_REPLICA_STICKY_CACHE', 'default')
+    backend = settings.CACHES.get(name, {}).get('BACKEND')
+    if backend is None:
+        raise ImproperlyConfigured(f"READ_REPLICA_STICKY_CACHE {name!r} is not in CACHES.")
+    if backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f"READ_REPLICA_STICKY_CACHE {name!r} uses {backend.rsplit('.', 1)[-1]}, which is per process: "
+            "a client's next read could hit a worker that never saw its write and go to the lagging replica. "
+            "Point it at a shared cache (Redis, Memcached, database)."
+        )
+
+
+def _is_replica_view(view_name):
+    patterns = getattr(settings, 'READ_REPLICA_VIEWS', ())
+    return any(fnmatch.fnmatchcase(view_name, pattern) for pattern in patterns)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    بعد AuthenticationMiddleware و SessionMiddleware. بدون READ_REPLICA_ALIAS ما بيعملش حاجة،
+    ومعاه بيرفض يشتغل (ImproperlyConfigured وقت تحميل الـ middleware) على cache مش مشترك.
+    sync أو async (ASGI) من غير sync_to_async حوالين باقي السلسلة. الـ export الـ streaming
+    بيقرأ وقت ما السيرفر يلف على الـ body، فالـ alias يفضل لحد ما الـ response يتقفل.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        check_sticky_cache()
+        self.get_response = get_response
+        self.async_mode   = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _read_alias.reset(token)
+            raise
+        if _wrote(request, response):
+            sticky_cache().set(_client_key(request), True, _sticky_seconds())
+        return _release(response, token)
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+
+        token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _read_alias.reset(token)
+            raise
+        if _wrote(request, response):
+            await sticky_cache().aset(_client_key(request), True, _sticky_seconds())
+        return _release(response, token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        alias = _candidate(request)
+        if alias and not sticky_cache().get(_client_key(request)):
+            _read_alias.set(alias)
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        alias = _candidate(request)
+        if alias and not await sticky_cache().aget(_client_key(request)):
+            _read_alias.set(alias)
+        return None
+
+
+def _sticky_seconds():
+    return getattr(settings, 'READ_REPLICA_STICKY_SECONDS', 5)
+
+
+def _wrote(request, response):
+    return request.method not in SAFE_METHODS and response.status_code < 400
+
+
+def _candidate(request):
+    """الـ replica alias لو الطلب قراءة على view في READ_REPLICA_VIEWS، وإلا None."""
+    alias = replica_alias()
+    if alias is None or request.method not in SAFE_METHODS:
+        return None
+    match = request.resolver_match
+    if match and match.view_name and _is_replica_view(match.view_name):
+        return alias
+    return None
+
+
+def _release(response, token):
+    if not response.streaming:
+        _read_alias.reset(token)
+        return response
+    # set مش reset: الـ close ممكن يحصل في context تاني (thread الـ server)
+    return on_stream_end(response, lambda size: _read_alias.set(None))
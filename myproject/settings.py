@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 import pathlib
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
@@ -34,7 +35,17 @@ REST_FRAMEWORK = {
   'DEFAULT_AUTHENTICATION_CLASSES': (
     'payments.auth.DriverJWTAuthentication',
     'rest_framework_simplejwt.authentication.JWTAuthentication',
-  )
+  ),
+  # orjson (requirements.txt)، وإلا JSONRenderer / JSONParser العاديين (payments/renderers.py)
+  'DEFAULT_RENDERER_CLASSES': (
+    'payments.renderers.FastJSONRenderer',
+    'rest_framework.renderers.BrowsableAPIRenderer',
+  ),
+  'DEFAULT_PARSER_CLASSES': (
+    'payments.renderers.FastJSONParser',
+    'rest_framework.parsers.FormParser',
+    'rest_framework.parsers.MultiPartParser',
+  ),
 }
 
 
@@ -59,11 +70,16 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # يجب أن يكون في البداية
+    'myproject.middleware.PerformanceMiddleware',  # latency / استعلامات لكل view
+    'myproject.middleware.LoadSheddingMiddleware',  # 503 للأقل أولوية لما الـ worker يتشبّع
+    'myproject.middleware.CompressionMiddleware',  # gzip / brotli للردود الكبيرة
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myproject.routers.ReplicaRoutingMiddleware',  # القراءة التقيلة من الـ replica
+    'payments.sharding.ShardRoutingMiddleware',    # الـ shard بتاع المحافظة (لو SHARDS متحددة)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,12 +107,107 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# البروفايل من متغيرات البيئة: PTPAY_DB_ENGINE = sqlite (الافتراضي) | mysql | postgresql
+DB_ENGINE = os.environ.get('PTPAY_DB_ENGINE', 'sqlite')
+
+# اتصال دائم لكل worker بدل اتصال جديد مع كل طلب، مع فحص صلاحيته قبل إعادة الاستخدام
+DB_CONN_MAX_AGE       = int(os.environ.get('PTPAY_DB_CONN_MAX_AGE', 60))
+DB_CONN_HEALTH_CHECKS = os.environ.get('PTPAY_DB_CONN_HEALTH_CHECKS', '1') == '1'
+
+# SQLite: WAL (القرّاء ما يقفوش الكاتب)، fsync أقل مع WAL، انتظار القفل بدل
+# "database is locked" فورًا، mmap وcache أكبر. الـ pragmas تتنفذ مع كل اتصال جديد.
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('PTPAY_SQLITE_BUSY_TIMEOUT_MS', 20000))
+SQLITE_PRAGMAS = [
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    f'busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+    f"mmap_size={int(os.environ.get('PTPAY_SQLITE_MMAP_BYTES', 256 * 1024 * 1024))}",
+    f"cache_size=-{int(os.environ.get('PTPAY_SQLITE_CACHE_KB', 64 * 1024))}",
+    'temp_store=MEMORY',
+]
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('PTPAY_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+                # الكاتب ياخد القفل من أول المعاملة: بدون deadlock الترقية من قارئ لكاتب
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': f'django.db.backends.{DB_ENGINE}',
+            'NAME': os.environ.get('PTPAY_DB_NAME', 'ptpay'),
+            'USER': os.environ.get('PTPAY_DB_USER', ''),
+            'PASSWORD': os.environ.get('PTPAY_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PTPAY_DB_HOST', ''),
+            'PORT': os.environ.get('PTPAY_DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        }
+    }
+
+# replica للقراءة التقيلة (myproject/routers.py). على SQLite محليًا: ملف تاني
+# بيتحدّث بـ `python manage.py sync_replica --interval 2` بدل التكرار الحقيقي.
+DB_REPLICA_NAME = os.environ.get('PTPAY_DB_REPLICA_NAME', '')
+DB_REPLICA_HOST = os.environ.get('PTPAY_DB_REPLICA_HOST', '')
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if DB_REPLICA_NAME:
+        DATABASES['replica']['NAME'] = DB_REPLICA_NAME
+    if DB_REPLICA_HOST:
+        DATABASES['replica']['HOST'] = DB_REPLICA_HOST
+
+READ_REPLICA_ALIAS          = 'replica' if 'replica' in DATABASES else None
+READ_REPLICA_STICKY_SECONDS = int(os.environ.get('PTPAY_READ_REPLICA_STICKY_SECONDS', 5))
+# علامة "لسه كاتب" لازم تبان لكل الـ workers: اسم cache مشترك (Redis/Memcached/DB) في CACHES.
+# LocMem مع replica = الإقلاع يفشل (myproject/routers.py)
+READ_REPLICA_STICKY_CACHE   = os.environ.get('PTPAY_READ_REPLICA_STICKY_CACHE', 'default')
+# أسماء الـ urls (fnmatch) اللي GET عليها يقرأ من الـ replica
+READ_REPLICA_VIEWS = [
+    'customer-payments',
+    'trip-payments',
+    'customer-wallets',
+    'driver-wallets',
+    'governorate-list-create',
+    'city-list-create',
+    'vehicle-list-create',
+    'route-list-create',
+    'customer-list-original',
+    'payment-original',
+    'export',
+    'admin:*_changelist',
+]
+
+# تقسيم payments بالمحافظة (myproject/routers.py + payments/sharding.py):
+#   PTPAY_SHARDS="delta=/data/delta.sqlite3,upper=/data/upper.sqlite3"   alias=NAME (بنفس إعدادات الـ default)
+#   PTPAY_GOVERNORATE_SHARDS="3=delta,7=delta,12=upper"                 governorate_id=alias
+# المحافظات اللي مش متحددة تفضل في الـ default. كل shard يتعمله migrate لوحده:
+#   python manage.py migrate --database delta
+SHARDS = {}
+for _entry in filter(None, os.environ.get('PTPAY_SHARDS', '').split(',')):
+    _alias, _, _name = _entry.strip().partition('=')
+    SHARDS[_alias] = _name
+    DATABASES[_alias] = {**DATABASES['default'], 'NAME': _name}
+
+GOVERNORATE_SHARDS = {
+    int(_gov): _alias
+    for _gov, _, _alias in (
+        _entry.strip().partition('=')
+        for _entry in filter(None, os.environ.get('PTPAY_GOVERNORATE_SHARDS', '').split(','))
+    )
 }
+SHARD_DIRECTORY_TTL_SECONDS = int(os.environ.get('PTPAY_SHARD_DIRECTORY_TTL_SECONDS', 300))
+
+DATABASE_ROUTERS = ['myproject.routers.ShardRouter', 'myproject.routers.ReplicaRouter']
 
 # DATABASES = {
 #     'default': {
@@ -143,6 +254,109 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 
 
+# ------------------ ASGI settings ------------------
+
+# endpoints الأجهزة (device/location، device/active-trip، update_balance) بنسخ async.
+# myproject/asgi.py يفعّلها افتراضيًا؛ تحت WSGI تبقى النسخ العادية.
+ASYNC_DEVICE_ENDPOINTS = os.environ.get('PTPAY_ASYNC_DEVICE_ENDPOINTS', '0') == '1'
+
+
+# ------------------ Cache settings ------------------
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+# ------------------ Zone detection settings ------------------
+
+# الدخول: عدد نقاط متتالية داخل الـ Stop + أقل مدة بقاء بالثواني
+ZONE_ENTRY_MIN_FIXES         = int(os.environ.get('PTPAY_ZONE_ENTRY_MIN_FIXES', 2))
+ZONE_ENTRY_MIN_DWELL_SECONDS = int(os.environ.get('PTPAY_ZONE_ENTRY_MIN_DWELL_SECONDS', 5))
+# الخروج: عدد نقاط متتالية خارج الـ Stop الموسّع بهامش (≈ 20 متر)
+ZONE_EXIT_MIN_FIXES          = int(os.environ.get('PTPAY_ZONE_EXIT_MIN_FIXES', 2))
+ZONE_EXIT_MARGIN_DEG         = float(os.environ.get('PTPAY_ZONE_EXIT_MARGIN_DEG', 0.0002))
+
+
+# ------------------ Stop spatial index ------------------
+
+# حجم خلية الشبكة بالدرجات (≈ 1 كم) ومدة إعادة التحميل الكامل بالثواني
+STOP_INDEX_CELL_DEG    = float(os.environ.get('PTPAY_STOP_INDEX_CELL_DEG', 0.01))
+STOP_INDEX_TTL_SECONDS = int(os.environ.get('PTPAY_STOP_INDEX_TTL_SECONDS', 300))
+
+
+# ------------------ Settlement settings ------------------
+
+# 'immediate': ترحيل pending_balance عند إغلاق كل رحلة
+# 'batch':     الإغلاق فقط، والترحيل بأمر `python manage.py settle_trips` المجدول
+PAYMENTS_SETTLEMENT_MODE = os.environ.get('PTPAY_PAYMENTS_SETTLEMENT_MODE', 'immediate')
+
+# Token buckets على endpoints الأجهزة (payments/throttling.py): scope -> (طلب/ثانية، burst).
+# الـ ip أوسع bucket لأن أجهزة كتير ممكن تطلع من نفس الـ NAT. rate = 0 يقفل الـ scope.
+THROTTLE_BUCKETS = {
+    'device':   (float(os.environ.get('PTPAY_THROTTLE_DEVICE_RATE', 5)),   int(os.environ.get('PTPAY_THROTTLE_DEVICE_BURST', 30))),
+    'tap':      (float(os.environ.get('PTPAY_THROTTLE_TAP_RATE', 3)),      int(os.environ.get('PTPAY_THROTTLE_TAP_BURST', 20))),
+    'customer': (float(os.environ.get('PTPAY_THROTTLE_CUSTOMER_RATE', 1)), int(os.environ.get('PTPAY_THROTTLE_CUSTOMER_BURST', 5))),
+    'ip':       (float(os.environ.get('PTPAY_THROTTLE_IP_RATE', 50)),      int(os.environ.get('PTPAY_THROTTLE_IP_BURST', 200))),
+}
+# فاضي = buckets في ذاكرة كل worker. اسم cache مشترك (Redis/Memcached) في CACHES = buckets واحدة لكل الـ workers
+THROTTLE_CACHE = os.environ.get('PTPAY_THROTTLE_CACHE', '')
+# الـ load balancers / reverse proxies (IPs أو CIDR، مفصولين بفاصلة) اللي بنصدّق X-Forwarded-For
+# منهم. فاضي = REMOTE_ADDR بس، وأي X-Forwarded-For يتجاهل
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.environ.get('PTPAY_TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+
+
+# ------------------ Performance instrumentation ------------------
+
+# myproject/middleware.py: histograms لكل view على /metrics/ + سطر لكل طلب في PERF_LOG_FILE
+PERF_METRICS_ENABLED      = os.environ.get('PTPAY_PERF_METRICS_ENABLED', '1') == '1'
+PERF_METRICS_PATH         = '/metrics/'
+# /metrics/ للـ scraper بـ Authorization: Bearer <token> أو لمستخدم staff بس؛ فاضي = staff بس
+PERF_METRICS_TOKEN        = os.environ.get('PTPAY_PERF_METRICS_TOKEN', '')
+# طلب "بطيء" لو عدّى الزمن ده أو عدد الاستعلامات ده
+PERF_SLOW_REQUEST_MS      = int(os.environ.get('PTPAY_PERF_SLOW_REQUEST_MS', 500))
+PERF_MAX_QUERIES          = int(os.environ.get('PTPAY_PERF_MAX_QUERIES', 50))
+# N+1: نفس الـ SQL (بدون params) اتكرر العدد ده في طلب واحد
+PERF_N_PLUS_ONE_THRESHOLD = int(os.environ.get('PTPAY_PERF_N_PLUS_ONE_THRESHOLD', 10))
+PERF_LOG_FILE             = os.environ.get('PTPAY_PERF_LOG_FILE', str(BASE_DIR / 'perf.log'))
+
+# ضغط الردود (myproject/middleware.py): الأصغر من COMPRESSION_MIN_BYTES تطلع زي ما هي، و 0 يعطّله
+COMPRESSION_MIN_BYTES      = int(os.environ.get('PTPAY_COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('PTPAY_COMPRESSION_BROTLI_QUALITY', 4))
+COMPRESSION_TYPES          = ['application/json', 'text/*', 'application/javascript', 'image/svg+xml']
+# ردود فيها أسرار (JWT) ما تتضغطش عشان BREACH
+COMPRESSION_SKIP_VIEWS     = ['*token*']
+
+# Load shedding لكل process (myproject/middleware.py). LOAD_SHED_CAPACITY = عدد الطلبات الجارية
+# اللي الـ worker يستحملها (اتصالات تحت ASGI)، و 0 يعطّله. كل فئة تدخل طالما الإجمالي
+# أقل من share × السعة: التقارير تترفض عند 50%، الـ GPS عند 70%، والدفع بس لما السعة تخلص.
+# من غير قيمة: 64 تحت ASGI، وعدد threads الـ worker تحت WSGI
+_load_shed_capacity = os.environ.get('PTPAY_LOAD_SHED_CAPACITY', '')
+LOAD_SHED_CAPACITY  = int(_load_shed_capacity) if _load_shed_capacity else None
+# تحت WSGI: threads كل worker (gunicorn --threads). السعة ما تعدّيش العدد ده، و 1 = مفيش shedding
+LOAD_SHED_WSGI_THREADS = int(os.environ.get('PTPAY_LOAD_SHED_WSGI_THREADS', 1))
+LOAD_SHED_CLASSES = {
+    'payment':   {'share': 1.0, 'max_in_flight': 0, 'retry_after': 1},
+    'trip':      {'share': 0.9, 'max_in_flight': 0, 'retry_after': 1},
+    'default':   {'share': 0.8, 'max_in_flight': 0, 'retry_after': 2},
+    # نقاط الـ GPS تستنى شوية قبل الرفض: الجهاز هيبعت نقطة أحدث على أي حال
+    'telemetry': {'share': 0.7, 'max_in_flight': 0, 'retry_after': 2, 'defer_ms': 50},
+    'history':   {'share': 0.5, 'max_in_flight': 8, 'retry_after': 10},
+}
+# url names (fnmatch) لكل فئة؛ أي view تاني = 'default'
+LOAD_SHED_VIEWS = {
+    'payment':   ['update-balance', 'process-payment', 'qr-uid-payment', 'qr-payment-original',
+                  'transfer', 'driver-pay'],
+    'trip':      ['start-trip', 'end-trip', 'active-trip', 'driver-active-qr', 'generate-trip-qr',
+                  'device-active-trip', '*-token', 'token_refresh'],
+    'telemetry': ['device-location', 'device-location-binary', 'stop-lookup'],
+    'history':   ['customer-payments', 'trip-payments', 'export', 'customer-wallets', 'driver-wallets',
+                  'customer-list-original', 'payment-original', 'admin:*'],
+}
+
+
 # ------------------ Aggregation settings ------------------
 
 # ملفات الأكواد التي نريد تجميعها (مقارنة بـ BASE_DIR)
@@ -176,11 +390,34 @@ LOGGING = {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'perf_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PERF_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+        },
     },
     'loggers': {
         'payments.views': {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        # طلبات بطيئة / N+1 بـ WARNING، والباقي INFO
+        'ptpay.perf': {
+            'handlers': ['perf_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        # إعدادات الـ load shedding اللي مش هتشتغل (myproject/middleware.py) وقت الإقلاع
+        'ptpay.loadshed': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+        # زمن كل خطوة في تسخين العامل (payments/warmup.py)
+        'ptpay.warmup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
 }
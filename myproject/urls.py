@@ -5,6 +5,8 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .middleware import metrics_view
+
 
 def home(request):
     return HttpResponse("يا هلا والله")
@@ -16,6 +18,8 @@ urlpatterns = [
     path('api/', include('payments.urls')),
     # JWT refresh
     path('api/jwt/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Prometheus (myproject/middleware.py)
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
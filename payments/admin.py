@@ -1,6 +1,10 @@
 # ===== File: payments/admin.py =====
 
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Prefetch
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
 from .models import (
@@ -18,16 +22,84 @@ from .models import (
     Transfer,
     Device,
     DeviceLocation,
+    TopUp,
+    ReconciliationCheckpoint,
+    Settlement,
+    DeviceZoneState,
+    DailyRouteStats,
+    DailyDriverStats,
+    HourlyRidership,
+    ShardDirectory,
+    Stop,
 )
 
+
+# ============================
+# Changelists الجداول الكبيرة
+# ============================
+class EstimatedCountPaginator(Paginator):
+    """
+    COUNT(*) على ملايين الصفوف هو أبطأ استعلام في صفحة الـ admin.
+    - بدون فلاتر: تقدير من إحصائيات قاعدة البيانات (أو MAX(id) على SQLite)
+    - مع فلاتر/بحث: COUNT محدود بـ LIMIT، فالتكلفة ثابتة مهما كبر الجدول
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = _estimated_rows(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return self.object_list[:self.count_limit].count()
+
+
+def _estimated_rows(model, alias):
+    connection = connections[alias]
+    table      = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        elif connection.vendor == 'sqlite':
+            # الـ ids متزايدة والحذف نادر في الجداول دي، فـ MAX(rowid) تقدير كويس
+            cursor.execute(f'SELECT MAX(rowid) FROM "{table}"')
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator              = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+# Route.__str__ = أسماء المحطات، فأي FK لـ Route في الـ changelist يحتاج المحطات مجمّعة مسبقًا
+def _route_stops(lookup='route__stops'):
+    return Prefetch(lookup, queryset=Stop.objects.only('id', 'route_id', 'name'))
+
+
+class RouteListFilter(admin.RelatedFieldListFilter):
+    """فلتر المسار بأسماء المحطات في استعلامين بدل استعلام لكل مسار."""
+    def field_choices(self, field, request, model_admin):
+        routes = Route.objects.prefetch_related(_route_stops('stops'))
+        return [(route.pk, str(route)) for route in routes]
+
 @admin.register(CustomerWallet)
 class CustomerWalletAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer', 'balance')
+    list_display = ('id', 'customer', 'balance', 'reconciled_balance')
+    list_select_related = ('customer',)
     search_fields = ('customer__name',)
 
 @admin.register(DriverWallet)
 class DriverWalletAdmin(admin.ModelAdmin):
     list_display = ('id', 'driver', 'balance', 'pending_balance')
+    list_select_related = ('driver',)
     search_fields = ('driver__name',)
 
 @admin.register(Customer)
@@ -37,6 +109,7 @@ class CustomerAdmin(admin.ModelAdmin):
         'email', 'governorate', 'city', 'is_active'
     )
     list_filter = ('governorate', 'city', 'is_active')
+    list_select_related = ('governorate', 'city__governorate')
     search_fields = ('name', 'national_id', 'phone', 'email')
 
 @admin.register(Driver)
@@ -48,6 +121,7 @@ class DriverAdmin(admin.ModelAdmin):
         'license_photo_thumb'
     )
     list_filter = ('governorate', 'city', 'in_zone')
+    list_select_related = ('governorate', 'city__governorate')
     search_fields = (
         'name', 'national_id', 'phone',
         'email', 'license_number'
@@ -81,11 +155,13 @@ class GovernorateAdmin(admin.ModelAdmin):
 class CityAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'governorate')
     list_filter = ('governorate',)
+    list_select_related = ('governorate',)
     search_fields = ('name',)
 
 @admin.register(Vehicle)
 class VehicleAdmin(admin.ModelAdmin):
     list_display = ('id', 'number', 'driver')
+    list_select_related = ('driver',)
     list_filter = ('driver__governorate', 'driver__city')
     search_fields = ('number', 'driver__name')
 
@@ -96,54 +172,118 @@ class VehicleAdmin(admin.ModelAdmin):
 #     search_fields = ('name',)
 
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(LargeTableAdmin):
     list_display = (
         'id', 'driver', 'vehicle', 'route',
         'date', 'sequence_number', 'start_time',
         'end_time', 'in_zone','get_paid_passengers',
     )
 
-    @admin.display(description='Number of fees paid')
+    def get_queryset(self, request):
+        # عدد المدفوعات في نفس استعلام الصفحة بدل COUNT لكل صف
+        return (super().get_queryset(request)
+                .select_related('driver', 'vehicle__driver')
+                .prefetch_related(_route_stops())
+                .annotate(paid_passengers=Count('payment')))
+
+    @admin.display(description='Number of fees paid', ordering='paid_passengers')
     def get_paid_passengers(self, obj):
-        return Payment.objects.filter(trip=obj).count()
+        return obj.paid_passengers
 
-    list_filter = ('date', 'driver', 'route', 'in_zone')
+    list_filter = ('date', 'driver', ('route', RouteListFilter), 'in_zone')
     search_fields = ('driver__name', 'vehicle__number')
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = (
         'id', 'customer', 'trip', 'fare',
         'new_balance', 'timestamp', 'payment_method'
     )
+    list_select_related = ('customer', 'trip__driver')
+    raw_id_fields = ('customer', 'trip')
     list_filter = ('payment_method', 'timestamp')
     search_fields = ('customer__name', 'trip__driver__name')
 
 @admin.register(NFCCard)
 class NFCCardAdmin(admin.ModelAdmin):
     list_display = ('uid', 'customer')
+    list_select_related = ('customer',)
     search_fields = ('uid', 'customer__name')
 
 @admin.register(Transfer)
-class TransferAdmin(admin.ModelAdmin):
-    pass
+class TransferAdmin(LargeTableAdmin):
+    list_display = ('id', 'sender_phone', 'receiver_phone', 'amount', 'timestamp')
+    search_fields = ('sender_phone', 'receiver_phone')
+
+@admin.register(Settlement)
+class SettlementAdmin(LargeTableAdmin):
+    list_display = ('id', 'trip', 'driver', 'amount', 'batch', 'created_at')
+    list_select_related = ('trip__driver', 'driver')
+    raw_id_fields = ('trip', 'driver')
+    list_filter = ('created_at',)
+    search_fields = ('driver__name', 'batch')
+
+@admin.register(TopUp)
+class TopUpAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'amount', 'new_balance', 'timestamp')
+    list_select_related = ('customer',)
+    raw_id_fields = ('customer',)
+    search_fields = ('customer__name',)
+
+@admin.register(ReconciliationCheckpoint)
+class ReconciliationCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_payment_id', 'last_transfer_id', 'last_topup_id', 'last_run_at')
+
+@admin.register(DailyRouteStats)
+class DailyRouteStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'route', 'trips_closed', 'payments', 'revenue')
+    list_filter = ('date',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(_route_stops())
+
+@admin.register(DailyDriverStats)
+class DailyDriverStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'driver', 'trips_closed', 'payments', 'revenue')
+    list_filter = ('date',)
+    list_select_related = ('driver',)
+    search_fields = ('driver__name',)
+
+@admin.register(HourlyRidership)
+class HourlyRidershipAdmin(admin.ModelAdmin):
+    list_display = ('date', 'hour', 'route', 'payments', 'revenue')
+    list_filter = ('date',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(_route_stops())
+
+@admin.register(ShardDirectory)
+class ShardDirectoryAdmin(LargeTableAdmin):
+    list_display = ('kind', 'key', 'shard')
+    list_filter = ('kind', 'shard')
+    search_fields = ('=key',)
 
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
     list_display = ('id', 'name')
     search_fields = ('name',)
 
+@admin.register(DeviceZoneState)
+class DeviceZoneStateAdmin(admin.ModelAdmin):
+    list_display = ('device', 'confirmed_in_zone', 'candidate_in_zone', 'candidate_count', 'updated_at')
+    list_select_related = ('device',)
+
 @admin.register(DeviceLocation)
-class DeviceLocationAdmin(admin.ModelAdmin):
+class DeviceLocationAdmin(LargeTableAdmin):
     list_display = ('id', 'device', 'latitude', 'longitude', 'timestamp')
+    list_select_related = ('device',)
+    raw_id_fields = ('device',)
     search_fields = ('device__name',)
 
 
 
 # payments/admin.py
 
-from .models import Stop
-
 class StopInline(admin.TabularInline):
     model = Stop
     extra = 1
@@ -156,4 +296,9 @@ class RouteAdmin(admin.ModelAdmin):
         'end_stop_name',   'end_latitude',   'end_longitude',
     )
     list_display = ('id', 'display_name', 'city')
-    inlines      = [StopInline]
\ No newline at end of file
+    inlines      = [StopInline]
+
+    def get_queryset(self, request):
+        return (super().get_queryset(request)
+                .select_related('city__governorate')
+                .prefetch_related(_route_stops('stops')))
\ No newline at end of file
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        # تسجيل signals فهرس المحطات (payments/geoindex.py)
+        from . import geoindex  # noqa: F401
+        # تحديث جداول التجميع مع كل دفع (payments/rollups.py)
+        from . import rollups  # noqa: F401
+        # دليل الـ shards ونسخ المحافظات/المدن لكل shard (payments/sharding.py)
+        from . import sharding  # noqa: F401
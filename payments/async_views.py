@@ -0,0 +1,134 @@
+# payments/async_views.py
+
+"""
+نسخ async (ASGI) من endpoints الأجهزة: device/location/، device/active-trip/
+و payments/update_balance/. تُستخدم بدل النسخ العادية لما
+ASYNC_DEVICE_ENDPOINTS = True (وده الافتراضي تحت myproject/asgi.py).
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import Device, Trip
+from . import throttling
+from .services import (
+    ServiceError, apply_tap, device_id_from_payload, fixes_from_payload,
+    ingest_fixes, tap_from_payload,
+)
+
+
+def _request_data(request):
+    # الأجهزة بتبعت JSON، وبعضها form-encoded زي ما كان DRF بيقبل
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            # [..] أو رقم: 400 زي الـ JSON البايظ بدل AttributeError على data.get
+            raise ValueError('body must be a JSON object')
+        return data
+    return request.POST
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+@csrf_exempt
+@require_POST
+async def device_location(request):
+    """
+    POST /api/device/location/  (async)
+    Body JSON: { "device_id": <int>, "latitude": <float>, "longitude": <float> }
+           أو: { "device_id": <int>, "points": [ {"latitude", "longitude", "timestamp"}, ... ] }
+    """
+    if wait := await throttling.acheck_all(request, throttling.DEVICE_THROTTLES):
+        return throttling.throttled_response(wait)
+
+    # 1) قراءة البيانات من الـ body
+    try:
+        data   = _request_data(request)
+        device = await aget_object_or_404(
+            Device.objects.select_related('driver', 'zone_state'),
+            id=device_id_from_payload(data),
+        )
+        fixes  = fixes_from_payload(data)
+    except (ValueError, Http404):
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+
+    # 2) الكتابة (المواقع + in_zone + إغلاق الرحلة) في thread واحد لأنها معاملات
+    try:
+        loc, in_zone, entered_at = await sync_to_async(ingest_fixes)(device, fixes)
+    except ServiceError as exc:
+        return JsonResponse({'error': exc.message}, status=exc.status_code)
+
+    return JsonResponse({
+        'status':      'ok',
+        'in_zone':     int(in_zone),
+        'location_id': loc.id,
+        'accepted':    len(fixes),
+        'entered_at':  entered_at.isoformat() if entered_at else None,
+    })
+
+
+@csrf_exempt
+@require_POST
+async def device_active_trip(request):
+    """
+    POST /api/device/active-trip/  (async)
+    Body JSON: { "device_id": <int> }
+    """
+    try:
+        device_id = _request_data(request).get('device_id')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+    if device_id is None:
+        return JsonResponse({'active': False, 'error': 'MISSING_DEVICE_ID'})
+
+    try:
+        device = await aget_object_or_404(Device.objects.select_related('driver'), id=device_id)
+    except Http404:
+        return _not_found()
+
+    driver = getattr(device, 'driver', None)
+    if driver is None:
+        return JsonResponse({'active': False})
+
+    active_trip_id = await (
+        Trip.objects
+            .filter(driver_id=driver.id, end_time__isnull=True)
+            .order_by('-start_time')
+            .values_list('id', flat=True)
+            .afirst()
+    )
+    if active_trip_id:
+        return JsonResponse({'active': True, 'trip_id': active_trip_id})
+    return JsonResponse({'active': False})
+
+
+@csrf_exempt
+@require_POST
+async def update_balance(request):
+    """
+    POST /api/payments/update_balance/  (async)
+    Body JSON: { "uid": "...", "new_balance": <decimal>, "action": "topup" | "payment", "device_id": <int> }
+    """
+    if wait := await throttling.acheck_all(request, throttling.TAP_THROTTLES):
+        return throttling.throttled_response(wait)
+
+    try:
+        uid, action, new_bal, device_id = tap_from_payload(_request_data(request))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+
+    # المنطق كله (lookups ثم الخصم والدفع في معاملة واحدة) في services.apply_tap
+    try:
+        body = await sync_to_async(apply_tap)(uid, action, new_bal, device_id)
+    except Http404:
+        return _not_found()
+    except ServiceError as exc:
+        return JsonResponse({'error': exc.message}, status=exc.status_code)
+    return JsonResponse(body)
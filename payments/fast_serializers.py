@@ -0,0 +1,242 @@
+# payments/fast_serializers.py
+
+"""
+نسخ قراءة سريعة من TripSerializer و PaymentSerializer و DriverSerializer لقوائم الـ API.
+
+بدل ما DRF يبني fields لكل object ويستدعي SerializerMethodField واحدة واحدة
+(وكل واحدة بتعمل استعلام: stops الرحلة، عربيتها، عدد ركابها ...):
+  - كل موديل بيتقري بـ values() واحد بالأعمدة المطلوبة بس
+  - العلاقات (مسارات بمحطاتها، رحلات، عربيات السائقين) بتتجمع باستعلام واحد
+    لكل نوع وتتكاش في dict، فمسار مشترك بين 500 دفعة بيتبني مرة واحدة
+  - التحويلات (Decimal → "5.00"، datetime → ISO بالتوقيت المحلي، الصور → URL)
+    بنفس قواعد حقول DRF عشان الـ JSON يفضل هو هو
+
+المخرجات لازم تطابق الـ serializers الأصلية حرفيًا: أمر bench_serializers --check
+بيقارن الاتنين على بيانات مزروعة. ?fields= / ?omit= (payments/fieldsets.py) بيتطبق
+هنا كمان: العلاقات اللي ماتطلبتش ما بتتجابش خالص.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .fieldsets import FULL, from_request
+from .models import Driver, Route, Stop, Trip, Vehicle
+
+CENT = Decimal('0.01')
+
+
+# ============================
+# تحويلات بنفس قواعد حقول DRF
+# ============================
+def _decimal(value):
+    # DecimalField(decimal_places=2) مع COERCE_DECIMAL_TO_STRING
+    return None if value is None else '{:f}'.format(value.quantize(CENT))
+
+
+def _datetime(value):
+    # DateTimeField: بالتوقيت الحالي، و +00:00 تبقى Z
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _date(value):
+    return None if value is None else value.isoformat()
+
+
+def _file_url(field, name, request):
+    if not name:
+        return None
+    url = field.storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+# ============================
+# Routes & trips
+# ============================
+def route_rows(route_ids):
+    """{route_id: dict زي RouteSerializer} باستعلامين مهما كان عدد المسارات."""
+    route_ids = set(route_ids)
+    routes    = {rid: {'id': rid, 'city': city, 'stops': [], 'display_name': ''}
+                 for rid, city in Route.objects.filter(id__in=route_ids).values_list('id', 'city_id')}
+    stops = (Stop.objects
+             .filter(route_id__in=route_ids)
+             .order_by('id')
+             .values_list('route_id', 'id', 'name', 'min_lat', 'min_lng', 'max_lat', 'max_lng'))
+    for route_id, pk, name, min_lat, min_lng, max_lat, max_lng in stops:
+        routes[route_id]['stops'].append({
+            'id': pk, 'name': name,
+            'min_lat': min_lat, 'min_lng': min_lng, 'max_lat': max_lat, 'max_lng': max_lng,
+        })
+    for route in routes.values():
+        route['display_name'] = " - ".join(stop['name'] for stop in route['stops'])
+    return routes
+
+
+TRIP_COLUMNS = (
+    'id', 'route_id', 'vehicle_id', 'driver_id', 'date', 'sequence_number',
+    'start_time', 'end_time', 'in_zone', 'qr_token', 'qr_token_generated_at',
+)
+
+
+def trip_rows(trip_ids, routes=None, fieldset=FULL):
+    """{trip_id: dict زي TripSerializer}؛ routes كاش مسارات مشترك (بيتملى لو ناقص)."""
+    trips = Trip.objects.filter(id__in=set(trip_ids))
+    if fieldset.wants('paid_passengers'):
+        trips = trips.annotate(paid=Count('payment'))
+    trips = list(trips.values(*TRIP_COLUMNS, *(['paid'] if fieldset.wants('paid_passengers') else [])))
+
+    if routes is None:
+        routes = {}
+    if fieldset.wants_any('route', 'route_name', 'start_stop_name', 'end_stop_name'):
+        missing = {t['route_id'] for t in trips} - routes.keys()
+        if missing:
+            routes.update(route_rows(missing))
+    vehicles = {}
+    if fieldset.wants_any('vehicle', 'vehicle_number'):
+        vehicles = {
+            pk: {'id': pk, 'number': number, 'driver': driver_id}
+            for pk, number, driver_id in Vehicle.objects
+                .filter(id__in={t['vehicle_id'] for t in trips})
+                .values_list('id', 'number', 'driver_id')
+        }
+
+    rows = {}
+    for t in trips:
+        route   = routes.get(t['route_id'])
+        vehicle = vehicles.get(t['vehicle_id'])
+        stops   = route['stops'] if route else []
+        rows[t['id']] = {
+            'id':                    t['id'],
+            'route':                 route,
+            'vehicle':               vehicle,
+            'route_name':            route['display_name'] if route else None,
+            'start_stop_name':       stops[0]['name'] if stops else None,
+            'end_stop_name':         stops[-1]['name'] if stops else None,
+            'vehicle_number':        vehicle['number'] if vehicle else None,
+            'start_time_iso':        t['start_time'].isoformat() if t['start_time'] else None,
+            'paid_passengers':       t.get('paid'),
+            'date':                  _date(t['date']),
+            'sequence_number':       t['sequence_number'],
+            'start_time':            _datetime(t['start_time']),
+            'end_time':              _datetime(t['end_time']),
+            'in_zone':               t['in_zone'],
+            'qr_token':              t['qr_token'],
+            'qr_token_generated_at': _datetime(t['qr_token_generated_at']),
+            'driver':                t['driver_id'],
+        }
+        if fieldset:
+            rows[t['id']] = fieldset.prune(rows[t['id']])
+    return rows
+
+
+# ============================
+# Payments
+# ============================
+PAYMENT_COLUMNS = (
+    'id', 'customer_id', 'customer__name', 'trip_id',
+    'fare', 'new_balance', 'timestamp', 'payment_method',
+)
+
+
+def payment_rows(queryset, request=None, fieldset=None):
+    """قائمة dicts زي PaymentSerializer(many=True).data لـ queryset من Payment."""
+    fieldset = fieldset if fieldset is not None else from_request(request)
+    columns  = [c for c in PAYMENT_COLUMNS if c != 'customer__name' or fieldset.wants('customer_name')]
+    payments = list(queryset.values(*columns))
+    trips    = {}
+    if fieldset.wants('trip'):
+        trips = trip_rows({p['trip_id'] for p in payments if p['trip_id']}, fieldset=fieldset.nested('trip'))
+    rows = [
+        {
+            'id':             p['id'],
+            'customer':       p['customer_id'],
+            'customer_name':  p.get('customer__name'),
+            'trip':           trips.get(p['trip_id']),
+            'fare':           _decimal(p['fare']),
+            'new_balance':    _decimal(p['new_balance']),
+            'timestamp':      _datetime(p['timestamp']),
+            'payment_method': p['payment_method'],
+        }
+        for p in payments
+    ]
+    return [fieldset.prune(row) for row in rows] if fieldset else rows
+
+
+# ============================
+# Drivers
+# ============================
+DRIVER_COLUMNS = (
+    'id', 'name', 'national_id', 'phone', 'email', 'license_number',
+    'driver_photo', 'license_photo', 'governorate_id', 'city_id', 'in_zone',
+    'assigned_device_id', 'assigned_route_id',
+)
+
+
+def driver_rows(queryset, request=None, fieldset=None):
+    """قائمة dicts زي DriverSerializer(many=True).data (من غير password: write_only)."""
+    fieldset = fieldset if fieldset is not None else from_request(request)
+    drivers  = list(queryset.values(*DRIVER_COLUMNS))
+    routes   = {}
+    if fieldset.wants('assigned_route_name'):
+        routes = route_rows({d['assigned_route_id'] for d in drivers if d['assigned_route_id']})
+    vehicles = {}
+    if fieldset.wants('vehicles'):
+        for driver_id, pk in (Vehicle.objects
+                              .filter(driver_id__in=[d['id'] for d in drivers])
+                              .order_by('id')
+                              .values_list('driver_id', 'id')):
+            vehicles.setdefault(driver_id, []).append(pk)
+
+    photo   = Driver._meta.get_field('driver_photo')
+    license = Driver._meta.get_field('license_photo')
+    rows = [
+        {
+            'id':                  d['id'],
+            'name':                d['name'],
+            'national_id':         d['national_id'],
+            'phone':               d['phone'],
+            'email':               d['email'],
+            'license_number':      d['license_number'],
+            'driver_photo':        _file_url(photo, d['driver_photo'], request),
+            'license_photo':       _file_url(license, d['license_photo'], request),
+            'governorate':         d['governorate_id'],
+            'city':                d['city_id'],
+            'in_zone':             d['in_zone'],
+            'assigned_device':     d['assigned_device_id'],
+            'assigned_route':      d['assigned_route_id'],
+            'assigned_route_name': (routes[d['assigned_route_id']]['display_name']
+                                    if d['assigned_route_id'] in routes else None),
+            'vehicles':            vehicles.get(d['id'], []),
+        }
+        for d in drivers
+    ]
+    return [fieldset.prune(row) for row in rows] if fieldset else rows
+
+
+# ============================
+# Views
+# ============================
+class FastListMixin:
+    """
+    لـ ListAPIView: GET يستخدم fast_rows(queryset, request, fieldset) بدل serializer_class
+    (اللي يفضل للكتابة). الـ pagination لو متفعلة بتشتغل عادي.
+
+        fast_rows = staticmethod(fast_serializers.payment_rows)
+    """
+    fast_rows = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fieldset = from_request(request)
+        page     = self.paginate_queryset(queryset)
+        if page is not None:
+            ids  = [obj.pk for obj in page]
+            rows = self.fast_rows(queryset.filter(pk__in=ids), request, fieldset=fieldset.including('id'))
+            rows = {row['id']: row for row in rows}
+            return self.get_paginated_response([fieldset.prune(rows[pk]) for pk in ids])
+        return Response(self.fast_rows(queryset, request, fieldset=fieldset))
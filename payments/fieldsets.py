@@ -0,0 +1,218 @@
+# payments/fieldsets.py
+
+"""
+Sparse fieldsets لكل APIs القراءة:
+
+    GET /api/drivers/?fields=id,name,phone
+    GET /api/customers/<uid>/payments/?fields=id,fare,trip.route_name
+    GET /api/routes/?omit=stops
+
+- fields= الحقول المطلوبة بس، omit= الحقول اللي تتشال؛ الحقول المتداخلة بالنقطة
+  (trip.vehicle.number). اسم مش موجود بيتجاهل.
+- SparseFieldsMixin للـ serializers: بيشيل الحقول من serializer.fields نفسها، فالـ
+  SerializerMethodField اللي ماتطلبتش ما بتتنفذش أصلاً. بيشتغل على GET / HEAD بس
+  (الكتابة محتاجة كل الحقول للـ validation)، أو بـ Serializer(obj, fields=..., omit=...)
+  أو fieldset=from_request(request) من APIView عادي.
+- SparseQuerysetMixin للـ views: only() بالأعمدة اللي الحقول المطلوبة محتاجاها،
+  و prefetch_related للعلاقات اللي بتتقري بس (sparse_sources في الـ serializer).
+- fast_serializers بياخد نفس الـ Fieldset ويقفز الاستعلامات اللي مش محتاجها.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def _tree(paths):
+    """'trip.route_name,fare' → {'trip': {'route_name': {}}, 'fare': {}}"""
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    tree = {}
+    for path in paths:
+        node = tree
+        for part in filter(None, (p.strip() for p in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+
+class Fieldset:
+    """
+    only: شجرة الحقول المطلوبة (None = الكل)، و omit: شجرة المشالة.
+    فرع فاضي في only = الحقل كله، وفرع فاضي في omit = الحقل يتشال كله.
+    """
+    __slots__ = ('only', 'omit')
+
+    def __init__(self, only=None, omit=None):
+        self.only = only
+        self.omit = omit or {}
+
+    @classmethod
+    def parse(cls, fields=None, omit=None):
+        only = _tree(fields) if fields else None
+        return cls(only or None, _tree(omit) if omit else {})
+
+    def __bool__(self):
+        return self.only is not None or bool(self.omit)
+
+    def wants(self, name):
+        if self.omit.get(name) == {}:
+            return False
+        return self.only is None or name in self.only
+
+    def wants_any(self, *names):
+        return any(self.wants(name) for name in names)
+
+    def nested(self, name):
+        only = (self.only.get(name) or None) if self.only is not None else None
+        return Fieldset(only, self.omit.get(name))
+
+    def including(self, name):
+        """نسخة لازم فيها name (الـ pagination محتاج الـ id)."""
+        only = {**self.only, name: {}} if self.only is not None else None
+        return Fieldset(only, {k: v for k, v in self.omit.items() if k != name or v})
+
+    def prune(self, row):
+        """نفس الـ Fieldset على dict جاهز (مخرجات fast_serializers)."""
+        if not self:
+            return row
+        out = {}
+        for key, value in row.items():
+            if not self.wants(key):
+                continue
+            sub = self.nested(key)
+            if sub and isinstance(value, dict):
+                value = sub.prune(value)
+            elif sub and isinstance(value, list):
+                value = [sub.prune(item) if isinstance(item, dict) else item for item in value]
+            out[key] = value
+        return out
+
+
+FULL = Fieldset()
+
+
+def from_request(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return FULL
+    params = getattr(request, 'query_params', request.GET)
+    return Fieldset.parse(params.get('fields'), params.get('omit'))
+
+
+# ============================
+# Serializers
+# ============================
+class SparseFieldsMixin:
+    """
+    Mixin لـ ModelSerializer. sparse_sources بتقول كل SerializerMethodField بتقرا إيه
+    من الموديل (أعمدة أو علاقات بصيغة ORM)، عشان SparseQuerysetMixin يعرف يعمل only()
+    و prefetch. method field مش متعرفة = مفيش only() للـ view ده.
+    """
+    sparse_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        fields, omit   = kwargs.pop('fields', None), kwargs.pop('omit', None)
+        self._fieldset = kwargs.pop('fieldset', None)
+        if fields or omit:
+            self._fieldset = Fieldset.parse(fields, omit)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def fieldset(self):
+        if self._fieldset is None:
+            parent, name = self.parent, self.field_name
+            if isinstance(parent, serializers.ListSerializer):
+                parent, name = parent.parent, parent.field_name
+            if parent is None:
+                self._fieldset = from_request(self.context.get('request'))
+            elif isinstance(parent, SparseFieldsMixin):
+                self._fieldset = parent.fieldset.nested(name)
+            else:
+                self._fieldset = FULL
+        return self._fieldset
+
+    def get_fields(self):
+        fields   = super().get_fields()
+        fieldset = self.fieldset
+        if fieldset:
+            for name in [name for name in fields if not fieldset.wants(name)]:
+                del fields[name]
+        return fields
+
+
+def requirements(serializer):
+    """
+    (columns, lookups) للحقول المقروءة في serializer (بعد الـ fieldset):
+    columns لـ only() أو None لو فيه حقل مش عارفين مصدره، و lookups لـ prefetch_related.
+    """
+    opts    = serializer.Meta.model._meta
+    columns = {opts.pk.name}
+    lookups = set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        child  = getattr(field, 'child', field)
+        nested = isinstance(child, serializers.BaseSerializer)
+        if name in serializer.sparse_sources:
+            paths = serializer.sparse_sources[name]
+        elif field.source == '*':
+            columns = None
+            continue
+        else:
+            paths = ['__'.join(field.source_attrs)]
+
+        for path in paths:
+            root = path.split('__', 1)[0]
+            try:
+                model_field = opts.get_field(root)
+            except FieldDoesNotExist:
+                # property على الموديل (display_name ...): محتاجة الـ instance كامل
+                columns = None
+                continue
+            if columns is not None and model_field.concrete:
+                columns.add(root)
+            # PrimaryKeyRelatedField بيقرا الـ _id بس؛ العلاقة تتجاب لو حد هيقراها
+            if model_field.is_relation and (nested or name in serializer.sparse_sources):
+                lookups.add(path)
+        if nested and isinstance(child, SparseFieldsMixin) and len(paths) == 1:
+            lookups.update(f'{paths[0]}__{lookup}' for lookup in requirements(child)[1])
+    return columns, lookups
+
+
+# ============================
+# Views
+# ============================
+class SparseQuerysetMixin:
+    """
+    Mixin لـ GenericAPIView (قبل ListAPIView / RetrieveAPIView). بيشتغل في
+    filter_queryset عشان يلحق الـ get_queryset بتاع كل view، ومع fast_rows لأ
+    (fast_serializers بيقرا الـ Fieldset بنفسه).
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS or getattr(self, 'fast_rows', None):
+            return queryset
+        serializer = self.get_serializer()
+        if not isinstance(serializer, SparseFieldsMixin):
+            return queryset
+        return prune_queryset(queryset, serializer)
+
+
+def _lookup_path(lookup):
+    return lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+
+
+def prune_queryset(queryset, serializer):
+    columns, lookups = requirements(serializer)
+    if serializer.fieldset:
+        # prefetch الـ view لعلاقة محدش طلبها: يتشال
+        roots    = {path.split('__', 1)[0] for path in lookups} | (columns or set())
+        existing = [lookup for lookup in queryset._prefetch_related_lookups
+                    if columns is None or _lookup_path(lookup).split('__', 1)[0] in roots]
+        queryset = queryset.prefetch_related(None).prefetch_related(*existing)
+        if columns is not None and not queryset.query.select_related:
+            queryset = queryset.only(*columns)
+    seen    = {_lookup_path(lookup) for lookup in queryset._prefetch_related_lookups}
+    missing = sorted(path for path in lookups if path not in seen)
+    return queryset.prefetch_related(*missing) if missing else queryset
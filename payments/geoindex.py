@@ -0,0 +1,195 @@
+# payments/geoindex.py
+
+"""
+فهرس شبكي (uniform grid) في الذاكرة لكل bboxes الـ Stops في المدينة،
+للإجابة على "أي محطات فيها النقطة دي / تتقاطع مع المربع ده" بدون
+range scan على أربع أعمدة float في قاعدة البيانات.
+
+- فهرس لكل shard (payments/sharding.py): محطات كل قاعدة من نفس القاعدة بـ using(alias)،
+  والاستعلام على فهرس الـ shard الحالي أو الـ alias اللي يتبعت صريح
+- يتحمّل كسول أول استخدام (أو من warm-up) ويُعاد تحميله كامل كل STOP_INDEX_TTL_SECONDS
+- يتحدّث تدريجيًا في نفس الـ process مع post_save / post_delete على Stop
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import sharding
+from .models import Stop
+
+
+class StopIndex:
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg  = cell_deg
+        self.stops     = {}   # stop_id -> (route_id, name, min_lat, max_lat, min_lng, max_lng)
+        self.cells     = {}   # (ix, iy) -> set(stop_id)
+        self.by_route  = {}   # route_id -> set(stop_id)
+        self.loaded_at = None
+        self._lock     = threading.RLock()
+
+    # ---------- بناء الفهرس ----------
+    def _cells_for(self, min_lat, max_lat, min_lng, max_lng):
+        size = self.cell_deg
+        for ix in range(math.floor(min_lat / size), math.floor(max_lat / size) + 1):
+            for iy in range(math.floor(min_lng / size), math.floor(max_lng / size) + 1):
+                yield ix, iy
+
+    def load(self, rows):
+        """rows: (id, route_id, name, min_lat, max_lat, min_lng, max_lng)"""
+        # نبني نسخة جديدة ونبدّلها مرة واحدة حتى لا يرى القارئ فهرسًا نصف محمّل
+        fresh = StopIndex(self.cell_deg)
+        for row in rows:
+            fresh._add(row)
+        with self._lock:
+            self.stops, self.cells, self.by_route = fresh.stops, fresh.cells, fresh.by_route
+            self.loaded_at = time.monotonic()
+
+    def _add(self, row):
+        stop_id, route_id, name, min_lat, max_lat, min_lng, max_lng = row
+        self.stops[stop_id] = (route_id, name, min_lat, max_lat, min_lng, max_lng)
+        self.by_route.setdefault(route_id, set()).add(stop_id)
+        for cell in self._cells_for(min_lat, max_lat, min_lng, max_lng):
+            self.cells.setdefault(cell, set()).add(stop_id)
+
+    def upsert(self, row):
+        with self._lock:
+            self.remove(row[0])
+            self._add(row)
+
+    def remove(self, stop_id):
+        with self._lock:
+            old = self.stops.pop(stop_id, None)
+            if old is None:
+                return
+            route_id, _, min_lat, max_lat, min_lng, max_lng = old
+            self.by_route.get(route_id, set()).discard(stop_id)
+            for cell in self._cells_for(min_lat, max_lat, min_lng, max_lng):
+                bucket = self.cells.get(cell)
+                if bucket:
+                    bucket.discard(stop_id)
+                    if not bucket:
+                        del self.cells[cell]
+
+    # ---------- الاستعلامات ----------
+    def point(self, lat, lng, route_id=None):
+        """ids المحطات اللي bbox بتاعها فيه النقطة."""
+        size      = self.cell_deg
+        candidate = self.cells.get((math.floor(lat / size), math.floor(lng / size)), ())
+        stops     = self.stops
+        result    = []
+        for stop_id in tuple(candidate):
+            stop = stops.get(stop_id)
+            if stop is None or (route_id is not None and stop[0] != route_id):
+                continue
+            if stop[2] <= lat <= stop[3] and stop[4] <= lng <= stop[5]:
+                result.append(stop_id)
+        return result
+
+    def bbox(self, min_lat, min_lng, max_lat, max_lng, route_id=None):
+        """ids المحطات اللي bbox بتاعها يتقاطع مع المربع."""
+        size    = self.cell_deg
+        stops   = self.stops
+        n_cells = ((math.floor(max_lat / size) - math.floor(min_lat / size) + 1) *
+                   (math.floor(max_lng / size) - math.floor(min_lng / size) + 1))
+        if n_cells > len(stops):
+            # مربع أكبر من عدد المحطات: المرور على المحطات أرخص من المرور على الخلايا
+            candidates = tuple(stops)
+        else:
+            candidates = set()
+            for cell in self._cells_for(min_lat, max_lat, min_lng, max_lng):
+                candidates.update(tuple(self.cells.get(cell, ())))
+
+        result = []
+        for stop_id in candidates:
+            stop = stops.get(stop_id)
+            if stop is None or (route_id is not None and stop[0] != route_id):
+                continue
+            if stop[2] <= max_lat and min_lat <= stop[3] and stop[4] <= max_lng and min_lng <= stop[5]:
+                result.append(stop_id)
+        return result
+
+    def route_boxes(self, route_id):
+        """bboxes محطات المسار كـ (min_lat, max_lat, min_lng, max_lng)."""
+        stops = self.stops
+        boxes = (stops.get(stop_id) for stop_id in tuple(self.by_route.get(route_id, ())))
+        return [box[2:] for box in boxes if box is not None]
+
+    def describe(self, stop_id):
+        route_id, name, min_lat, max_lat, min_lng, max_lng = self.stops[stop_id]
+        return {
+            'id':      stop_id,
+            'route':   route_id,
+            'name':    name,
+            'min_lat': min_lat, 'min_lng': min_lng,
+            'max_lat': max_lat, 'max_lng': max_lng,
+        }
+
+
+_FIELDS       = ('id', 'route_id', 'name', 'min_lat', 'max_lat', 'min_lng', 'max_lng')
+_indexes      = {}   # shard alias -> StopIndex
+_indexes_lock = threading.Lock()
+
+
+def _index_for(alias):
+    index = _indexes.get(alias)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(alias, StopIndex(getattr(settings, 'STOP_INDEX_CELL_DEG', 0.01)))
+    return index
+
+
+def get_index(using=None):
+    """
+    فهرس الـ shard (الحالي لو using فاضي) في الـ process، يتحمّل أول مرة ويتجدّد بعد
+    الـ TTL (حتى تلحق العمال التانية بتعديلات حصلت في process تاني).
+    """
+    index = _index_for(using or sharding.current_shard())
+    ttl   = getattr(settings, 'STOP_INDEX_TTL_SECONDS', 300)
+    if index.loaded_at is None or time.monotonic() - index.loaded_at > ttl:
+        reload_index(using)
+    return index
+
+
+def reload_index(using=None):
+    alias = using or sharding.current_shard()
+    index = _index_for(alias)
+    index.load(Stop.objects.using(alias).values_list(*_FIELDS).iterator(chunk_size=2000))
+    return index
+
+
+def stops_at(lat, lng, route_id=None, using=None):
+    """المحطات (dicts) اللي فيها النقطة، من كل المدينة أو من مسار واحد."""
+    index = get_index(using)
+    return [index.describe(stop_id) for stop_id in index.point(lat, lng, route_id)]
+
+
+def stops_in_bbox(min_lat, min_lng, max_lat, max_lng, route_id=None, using=None):
+    """المحطات (dicts) اللي تتقاطع مع المربع."""
+    index = get_index(using)
+    return [index.describe(stop_id) for stop_id in index.bbox(min_lat, min_lng, max_lat, max_lng, route_id)]
+
+
+def route_boxes(route_id, using=None):
+    return get_index(using).route_boxes(route_id)
+
+
+@receiver(post_save, sender=Stop)
+def _index_stop_saved(sender, instance, using, **kwargs):
+    index = _indexes.get(using)
+    if index is not None and index.loaded_at is not None:
+        row = tuple(getattr(instance, field) for field in _FIELDS)
+        transaction.on_commit(lambda: index.upsert(row), using=using)
+
+
+@receiver(post_delete, sender=Stop)
+def _index_stop_deleted(sender, instance, using, **kwargs):
+    index = _indexes.get(using)
+    if index is not None and index.loaded_at is not None:
+        stop_id = instance.id
+        transaction.on_commit(lambda: index.remove(stop_id), using=using)
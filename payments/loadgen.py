@@ -0,0 +1,169 @@
+# payments/loadgen.py
+
+"""
+أدوات توليد حمل بسيطة (stdlib فقط) لأوامر الـ load test والمحاكاة:
+عميل HTTP/1.1 على asyncio مع keep-alive، وتجميع latency/throughput.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+class AsyncHTTPClient:
+    """
+    اتصال keep-alive واحد لكل client (يمثّل جهاز واحد أو راكب واحد).
+    """
+    def __init__(self, base_url, timeout=30.0):
+        parts        = urlsplit(base_url)
+        self.host    = parts.hostname
+        self.port    = parts.port or 80
+        self.prefix  = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None, headers=None, content_type='application/json'):
+        """
+        يرجع (status, body bytes). body ممكن يكون dict (JSON) أو bytes.
+        """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        body = body or b''
+
+        lines = [
+            f"{method} {self.prefix}{path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(body)}",
+            "Connection: keep-alive",
+        ]
+        if body:
+            lines.append(f"Content-Type: {content_type}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        raw = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+        for attempt in (1, 2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(raw)
+                await self._writer.drain()
+                return await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # السيرفر قفل الاتصال (keep-alive انتهى): نعيد مرة واحدة
+                await self.close()
+                if attempt == 2:
+                    raise
+
+    async def _read_response(self):
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        header_lines = head.decode('latin-1').split("\r\n")
+        status = int(header_lines[0].split(" ", 2)[1])
+
+        headers = {}
+        for line in header_lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).strip(), 16)
+                if size == 0:
+                    await self._reader.readuntil(b"\r\n")
+                    break
+                body += await self._reader.readexactly(size + 2)
+                body  = body[:-2]
+        else:
+            body = await self._reader.readexactly(int(headers.get('content-length', 0)))
+
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, body
+
+
+def percentile(sorted_values, pct):
+    """percentile بالـ nearest-rank على قائمة مرتّبة."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """
+    تجميع النتائج لكل endpoint: latency بالمللي ثانية، عدد الأخطاء، throughput.
+    """
+    def __init__(self):
+        self.latencies = {}
+        self.statuses  = {}
+        self.errors    = Counter()
+        self.started   = time.perf_counter()
+        self.finished  = None
+
+    def record(self, name, seconds, status):
+        self.latencies.setdefault(name, []).append(seconds * 1000.0)
+        self.statuses.setdefault(name, Counter())[status] += 1
+
+    def record_error(self, name, exc):
+        self.errors[f"{name}: {type(exc).__name__}"] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        wall = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        total = 0
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            total += len(values)
+            statuses = self.statuses[name]
+            failed   = sum(count for code, count in statuses.items() if code >= 400)
+            endpoints[name] = {
+                'requests':   len(values),
+                'error_rate': round(failed / len(values), 4),
+                'statuses':   dict(statuses),
+                'p50_ms':     round(percentile(values, 50), 2),
+                'p95_ms':     round(percentile(values, 95), 2),
+                'p99_ms':     round(percentile(values, 99), 2),
+                'rps':        round(len(values) / wall, 1) if wall else 0.0,
+            }
+        return {
+            'wall_seconds':      round(wall, 3),
+            'requests':          total,
+            'throughput_rps':    round(total / wall, 1) if wall else 0.0,
+            'transport_errors':  dict(self.errors),
+            'endpoints':         endpoints,
+        }
+
+
+async def timed_request(stats, name, client, method, path, **kwargs):
+    """
+    يرسل طلب ويسجّل زمنه؛ يرجع (status, body) أو (None, None) عند فشل النقل.
+    """
+    started = time.perf_counter()
+    try:
+        status, body = await client.request(method, path, **kwargs)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+        stats.record_error(name, exc)
+        await client.close()
+        return None, None
+    stats.record(name, time.perf_counter() - started, status)
+    return status, body
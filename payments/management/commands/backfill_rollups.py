@@ -0,0 +1,136 @@
+# payments/management/commands/backfill_rollups.py
+
+import datetime
+import itertools
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from payments import sharding
+from payments.models import (
+    DailyDriverStats, DailyRouteStats, HourlyRidership,
+    Payment, Transfer, Trip,
+)
+
+
+class Command(BaseCommand):
+    """
+    python manage.py backfill_rollups [--from 2025-01-01] [--to 2025-01-31]
+
+    يعيد بناء جداول التجميع لمدى أيام (بتوقيت TIME_ZONE) من Payment و Trip
+    (والـ Transfer المربوط برحلة: أجرة عميل من shard تاني):
+    يمسح صفوف كل يوم ويحسبها من جديد بـ GROUP BY واحد لكل جدول، يوم في كل معاملة.
+    الافتراضي: النهارده بس.
+    """
+    help = "Rebuild daily route/driver and hourly ridership rollups for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First local date (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='date_to', help='Last local date (YYYY-MM-DD), inclusive.')
+
+    def handle(self, *args, **options):
+        # كل shard له مدفوعاته ورحلاته وجداول تجميعه
+        for alias in sharding.shards():
+            if sharding.enabled():
+                self.stdout.write(f"[{alias}]")
+            with sharding.use_shard(alias):
+                self.handle_shard(**options)
+
+    def handle_shard(self, **options):
+        today = timezone.localdate()
+        try:
+            date_from = datetime.date.fromisoformat(options['date_from']) if options['date_from'] else today
+            date_to   = datetime.date.fromisoformat(options['date_to'])   if options['date_to']   else date_from
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+        if date_from > date_to:
+            raise CommandError("--from must not be after --to")
+
+        # يوم في كل معاملة، والحساب والاستبدال جوه نفس المعاملة بعد قفل جداول التجميع
+        # (lock_rollups)، عشان دفعة حية (rollups._bump) ما تضيعش بينهم. مدى طويل ما
+        # يوقفش الدفع الحي غير يوم واحد في المرة
+        connection = connections[sharding.current_shard()]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Rebuilding live rollups is not supported on {connection.vendor}.")
+        totals = {'routes': 0, 'drivers': 0, 'hourly': 0}
+        day = date_from
+        while day <= date_to:
+            with sharding.atomic():
+                self.lock_rollups(connection)
+                for name, n in self.rebuild_day(day).items():
+                    totals[name] += n
+            day += datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {date_from} → {date_to}: {totals['routes']} route-days, "
+            f"{totals['drivers']} driver-days, {totals['hourly']} route-hours."
+        ))
+
+    def lock_rollups(self, connection):
+        """
+        SQLite: المعاملة IMMEDIATE قافلة كل الكتابة أصلًا.
+        PostgreSQL (READ COMMITTED): قفل الصفوف ما يمنعش _bump ينشئ صف جديد لمسار أو ساعة
+        مالهاش صف، فنقفل الجداول التلاتة ضد الكتابة لحد الـ commit (القراءة مسموحة).
+        الدفعة اللي عملت _bump قبلنا بنستناها تعمل commit فتبان في الحساب، واللي بعدنا
+        تستنى وتزوّد على الصفوف الجديدة.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        tables = ', '.join(connection.ops.quote_name(model._meta.db_table)
+                           for model in (DailyRouteStats, DailyDriverStats, HourlyRidership))
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+
+    def rebuild_day(self, day):
+        # 1) الدفع لكل (مسار، سائق، ساعة) — الباقي يتجمّع منه في الذاكرة.
+        #    أجرة عميل من shard تاني مالهاش Payment هنا: سجلها Transfer على الرحلة
+        fares = [
+            (model.objects
+                  .filter(trip__isnull=False, timestamp__date=day)
+                  .annotate(hour=ExtractHour('timestamp'))
+                  .values('trip__route_id', 'trip__driver_id', 'hour')
+                  .annotate(n=Count('id'), revenue=Sum(amount)))
+            for model, amount in ((Payment, 'fare'), (Transfer, 'amount'))
+        ]
+
+        # 2) الرحلات المغلقة لكل (مسار، سائق)
+        trips = (Trip.objects
+                 .filter(end_time__date=day)
+                 .values('route_id', 'driver_id')
+                 .annotate(n=Count('id')))
+
+        empty  = lambda: {'trips_closed': 0, 'payments': 0, 'revenue': Decimal('0.00')}
+        routes  = defaultdict(empty)
+        drivers = defaultdict(empty)
+        hourly  = defaultdict(lambda: {'payments': 0, 'revenue': Decimal('0.00')})
+
+        for row in itertools.chain(*fares):
+            route_id, driver_id = row['trip__route_id'], row['trip__driver_id']
+            for bucket in (routes[route_id], drivers[driver_id], hourly[route_id, row['hour']]):
+                bucket['payments'] += row['n']
+                bucket['revenue']  += row['revenue']
+
+        for row in trips:
+            routes[row['route_id']]['trips_closed']   += row['n']
+            drivers[row['driver_id']]['trips_closed'] += row['n']
+
+        # 3) استبدال صفوف اليوم
+        DailyRouteStats.objects.filter(date=day).delete()
+        DailyDriverStats.objects.filter(date=day).delete()
+        HourlyRidership.objects.filter(date=day).delete()
+
+        DailyRouteStats.objects.bulk_create(
+            [DailyRouteStats(route_id=r, date=day, **v) for r, v in routes.items()],
+            batch_size=1000)
+        DailyDriverStats.objects.bulk_create(
+            [DailyDriverStats(driver_id=dr, date=day, **v) for dr, v in drivers.items()],
+            batch_size=1000)
+        HourlyRidership.objects.bulk_create(
+            [HourlyRidership(route_id=r, date=day, hour=h, **v) for (r, h), v in hourly.items()],
+            batch_size=1000)
+        return {'routes': len(routes), 'drivers': len(drivers), 'hourly': len(hourly)}
@@ -0,0 +1,162 @@
+# payments/management/commands/bench_db_profile.py
+
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from payments import seeding
+from payments.loadgen import percentile
+from payments.models import Driver
+from payments.services import start_trip
+
+FARE = Decimal('5.00')
+
+# إعدادات Django الافتراضية لـ SQLite: rollback journal، fsync كامل، معاملات DEFERRED
+BASELINE = {
+    'CONN_MAX_AGE': 0,
+    'OPTIONS':      {'init_command': 'PRAGMA journal_mode=DELETE'},
+}
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_db_profile [--threads 8] [--taps 200] [--json out.json]
+
+    يقارن throughput الدفع (update_balance بـ action=payment) تحت كتّاب متزامنين
+    بين إعدادات SQLite الافتراضية وبروفايل settings.DATABASES (WAL + busy timeout
+    + IMMEDIATE + CONN_MAX_AGE). كل بروفايل على ملف SQLite مؤقت جديد بنفس البيانات.
+    """
+    help = "Compare concurrent tap throughput between default SQLite settings and the configured profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writers (one worker thread each).')
+        parser.add_argument('--taps', type=int, default=200, help='Taps per thread.')
+        parser.add_argument('--drivers', type=int, default=10)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_db_profile compares SQLite profiles; the default database is not SQLite.")
+
+        configured = connections.settings['default']
+        profiles = {
+            'default-sqlite': BASELINE,
+            'configured': {
+                'CONN_MAX_AGE': configured.get('CONN_MAX_AGE', 0),
+                'OPTIONS':      dict(configured.get('OPTIONS', {})),
+            },
+        }
+
+        setup_test_environment()
+        results = {}
+        try:
+            for name, profile in profiles.items():
+                self.stdout.write(f"→ {name}: {options['threads']} threads × {options['taps']} taps")
+                # الـ throttles كانت هترفض أغلب الضغط (نفس العملاء ونفس الـ IP)
+                with override_settings(THROTTLE_BUCKETS={}):
+                    results[name] = self._run_profile(profile, options)
+                row = results[name]
+                self.stdout.write(
+                    f"  {row['taps_per_second']} taps/s  p50={row['p50_ms']}ms p95={row['p95_ms']}ms "
+                    f"p99={row['p99_ms']}ms errors={row['errors']}/{row['taps']}"
+                )
+        finally:
+            teardown_test_environment()
+
+        base, tuned = results['default-sqlite'], results['configured']
+        if base['taps_per_second']:
+            self.stdout.write(self.style.SUCCESS(
+                f"configured vs default: {tuned['taps_per_second'] / base['taps_per_second']:.2f}x throughput, "
+                f"errors {base['errors']} → {tuned['errors']}"))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _run_profile(self, profile, options):
+        db_settings = connections.settings['default']
+        saved       = {key: db_settings.get(key) for key in ('CONN_MAX_AGE', 'OPTIONS', 'TEST')}
+        fd, path    = tempfile.mkstemp(suffix='.sqlite3', prefix='ptpay-bench-')
+        os.close(fd)
+
+        # الـ settings dict مشترك بين اتصالات كل الـ threads
+        db_settings.update(profile)
+        db_settings['TEST'] = {**(saved['TEST'] or {}), 'NAME': path}
+        connection.close()
+        connection.settings_dict.update(profile)
+        connection.settings_dict['TEST'] = db_settings['TEST']
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            data = seeding.seed(drivers=options['drivers'], customers=options['threads'] * 4)
+            for driver in Driver.objects.filter(id__in=[d['id'] for d in data['drivers']]):
+                start_trip(driver, driver.vehicles.first(), driver.assigned_route)
+            connection.close()
+            return self._hammer(data, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            db_settings.update(saved)
+            connection.settings_dict.update(saved)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def _hammer(self, data, options):
+        drivers, riders = data['drivers'], data['customers']
+        latencies, errors = [], [0]
+        lock    = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker(index):
+            client  = Client(raise_request_exception=False)
+            mine    = riders[index * 4:(index + 1) * 4]   # كل thread ليه ركابه: الأرصدة ما تتسابقش
+            balance = {uid: Decimal('1000.00') for uid in mine}
+            local, failed = [], 0
+            barrier.wait()
+            try:
+                for i in range(options['taps']):
+                    uid    = mine[i % len(mine)]
+                    driver = drivers[(index + i) % len(drivers)]
+                    t0 = time.perf_counter()
+                    response = client.post('/api/payments/update_balance/', {
+                        'uid': uid, 'action': 'payment', 'device_id': driver['device_id'],
+                        'new_balance': str(balance[uid] - FARE),
+                    }, content_type='application/json')
+                    local.append((time.perf_counter() - t0) * 1000.0)
+                    if response.status_code == 200:
+                        balance[uid] -= FARE
+                    else:
+                        failed += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(local)
+                    errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        taps = len(latencies)
+        return {
+            'taps':            taps,
+            'errors':          errors[0],
+            'wall_seconds':    round(wall, 3),
+            'taps_per_second': round((taps - errors[0]) / wall, 1) if wall else 0.0,
+            'p50_ms':          round(percentile(latencies, 50), 2),
+            'p95_ms':          round(percentile(latencies, 95), 2),
+            'p99_ms':          round(percentile(latencies, 99), 2),
+        }
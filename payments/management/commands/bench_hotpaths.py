@@ -0,0 +1,291 @@
+# payments/management/commands/bench_hotpaths.py
+
+import datetime
+import http.client
+import json
+import platform
+import subprocess
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from payments import seeding
+from payments.loadgen import percentile
+from payments.models import Driver, Trip
+from payments.services import close_trip, start_trip
+
+FARE = Decimal('5.00')
+
+
+# ============================
+# Transports
+# ============================
+class _ClientTransport:
+    """Django test client داخل نفس الـ process: يقيس عدد الاستعلامات كمان."""
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, body=None, headers=None):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            response = self.client.generic(method, path, json.dumps(body or {}),
+                                           content_type='application/json', headers=headers or {})
+        return response.status_code, response.content, count[0]
+
+
+class _HTTPTransport:
+    """
+    سيرفر شغال (runserver / gunicorn) على نفس قاعدة البيانات.
+    اتصال جديد لكل طلب زي الأجهزة: keep-alive على runserver بيضيف ~40ms (delayed ACK)
+    وgunicorn sync بيقفل الاتصال أصلاً.
+    """
+    def __init__(self, url):
+        parts       = urlsplit(url)
+        self.host   = parts.hostname
+        self.port   = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            conn.request(method, self.prefix + path, json.dumps(body or {}),
+                         {'Content-Type': 'application/json', 'Connection': 'close', **(headers or {})})
+            response = conn.getresponse()
+            return response.status, response.read(), None
+        finally:
+            conn.close()
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_hotpaths [--iterations 300] [--json out.json] [--compare base.json]
+    python manage.py bench_hotpaths --url http://127.0.0.1:8000      # سيرفر محلي
+
+    benchmark قابل للتكرار لمسارات الأجرة والـ GPS:
+      payments/process/، qr-uid-payment/، payments/update_balance/ (دفع وشحن)،
+      device/location/، trips/start/ + trips/end/.
+    الافتراضي: قاعدة SQLite مؤقتة (زي الـ tests) + بيانات من payments/seeding.py
+    + Django test client، فالنتيجة تتقارن بين commits بـ --json / --compare.
+    مع --url البيانات بتتزرع في قاعدة البيانات الحالية اللي السيرفر شغال عليها.
+    """
+    help = "Benchmark fare and GPS hot paths: p50/p95/p99 latency, throughput and queries per request."
+
+    SCENARIOS = ('process', 'qr-uid', 'update-balance', 'topup', 'location', 'trip-cycle')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=300, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario.')
+        parser.add_argument('--scenarios', default=','.join(self.SCENARIOS))
+        parser.add_argument('--drivers', type=int, default=20)
+        parser.add_argument('--customers', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--url', help='Benchmark a running server instead of the in-process test client.')
+        parser.add_argument('--db-file', help='File for the throwaway SQLite DB (default: in memory).')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+        parser.add_argument('--compare', help='Print deltas against a previous --json result.')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown   = set(scenarios) - set(self.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        if options['url']:
+            results = self._bench(_HTTPTransport(options['url']), scenarios, options)
+        else:
+            results = self._in_test_db(scenarios, options)
+
+        report = {'meta': self._meta(options), 'results': results}
+        self._print(results)
+        if options['compare']:
+            self._compare(options['compare'], results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+    # ---------- قاعدة مؤقتة ----------
+    def _in_test_db(self, scenarios, options):
+        if options['db_file']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['db_file']
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # بنقيس الـ endpoints نفسها: كل الطلبات من نفس الـ "IP" والـ throttles هترد 429
+            with override_settings(THROTTLE_BUCKETS={}):
+                return self._bench(_ClientTransport(), scenarios, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    # ---------- السيناريوهات ----------
+    def _bench(self, transport, scenarios, options):
+        data = seeding.seed(drivers=options['drivers'], customers=options['customers'], seed=options['seed'])
+        drivers, riders = data['drivers'], data['customers']
+        paths    = {r['id']: seeding.route_path(r['stops']) for r in data['routes']}
+        balances = {uid: Decimal('1000.00') for uid in riders}
+        tokens   = {d['id']: seeding.driver_token(d['id']) for d in drivers}
+
+        # رحلة نشطة + QR لكل سائق (خارج القياس)
+        trips = {}
+        for driver in Driver.objects.filter(id__in=tokens).select_related('assigned_route'):
+            vehicle = driver.vehicles.first()
+            trip    = start_trip(driver, vehicle, driver.assigned_route)
+            trips[driver.id] = (trip.id, trip.get_qr_token())
+
+        def rider(i):
+            return riders[(i * 7919) % len(riders)]
+
+        def remember(uid, body):
+            try:
+                balances[uid] = Decimal(str(json.loads(body)['new_balance']))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        def process(i):
+            d, uid = drivers[i % len(drivers)], rider(i)
+            return [('process', 'POST', '/api/payments/process/',
+                     {'uid': uid, 'trip_id': trips[d['id']][0], 'fare': str(FARE), 'payment_method': 'nfc'},
+                     None, uid)]
+
+        def qr_uid(i):
+            d, uid = drivers[i % len(drivers)], rider(i)
+            return [('qr-uid', 'POST', '/api/qr-uid-payment/',
+                     {'token': trips[d['id']][1], 'uid': uid, 'fare': str(FARE)}, None, uid)]
+
+        def update_balance(i):
+            d, uid = drivers[i % len(drivers)], rider(i)
+            return [('update-balance', 'POST', '/api/payments/update_balance/',
+                     {'uid': uid, 'action': 'payment', 'device_id': d['device_id'],
+                      'new_balance': str(balances[uid] - FARE)}, None, uid)]
+
+        def topup(i):
+            uid = rider(i)
+            return [('topup', 'POST', '/api/payments/update_balance/',
+                     {'uid': uid, 'action': 'topup', 'new_balance': str(balances[uid] + FARE)}, None, uid)]
+
+        def location(i):
+            # الأتوبيس بيتحرك بين المحطات: نص النقط جوه محطة ونصها في النص بينهم
+            d    = drivers[i % len(drivers)]
+            path = paths[d['route_id']]
+            step = i // len(drivers)
+            a, b = path[(step // 2) % len(path)], path[(step // 2 + 1) % len(path)]
+            t    = 0.0 if step % 2 == 0 else 0.5
+            lat, lng = a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t
+            return [('location', 'POST', '/api/device/location/',
+                     {'device_id': d['device_id'], 'latitude': lat, 'longitude': lng}, None, None)]
+
+        def trip_cycle(i):
+            d    = drivers[i % len(drivers)]
+            auth = {'Authorization': f"Bearer {tokens[d['id']]}"}
+            return [
+                ('trip-start', 'POST', '/api/trips/start/',
+                 {'vehicle_id': d['vehicle_id'], 'route_id': d['route_id']}, auth, None),
+                ('trip-end', 'POST', '/api/trips/end/', {}, auth, None),
+            ]
+
+        builders = {
+            'process': process, 'qr-uid': qr_uid, 'update-balance': update_balance,
+            'topup': topup, 'location': location, 'trip-cycle': trip_cycle,
+        }
+
+        results = {}
+        for name in scenarios:
+            if name == 'trip-cycle':
+                # trips/start/ يرفض سائق عنده رحلة نشطة
+                for trip in Trip.objects.filter(end_time__isnull=True):
+                    close_trip(trip, in_zone=False)
+
+            samples = {}
+            started = time.perf_counter()
+            for i in range(options['warmup'] + options['iterations']):
+                measured = i >= options['warmup']
+                for label, method, path, body, headers, uid in builders[name](i):
+                    t0 = time.perf_counter()
+                    status, content, queries = transport.request(method, path, body, headers)
+                    elapsed = time.perf_counter() - t0
+                    if uid:
+                        remember(uid, content)
+                    if measured:
+                        samples.setdefault(label, []).append((elapsed, status, queries))
+                if i + 1 == options['warmup']:
+                    started = time.perf_counter()
+            wall = time.perf_counter() - started
+
+            for label, rows in samples.items():
+                results[label] = self._summary(rows, wall)
+        return results
+
+    @staticmethod
+    def _summary(rows, wall):
+        latencies = sorted(r[0] * 1000.0 for r in rows)
+        queries   = [r[2] for r in rows if r[2] is not None]
+        errors    = sum(1 for r in rows if r[1] >= 400)
+        return {
+            'requests':        len(rows),
+            'errors':          errors,
+            'p50_ms':          round(percentile(latencies, 50), 3),
+            'p95_ms':          round(percentile(latencies, 95), 3),
+            'p99_ms':          round(percentile(latencies, 99), 3),
+            'mean_ms':         round(sum(latencies) / len(latencies), 3),
+            'throughput_rps':  round(len(rows) / wall, 1) if wall else 0.0,
+            'queries_per_req': round(sum(queries) / len(queries), 2) if queries else None,
+            'max_queries':     max(queries) if queries else None,
+        }
+
+    # ---------- التقرير ----------
+    def _meta(self, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit':     commit,
+            'timestamp':  datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python':     platform.python_version(),
+            'django':     django.get_version(),
+            'database':   connection.vendor,
+            'target':     options['url'] or 'test-client',
+            'iterations': options['iterations'],
+            'drivers':    options['drivers'],
+            'customers':  options['customers'],
+            'seed':       options['seed'],
+        }
+
+    def _print(self, results):
+        self.stdout.write(f"{'scenario':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'q/req':>7}{'err':>6}")
+        for name, row in results.items():
+            qpr = '-' if row['queries_per_req'] is None else f"{row['queries_per_req']:g}"
+            self.stdout.write(
+                f"{name:<16}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+                f"{row['throughput_rps']:>9.1f}{qpr:>7}{row['errors']:>6}"
+            )
+
+    def _compare(self, path, results):
+        with open(path) as fh:
+            base = json.load(fh)
+        self.stdout.write(f"\nvs {path} (commit {base['meta'].get('commit')}):")
+        for name, row in results.items():
+            old = base['results'].get(name)
+            if not old:
+                continue
+            delta = (row['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            line  = f"  {name:<16} p50 {old['p50_ms']:.2f} → {row['p50_ms']:.2f} ms ({delta:+.1f}%)"
+            if row['queries_per_req'] is not None and old.get('queries_per_req') is not None:
+                line += f", queries {old['queries_per_req']:g} → {row['queries_per_req']:g}"
+            style = self.style.SUCCESS if delta <= 0 else self.style.WARNING
+            self.stdout.write(style(line))
+
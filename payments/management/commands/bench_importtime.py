@@ -0,0 +1,111 @@
+# payments/management/commands/bench_importtime.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# اللي العامل بيعمله من أول ما يتعمله fork لحد أول طلب، في interpreter جديد
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+urls = time.perf_counter()
+report = {}
+if sys.argv[2] == '1':
+    from payments.warmup import warm_up
+    report = warm_up()
+done = time.perf_counter()
+print(json.dumps({
+    'setup_ms':  (setup - started) * 1000,
+    'urls_ms':   (urls - setup) * 1000,
+    'warmup_ms': (done - urls) * 1000,
+    'total_ms':  (done - started) * 1000,
+    'warmup':    report,
+    'modules':   len(sys.modules),
+    'loaded':    [name for name in sys.argv[3].split(',') if name and name in sys.modules],
+}))
+'''
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_importtime [--runs 7] [--no-warmup] [--top 15] [--json out.json]
+
+    زمن الـ cold start لعامل جديد: كل run في process جديد بـ python -X importtime
+    (django.setup → import ROOT_URLCONF، يعني كل الـ views → warm_up)، ويطبع الـ median
+    لكل مرحلة، وأتقل الموديولات (cumulative) من أول run، وهل الموديولات التقيلة
+    (--heavy: qrcode و PIL افتراضيًا) اتحمّلت وقت الإقلاع ولا فضلت كسولة.
+    """
+    help = "Measure cold-start import and warm-up time of a fresh worker process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=7)
+        parser.add_argument('--no-warmup', action='store_true', help='Skip payments.warmup.warm_up().')
+        parser.add_argument('--top', type=int, default=15, help='Slowest modules to list.')
+        parser.add_argument('--heavy', default='qrcode,PIL,PIL.Image',
+                            help='Modules that should stay lazy (comma separated).')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings')}
+        argv = [sys.executable, '-X', 'importtime', '-c', CHILD,
+                settings.ROOT_URLCONF, '0' if options['no_warmup'] else '1', options['heavy']]
+
+        runs, modules = [], []
+        for i in range(max(1, options['runs'])):
+            proc = subprocess.run(argv, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'child failed')
+            lines = proc.stdout.strip().splitlines()
+            runs.append(json.loads(lines[-1]))
+            if i == 0:
+                modules = self._parse_importtime(proc.stderr)
+
+        summary = {
+            key: round(statistics.median(run[key] for run in runs), 1)
+            for key in ('setup_ms', 'urls_ms', 'warmup_ms', 'total_ms')
+        }
+        summary['modules'] = runs[0]['modules']
+        summary['loaded']  = runs[0]['loaded']
+        summary['warmup']  = runs[0]['warmup']
+        summary['slowest'] = modules[:options['top']]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"cold start (median of {len(runs)}): {summary['total_ms']}ms = "
+            f"setup {summary['setup_ms']}ms + urls/views {summary['urls_ms']}ms + warm-up {summary['warmup_ms']}ms"
+        ))
+        self.stdout.write(f"  {summary['modules']} modules loaded")
+        for step, row in summary['warmup'].items():
+            self.stdout.write(f"  warm-up {step:<6} {row['ms']}ms ({row['items']} items)")
+        if summary['loaded']:
+            self.stdout.write(self.style.WARNING(f"  loaded at boot: {', '.join(summary['loaded'])}"))
+        else:
+            self.stdout.write(f"  lazy: {options['heavy']}")
+        self.stdout.write("  slowest imports (cumulative):")
+        for name, self_us, cumulative_us in summary['slowest']:
+            self.stdout.write(f"    {cumulative_us / 1000:8.1f}ms ({self_us / 1000:.1f}ms self)  {name}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(summary, fh, indent=2)
+
+    def _parse_importtime(self, stderr):
+        """سطور 'import time: self | cumulative | name' → [(name, self_us, cumulative_us)] الأتقل الأول."""
+        rows = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            parts = line[len('import time:'):].split('|')
+            if len(parts) != 3 or not parts[0].strip().isdigit():
+                continue
+            rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+        return sorted(rows, key=lambda row: row[2], reverse=True)
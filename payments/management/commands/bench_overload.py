@@ -0,0 +1,158 @@
+# payments/management/commands/bench_overload.py
+
+import asyncio
+import json
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import seeding
+from payments.loadgen import AsyncHTTPClient, LoadStats, timed_request
+from payments.models import Customer, Driver, Payment, Trip
+from payments.services import start_trip
+
+FARE = Decimal('5.00')
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_overload \\
+        --target off=http://127.0.0.1:8000 --target on=http://127.0.0.1:8001 \\
+        --payers 20 --history 80 --telemetry 40 --duration 30
+
+    يضغط السيرفر بخليط: ركاب بيدفعوا (update_balance) + عملاء بيفتحوا سجل مدفوعاتهم
+    (customers/<uid>/payments/) + أجهزة بتبعت GPS، كل عميل حلقة مغلقة (طلب ورا طلب)،
+    ويطبع p50/p99 ونسبة 503 لكل endpoint. الفكرة تشغيل نفس الكود مرتين:
+    سيرفر بـ PTPAY_LOAD_SHED_CAPACITY=0 وسيرفر بالـ shedding، والاتنين بـ PTPAY_THROTTLE_*_RATE=0
+    وعلى نفس قاعدة البيانات دي (البيانات بتتزرع هنا). السيرفر يكون ASGI أو WSGI بـ threads
+    (PTPAY_LOAD_SHED_WSGI_THREADS = --threads)، عامل sync بـ thread واحد عمره ما يرفض.
+    """
+    help = "Overload a running server with history and telemetry and report payment tail latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='name=base_url, e.g. on=http://127.0.0.1:8001 (repeatable)')
+        parser.add_argument('--payers', type=int, default=20, help='Concurrent riders tapping.')
+        parser.add_argument('--history', type=int, default=80, help='Concurrent payment-history readers.')
+        parser.add_argument('--telemetry', type=int, default=40, help='Concurrent devices sending GPS.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds per target.')
+        parser.add_argument('--history-rows', type=int, default=200,
+                            help='Payments per history customer (makes the history call heavy).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=60.0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        targets = []
+        for item in options['target']:
+            name, sep, url = item.partition('=')
+            if not sep:
+                raise CommandError(f"--target must be name=url, got {item!r}")
+            targets.append((name, url))
+
+        data = self._prepare(options)
+        results = {}
+        for name, url in targets:
+            self.stdout.write(f"→ {name}: {options['payers']} payers, {options['history']} history readers, "
+                              f"{options['telemetry']} devices for {options['duration']:.0f}s against {url}")
+            results[name] = asyncio.run(self._run(url, data, options)).summary()
+            self._print(results[name])
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _prepare(self, options):
+        drivers = max(1, options['telemetry'])
+        # عملاء الـ history عندهم مدفوعات كتير عشان الطلب يبقى تقيل فعلاً
+        data = seeding.seed(cities=1, routes=2, drivers=drivers,
+                            customers=options['payers'] + options['history'],
+                            balance=Decimal('100000.00'), seed=options['seed'])
+        for driver in Driver.objects.filter(id__in=[d['id'] for d in data['drivers']]):
+            start_trip(driver, driver.vehicles.first(), driver.assigned_route)
+
+        readers = data['customers'][options['payers']:]
+        if readers and options['history_rows']:
+            trip = Trip.objects.filter(driver_id=data['drivers'][0]['id'], end_time__isnull=True).first()
+            rows = [
+                Payment(customer=customer, trip=trip, fare=FARE, new_balance=Decimal('100000.00'),
+                        payment_method='nfc')
+                for customer in Customer.objects.filter(uid__in=readers)
+                for _ in range(options['history_rows'])
+            ]
+            Payment.objects.bulk_create(rows, batch_size=2000)
+        self.stdout.write(f"Seeded {len(data['drivers'])} buses, {len(data['customers'])} riders.")
+        return data
+
+    async def _run(self, url, data, options):
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + options['duration']
+        stats    = LoadStats()
+        drivers  = data['drivers']
+        payers   = data['customers'][:options['payers']]
+        readers  = data['customers'][options['payers']:]
+
+        async def closed_loop(make_request):
+            client = AsyncHTTPClient(url, timeout=options['timeout'])
+            try:
+                while loop.time() < deadline:
+                    status = await make_request(client)
+                    if status == 503:
+                        # عميل محترم: يستنى شوية قبل ما يعيد (مش Retry-After كامل عشان الضغط يفضل)
+                        await asyncio.sleep(0.05)
+            finally:
+                await client.close()
+
+        def payer(index, uid):
+            rng     = random.Random(options['seed'] * 31 + index)
+            balance = Decimal('100000.00')
+
+            async def tap(client):
+                nonlocal balance
+                driver = rng.choice(drivers)
+                status, body = await timed_request(
+                    stats, 'update-balance', client, 'POST', '/api/payments/update_balance/',
+                    body={'uid': uid, 'action': 'payment', 'device_id': driver['device_id'],
+                          'new_balance': str(balance - FARE)})
+                if status == 200:
+                    balance = Decimal(str(json.loads(body)['new_balance']))
+                return status
+            return tap
+
+        def reader(uid):
+            async def history(client):
+                status, _ = await timed_request(stats, 'customer-payments', client, 'GET',
+                                                f'/api/customers/{uid}/payments/')
+                return status
+            return history
+
+        def device(index, driver):
+            rng = random.Random(options['seed'] * 17 + index)
+
+            async def ping(client):
+                status, _ = await timed_request(stats, 'location', client, 'POST', '/api/device/location/', body={
+                    'device_id': driver['device_id'],
+                    'latitude':  rng.uniform(29.9, 30.2),
+                    'longitude': rng.uniform(31.1, 31.4),
+                })
+                return status
+            return ping
+
+        await asyncio.gather(
+            *(closed_loop(payer(i, uid)) for i, uid in enumerate(payers)),
+            *(closed_loop(reader(uid)) for uid in readers),
+            *(closed_loop(device(i, drivers[i % len(drivers)])) for i in range(options['telemetry'])),
+        )
+        stats.stop()
+        return stats
+
+    def _print(self, summary):
+        for endpoint, row in sorted(summary['endpoints'].items()):
+            shed = row['statuses'].get(503, 0)
+            self.stdout.write(
+                f"  {endpoint:<18} n={row['requests']:<6} p50={row['p50_ms']}ms p99={row['p99_ms']}ms "
+                f"503={shed / row['requests']:.1%} errors={row['error_rate']:.2%}"
+            )
+        if summary['transport_errors']:
+            self.stdout.write(self.style.WARNING(f"  transport errors: {summary['transport_errors']}"))
@@ -0,0 +1,130 @@
+# payments/management/commands/bench_payloads.py
+
+import io
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.text import compress_string
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from myproject import middleware
+from payments import renderers, seeding
+from payments.models import Customer, Driver, Payment, Trip
+from payments.services import start_trip
+from payments.views import CustomerPaymentsAPIView, RouteListCreateAPIView
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_payloads [--rows 500] [--routes 20] [--stops 12] [--repeat 20] [--json out.json]
+
+    على قاعدة SQLite مؤقتة، لردّين كبار: customers/<uid>/payments/ (--rows دفعة)
+    و routes/ (مسارات بمحطاتها):
+      1) render / parse: JSONRenderer و JSONParser بتوع DRF قصاد payments/renderers.py
+         (orjson)، والقيم لازم تطلع هي هي
+      2) الضغط: الحجم والزمن لـ gzip (زي CompressionMiddleware) و brotli لو متسطب
+      3) طلب حقيقي بـ Accept-Encoding عشان نتأكد إن الـ middleware شغال
+    """
+    help = "Measure JSON render/parse and compression cost on large API payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Payments in the customer history.')
+        parser.add_argument('--routes', type=int, default=20, help='Routes per city (2 cities).')
+        parser.add_argument('--stops', type=int, default=12, help='Stops per route.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"JSON backend: {renderers.backend}, brotli: "
+                          f"{'yes' if middleware.brotli is not None else 'no'}")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            uid     = self._seed(options)
+            factory = APIRequestFactory()
+            cases   = {
+                'customer-payments': (
+                    lambda: CustomerPaymentsAPIView.as_view()(factory.get(f'/api/customers/{uid}/payments/'), uid=uid),
+                    f'/api/customers/{uid}/payments/',
+                ),
+                'routes': (
+                    lambda: RouteListCreateAPIView.as_view()(factory.get('/api/routes/')),
+                    '/api/routes/',
+                ),
+            }
+            results = {name: self._measure(name, call, path, options) for name, (call, path) in cases.items()}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _seed(self, options):
+        data = seeding.seed(cities=2, routes=options['routes'], stops=options['stops'],
+                            drivers=10, customers=1)
+        trips = [start_trip(driver, driver.vehicles.first(), driver.assigned_route)
+                 for driver in Driver.objects.filter(id__in=[d['id'] for d in data['drivers']])]
+        customer = Customer.objects.get(uid=data['customers'][0])
+        Payment.objects.bulk_create([
+            Payment(customer=customer, trip=trips[i % len(trips)], fare=Decimal('7.50'),
+                    new_balance=Decimal('1000') - i, payment_method='nfc')
+            for i in range(options['rows'])
+        ])
+        Trip.objects.filter(id__in=[t.id for t in trips[::2]]).update(in_zone=True)
+        return customer.uid
+
+    def _timed(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result  = fn()
+            best    = min(best, time.perf_counter() - started)
+        return result, round(best * 1000, 3)
+
+    def _measure(self, name, call, path, options):
+        repeat = options['repeat']
+        data   = call().data
+
+        # 1) render / parse
+        drf, fast        = JSONRenderer(), renderers.FastJSONRenderer()
+        body, drf_ms     = self._timed(lambda: drf.render(data), repeat)
+        fast_body, ms    = self._timed(lambda: fast.render(data), repeat)
+        if json.loads(fast_body) != json.loads(body):
+            raise CommandError(f"{name}: FastJSONRenderer output differs from JSONRenderer.")
+        _, parse_drf_ms  = self._timed(lambda: JSONParser().parse(io.BytesIO(body)), repeat)
+        _, parse_fast_ms = self._timed(lambda: renderers.FastJSONParser().parse(io.BytesIO(body)), repeat)
+
+        row = {
+            'bytes': len(body),
+            'render_ms': {'drf': drf_ms, 'fast': ms},
+            'parse_ms':  {'drf': parse_drf_ms, 'fast': parse_fast_ms},
+        }
+
+        # 2) compression
+        gz, gz_ms = self._timed(lambda: compress_string(body, max_random_bytes=100), repeat)
+        row['gzip'] = {'bytes': len(gz), 'ms': gz_ms}
+        if middleware.brotli is not None:
+            br, br_ms = self._timed(lambda: middleware.brotli.compress(body, quality=4), repeat)
+            row['brotli'] = {'bytes': len(br), 'ms': br_ms}
+
+        # 3) end to end
+        response = Client().get(path, HTTP_ACCEPT_ENCODING='gzip, br')
+        row['wire'] = {'encoding': response.get('Content-Encoding', 'identity'), 'bytes': len(response.content)}
+
+        self.stdout.write(self.style.SUCCESS(f"{name}: {len(body)} bytes"))
+        self.stdout.write(f"  render  drf={drf_ms}ms fast={ms}ms   parse  drf={parse_drf_ms}ms fast={parse_fast_ms}ms")
+        for codec in ('gzip', 'brotli'):
+            if codec in row:
+                c = row[codec]
+                self.stdout.write(f"  {codec:<7} {c['bytes']} bytes ({c['bytes'] / len(body):.1%}) in {c['ms']}ms")
+        self.stdout.write(f"  wire    {row['wire']['encoding']} {row['wire']['bytes']} bytes")
+        return row
@@ -0,0 +1,151 @@
+# payments/management/commands/bench_serializers.py
+
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from payments import fast_serializers, seeding
+from payments.models import Customer, Driver, Payment, Trip
+from payments.serializers import DriverSerializer, PaymentSerializer, TripSerializer
+from payments.services import start_trip
+
+
+class Command(BaseCommand):
+    """
+    python manage.py bench_serializers [--rows 500] [--repeat 5] [--check] [--json out.json]
+
+    على قاعدة SQLite مؤقتة ببيانات مزروعة:
+      1) parity: JSON الـ serializers الأصلية (TripSerializer / PaymentSerializer /
+         DriverSerializer) لازم يطابق payments/fast_serializers.py بايت ببايت
+      2) microbenchmark: زمن كل صف (µs) وعدد الاستعلامات للاتنين، أحسن نتيجة من --repeat
+    --check يخرج بخطأ لو فيه أي اختلاف (للـ CI).
+    """
+    help = "Check fast serializers against the DRF serializers and measure per-row cost."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Payments to serialize.')
+        parser.add_argument('--drivers', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--check', action='store_true', help='Exit with an error on any mismatch.')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._seed(options)
+            request = RequestFactory().get('/api/')
+            cases = {
+                'payment': (
+                    lambda: Payment.objects.order_by('-timestamp', '-id'),
+                    lambda qs: PaymentSerializer(qs, many=True).data,
+                    lambda qs: fast_serializers.payment_rows(qs),
+                ),
+                'trip': (
+                    lambda: Trip.objects.order_by('id'),
+                    lambda qs: TripSerializer(qs, many=True).data,
+                    lambda qs: list(fast_serializers.trip_rows(qs.values_list('id', flat=True)).values()),
+                ),
+                'driver': (
+                    lambda: Driver.objects.order_by('id'),
+                    lambda qs: DriverSerializer(qs, many=True, context={'request': request}).data,
+                    lambda qs: fast_serializers.driver_rows(qs, request),
+                ),
+            }
+            results, mismatches = {}, 0
+            for name, (queryset, drf, fast) in cases.items():
+                row = self._compare(name, queryset, drf, fast, options)
+                mismatches += not row['parity']
+                results[name] = row
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+        if mismatches and options['check']:
+            raise CommandError(f"{mismatches} serializer(s) differ from the DRF output.")
+
+    def _seed(self, options):
+        rng  = random.Random(options['seed'])
+        data = seeding.seed(drivers=options['drivers'], customers=max(10, options['rows'] // 20),
+                            seed=options['seed'])
+        trips = [start_trip(driver, driver.vehicles.first(), driver.assigned_route)
+                 for driver in Driver.objects.filter(id__in=[d['id'] for d in data['drivers']])]
+        # نص الرحلات مقفولة، وسائق بصورة عشان نختبر الـ URL
+        Trip.objects.filter(id__in=[t.id for t in trips[::2]]).update(end_time=timezone.now(), in_zone=True)
+        Driver.objects.filter(id=trips[0].driver_id).update(driver_photo='drivers/photos/bench.jpg')
+
+        customers = list(Customer.objects.values_list('id', flat=True))
+        Payment.objects.bulk_create([
+            Payment(customer_id=rng.choice(customers),
+                    trip=None if i % 25 == 0 else rng.choice(trips),
+                    fare=Decimal(rng.choice(['5', '7.5', '10.00'])),
+                    new_balance=Decimal('1000') - i,
+                    payment_method=rng.choice(['nfc', 'qr']))
+            for i in range(options['rows'])
+        ], batch_size=1000)
+
+    def _compare(self, name, queryset, drf, fast, options):
+        renderer = JSONRenderer()
+        expected = renderer.render(drf(queryset()))
+        actual   = renderer.render(fast(queryset()))
+        parity   = expected == actual
+        rows     = len(json.loads(actual))
+
+        timings = {}
+        for label, fn in (('drf', drf), ('fast', fast)):
+            best, queries = float('inf'), 0
+            for _ in range(options['repeat']):
+                count = [0]
+
+                def counter(execute, sql, params, many, context):
+                    count[0] += 1
+                    return execute(sql, params, many, context)
+
+                started = time.perf_counter()
+                with connection.execute_wrapper(counter):
+                    renderer.render(fn(queryset()))
+                best    = min(best, time.perf_counter() - started)
+                queries = count[0]
+            timings[label] = {'us_per_row': round(best / max(rows, 1) * 1e6, 1), 'queries': queries}
+
+        speedup = timings['drf']['us_per_row'] / max(timings['fast']['us_per_row'], 0.1)
+        style   = self.style.SUCCESS if parity else self.style.ERROR
+        self.stdout.write(style(
+            f"{name:<8} rows={rows:<5} parity={'ok' if parity else 'MISMATCH'}  "
+            f"drf={timings['drf']['us_per_row']}µs/row ({timings['drf']['queries']} q)  "
+            f"fast={timings['fast']['us_per_row']}µs/row ({timings['fast']['queries']} q)  {speedup:.1f}x"
+        ))
+        if not parity:
+            self._first_difference(json.loads(expected), json.loads(actual))
+        return {'rows': rows, 'parity': parity, **timings, 'speedup': round(speedup, 1)}
+
+    def _first_difference(self, expected, actual, path='$'):
+        if type(expected) is not type(actual):
+            self.stdout.write(f"  {path}: {expected!r} != {actual!r}")
+            return True
+        if isinstance(expected, dict):
+            if list(expected) != list(actual):
+                self.stdout.write(f"  {path}: keys {list(expected)} != {list(actual)}")
+                return True
+            return any(self._first_difference(expected[k], actual[k], f"{path}.{k}") for k in expected)
+        if isinstance(expected, list):
+            if len(expected) != len(actual):
+                self.stdout.write(f"  {path}: {len(expected)} items != {len(actual)}")
+                return True
+            return any(self._first_difference(e, a, f"{path}[{i}]") for i, (e, a) in enumerate(zip(expected, actual)))
+        if expected != actual:
+            self.stdout.write(f"  {path}: {expected!r} != {actual!r}")
+            return True
+        return False
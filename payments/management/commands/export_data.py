@@ -0,0 +1,50 @@
+# payments/management/commands/export_data.py
+
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments import exports
+
+
+class Command(BaseCommand):
+    """
+    python manage.py export_data payments --from 2025-01-01 --to 2025-01-31 [--format jsonl] [-o out.csv]
+
+    نفس stream الـ endpoint (payments/exports.py) لملف أو stdout:
+    ذاكرة ثابتة حتى لشهر كامل من المدفوعات أو نقاط الـ GPS.
+    """
+    help = "Stream payments, trips, transfers or device locations for a date range to CSV / JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--from', dest='date_from', help='First local date (YYYY-MM-DD), default today.')
+        parser.add_argument('--to', dest='date_to', help='Last local date (YYYY-MM-DD), inclusive.')
+        parser.add_argument('--format', dest='fmt', choices=exports.FORMATS, default='csv')
+        parser.add_argument('-o', '--output', help='Output file (default stdout).')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = (datetime.date.fromisoformat(options['date_from'])
+                         if options['date_from'] else timezone.localdate())
+            date_to   = datetime.date.fromisoformat(options['date_to']) if options['date_to'] else date_from
+            lines     = exports.stream(options['dataset'], date_from, date_to,
+                                       options['fmt'], options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        count = 0
+        try:
+            for line in lines:
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}."))
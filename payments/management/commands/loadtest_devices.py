@@ -0,0 +1,119 @@
+# payments/management/commands/loadtest_devices.py
+
+import asyncio
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.loadgen import AsyncHTTPClient, LoadStats, timed_request
+from payments.models import Customer, Device
+
+
+class Command(BaseCommand):
+    """
+    python manage.py loadtest_devices \\
+        --target sync=http://127.0.0.1:8000 --target async=http://127.0.0.1:8001 \\
+        --devices 1000 --requests 5
+
+    يحاكي N جهاز متزامنين (اتصال keep-alive لكل جهاز) على endpoints الأجهزة
+    ويقارن throughput و p50/p95/p99 بين سيرفر WSGI (gunicorn sync) وسيرفر ASGI
+    (gunicorn_asgi.conf.py). السيرفرات لازم تكون شغالة على نفس قاعدة البيانات.
+    """
+    help = "Compare sync vs async throughput of the device endpoints at N concurrent devices."
+
+    ENDPOINTS = ('location', 'active-trip', 'update-balance')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='name=base_url, e.g. async=http://127.0.0.1:8001 (repeatable)')
+        parser.add_argument('--devices', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=5, help='Requests per device per endpoint.')
+        parser.add_argument('--endpoints', default=','.join(self.ENDPOINTS))
+        parser.add_argument('--bbox', default='29.9,31.1,30.2,31.4',
+                            help='min_lat,min_lng,max_lat,max_lng for random GPS fixes.')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        targets = []
+        for item in options['target']:
+            name, sep, url = item.partition('=')
+            if not sep:
+                raise CommandError(f"--target must be name=url, got {item!r}")
+            targets.append((name, url))
+
+        endpoints = [e for e in options['endpoints'].split(',') if e]
+        unknown   = set(endpoints) - set(self.ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        device_ids = list(Device.objects.filter(driver__isnull=False).values_list('id', flat=True))
+        if not device_ids:
+            raise CommandError("No devices with an assigned driver; seed data first.")
+        uids = list(Customer.objects.exclude(uid__isnull=True).values_list('uid', flat=True)[:options['devices']])
+        if 'update-balance' in endpoints and not uids:
+            raise CommandError("update-balance needs at least one customer.")
+
+        bbox    = [float(x) for x in options['bbox'].split(',')]
+        results = {}
+        for name, url in targets:
+            self.stdout.write(f"→ {name}: {options['devices']} devices against {url}")
+            stats = asyncio.run(self._run(url, device_ids, uids, endpoints, bbox, options))
+            results[name] = stats.summary()
+            self._print(name, results[name])
+
+        if len(results) > 1:
+            base_name, base = next(iter(results.items()))
+            for name, summary in list(results.items())[1:]:
+                if base['throughput_rps']:
+                    ratio = summary['throughput_rps'] / base['throughput_rps']
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{name} vs {base_name}: {ratio:.2f}x throughput"))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    async def _run(self, url, device_ids, uids, endpoints, bbox, options):
+        stats = LoadStats()
+
+        async def one_device(index):
+            rng       = random.Random(index)
+            device_id = device_ids[index % len(device_ids)]
+            client    = AsyncHTTPClient(url, timeout=options['timeout'])
+            try:
+                for _ in range(options['requests']):
+                    if 'location' in endpoints:
+                        await timed_request(stats, 'location', client, 'POST', '/api/device/location/', body={
+                            'device_id': device_id,
+                            'latitude':  rng.uniform(bbox[0], bbox[2]),
+                            'longitude': rng.uniform(bbox[1], bbox[3]),
+                        })
+                    if 'active-trip' in endpoints:
+                        await timed_request(stats, 'active-trip', client, 'POST', '/api/device/active-trip/',
+                                            body={'device_id': device_id})
+                    if 'update-balance' in endpoints:
+                        # topup بنفس الرصيد تقريبًا: يختبر مسار الكتابة بدون ما يحتاج رحلة نشطة
+                        await timed_request(stats, 'update-balance', client, 'POST', '/api/payments/update_balance/',
+                                            body={'uid': uids[index % len(uids)], 'action': 'topup',
+                                                  'new_balance': '100.00', 'device_id': device_id})
+            finally:
+                await client.close()
+
+        await asyncio.gather(*(one_device(i) for i in range(options['devices'])))
+        stats.stop()
+        return stats
+
+    def _print(self, name, summary):
+        self.stdout.write(
+            f"  {summary['requests']} requests in {summary['wall_seconds']}s "
+            f"= {summary['throughput_rps']} req/s"
+        )
+        for endpoint, row in summary['endpoints'].items():
+            self.stdout.write(
+                f"  {endpoint:<15} p50={row['p50_ms']}ms p95={row['p95_ms']}ms "
+                f"p99={row['p99_ms']}ms errors={row['error_rate']:.2%}"
+            )
+        if summary['transport_errors']:
+            self.stdout.write(self.style.WARNING(f"  transport errors: {summary['transport_errors']}"))
@@ -0,0 +1,154 @@
+# payments/management/commands/reconcile_wallets.py
+
+import csv
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from payments import sharding
+from payments.models import (
+    Customer, CustomerWallet, Payment, Transfer, TopUp,
+    ReconciliationCheckpoint,
+)
+
+
+class Command(BaseCommand):
+    """
+    python manage.py reconcile_wallets [--chunk-size 2000] [--report out.csv] [--dry-run]
+
+    مطابقة تزايدية لمحافظ العملاء:
+      - تقرأ فقط الـ Payment / Transfer / TopUp الأحدث من آخر checkpoint
+      - تحسب التغيّر المتوقع لكل محفظة اتلمست
+      - تقارن reconciled_balance + التغيّر مع الرصيد الفعلي وتطبع الفروقات
+    تكلفة التشغيل تتناسب مع نشاط اليوم وليس مع كل التاريخ. الـ scan برا أي معاملة،
+    والمقارنة وتحديث الـ checkpoint في معاملة واحدة قصيرة على المحافظ اللي اتلمست بس.
+    """
+    help = "Incrementally reconcile customer wallets against top-ups, payments and transfers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--report', help='Write discrepancies to this CSV file.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Do not advance the checkpoint or reconciled balances.')
+
+    def handle(self, *args, **options):
+        # كل shard له حركاته ومحافظه والـ checkpoint بتاعه
+        for alias in sharding.shards():
+            if sharding.enabled():
+                self.stdout.write(f"[{alias}]")
+            with sharding.use_shard(alias):
+                self.handle_shard(**options)
+
+    def handle_shard(self, **options):
+        chunk = options['chunk_size']
+        checkpoint, _ = ReconciliationCheckpoint.objects.get_or_create(name='wallets')
+
+        # 1) نثبّت الـ high-water marks في بداية التشغيل
+        hw_payment  = Payment.objects.aggregate(m=Max('id'))['m']  or 0
+        hw_transfer = Transfer.objects.aggregate(m=Max('id'))['m'] or 0
+        hw_topup    = TopUp.objects.aggregate(m=Max('id'))['m']    or 0
+
+        # 2) تجميع التغيّر لكل عميل من الحركات الجديدة فقط. قراءة بس وبرا أي معاملة:
+        #    على SQLite المعاملة بتاخد قفل الكتابة وتوقف الدفع طول الـ scan
+        deltas = self._deltas(checkpoint.last_payment_id, checkpoint.last_transfer_id,
+                              checkpoint.last_topup_id, (hw_payment, hw_transfer, hw_topup), chunk)
+
+        # 3) مقارنة المحافظ التي تغيّرت فقط، في معاملة قصيرة: حركات بعد الـ marks (جت أثناء
+        #    الـ scan) تتطرح من الرصيد الحالي عشان نقارن رصيد اللحظة دي بالظبط
+        discrepancies = []
+        to_update     = []
+        initialised   = 0
+        customer_ids  = sorted(deltas)
+        with sharding.atomic():
+            wallets = []
+            for i in range(0, len(customer_ids), chunk):
+                # القفل قبل قراءة الحركات المتأخرة: أي دفعة على المحفظة يا إما خلصت يا إما تستنانا
+                wallets += CustomerWallet.objects.select_for_update() \
+                                                 .filter(customer_id__in=customer_ids[i:i + chunk]) \
+                                                 .order_by('id') \
+                                                 .only('id', 'customer_id', 'balance', 'reconciled_balance')
+            late = self._deltas(hw_payment, hw_transfer, hw_topup, None, chunk)
+
+            for wallet in wallets:
+                balance = wallet.balance - late[wallet.customer_id]
+                if wallet.reconciled_balance is None:
+                    # أول مرة نشوف المحفظة: نعتبر رصيدها هو الأساس
+                    initialised += 1
+                else:
+                    expected = wallet.reconciled_balance + deltas[wallet.customer_id]
+                    if expected != balance:
+                        discrepancies.append((
+                            wallet.id, wallet.customer_id,
+                            wallet.reconciled_balance, expected, balance,
+                            balance - expected,
+                        ))
+                wallet.reconciled_balance = balance
+                to_update.append(wallet)
+
+            # 4) تقدّم الـ checkpoint
+            if not options['dry_run']:
+                CustomerWallet.objects.bulk_update(to_update, ['reconciled_balance'], batch_size=chunk)
+                checkpoint.last_payment_id  = hw_payment
+                checkpoint.last_transfer_id = hw_transfer
+                checkpoint.last_topup_id    = hw_topup
+                checkpoint.last_run_at      = timezone.now()
+                checkpoint.save()
+
+        header = ('wallet_id', 'customer_id', 'reconciled_balance', 'expected', 'actual', 'drift')
+        if options['report']:
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(header)
+                writer.writerows(discrepancies)
+
+        for row in discrepancies:
+            self.stdout.write(self.style.WARNING(
+                "Wallet {} (customer {}): expected {} actual {} drift {}".format(
+                    row[0], row[1], row[3], row[4], row[5])
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {len(to_update)} wallets ({initialised} initialised), "
+            f"{len(discrepancies)} discrepancies. "
+            f"High-water marks: payment={hw_payment} transfer={hw_transfer} topup={hw_topup}"
+            + (" (dry run)" if options['dry_run'] else "")
+        ))
+
+    def _deltas(self, after_payment, after_transfer, after_topup, upto, chunk):
+        """
+        التغيّر المتوقع لكل customer_id من الحركات بعد الـ ids دي (ولحد upto =
+        (payment, transfer, topup) لو متحدد).
+        """
+        def moves(model, after, upto_id, *fields):
+            qs = model.objects.filter(id__gt=after)
+            if upto_id is not None:
+                qs = qs.filter(id__lte=upto_id)
+            return qs.values_list(*fields).iterator(chunk_size=chunk)
+
+        up_payment, up_transfer, up_topup = upto or (None, None, None)
+        deltas = defaultdict(Decimal)
+
+        for customer_id, amount in moves(TopUp, after_topup, up_topup, 'customer_id', 'amount'):
+            deltas[customer_id] += amount
+
+        for customer_id, fare in moves(Payment, after_payment, up_payment, 'customer_id', 'fare'):
+            deltas[customer_id] -= fare
+
+        phone_deltas = defaultdict(Decimal)
+        for sender_phone, receiver_phone, amount in moves(Transfer, after_transfer, up_transfer,
+                                                          'sender_phone', 'receiver_phone', 'amount'):
+            phone_deltas[sender_phone]   -= amount
+            phone_deltas[receiver_phone] += amount
+
+        # أرقام السائقين لا تطابق أي عميل فتُتجاهل هنا
+        phones = list(phone_deltas)
+        for i in range(0, len(phones), chunk):
+            rows = (Customer.objects
+                    .filter(phone__in=phones[i:i + chunk])
+                    .values_list('id', 'phone'))
+            for customer_id, phone in rows:
+                deltas[customer_id] += phone_deltas[phone]
+        return deltas
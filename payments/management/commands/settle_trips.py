@@ -0,0 +1,26 @@
+# payments/management/commands/settle_trips.py
+
+from django.core.management.base import BaseCommand
+
+from payments import sharding
+from payments.services import settle_closed_trips
+
+
+class Command(BaseCommand):
+    """
+    python manage.py settle_trips [--chunk-size 500]
+
+    يُشغَّل دوريًا (cron) مع PAYMENTS_SETTLEMENT_MODE='batch' (PTPAY_PAYMENTS_SETTLEMENT_MODE=batch):
+    يرحّل كل الرحلات المغلقة غير المرحّلة دفعة واحدة (دفعة لكل shard)، بمعاملة لكل
+    --chunk-size رحلة عشان الكتابات الحية ما تستناش الدفعة كلها.
+    """
+    help = "Settle pending balances of all closed, unsettled trips in one batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Trips per transaction.')
+
+    def handle(self, *args, **options):
+        for alias in sharding.shards():
+            with sharding.use_shard(alias):
+                batch, count = settle_closed_trips(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Settled {count} trips on {alias} (batch {batch})."))
@@ -0,0 +1,198 @@
+# payments/management/commands/simulate_fleet.py
+
+import asyncio
+import json
+import random
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import seeding
+from payments.loadgen import AsyncHTTPClient, LoadStats, timed_request
+from payments.models import Trip
+
+FARE = Decimal('5.00')
+
+
+class Command(BaseCommand):
+    """
+    python manage.py simulate_fleet --url http://127.0.0.1:8000 --buses 50 --riders 500 --duration 120
+
+    محاكاة تشغيل حقيقي بدل ضرب endpoint واحد:
+      - يزرع مسارات بمحطات + سائقين بأجهزة ومركبات + عملاء (payments/seeding.py)
+        في قاعدة البيانات الحالية (لازم تكون نفس قاعدة السيرفر)
+      - كل أتوبيس يمشي على مساره ويبعت device/location/، يبدأ رحلة (trips/start/)
+        لما الرحلة اللي قبلها تتقفل بدخول محطة، يولّد QR، وينهي الرحلة في آخر المسار
+      - كل راكب يدفع كل شوية في أتوبيس عليه رحلة نشطة: NFC (update_balance)
+        أو QR (qr-uid-payment/) ويشحن لما رصيده يقل
+    النتيجة: throughput ونسبة الأخطاء و p50/p95/p99 لكل endpoint.
+    """
+    help = "Simulate buses moving along routes and riders tapping, against a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True, help='Base URL of the running server.')
+        parser.add_argument('--buses', type=int, default=20)
+        parser.add_argument('--riders', type=int, default=200)
+        parser.add_argument('--routes', type=int, default=0, help='Routes to generate (default: buses / 4).')
+        parser.add_argument('--stops', type=int, default=8, help='Stops per route.')
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run.')
+        parser.add_argument('--ping-interval', type=float, default=1.0, help='Seconds between GPS pings per bus.')
+        parser.add_argument('--pings-per-leg', type=int, default=6,
+                            help='Pings between two stops (the first two are inside the stop).')
+        parser.add_argument('--tap-interval', type=float, default=5.0, help='Mean seconds between taps per rider.')
+        parser.add_argument('--qr-ratio', type=float, default=0.3, help='Share of taps paid by QR.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['buses'] < 1 or options['riders'] < 0:
+            raise CommandError("Need at least one bus.")
+
+        routes = options['routes'] or max(1, options['buses'] // 4)
+        data   = seeding.seed(cities=1, routes=routes, stops=options['stops'], drivers=options['buses'],
+                              customers=options['riders'], seed=options['seed'])
+        self.stdout.write(f"Seeded {routes} routes, {options['buses']} buses, {options['riders']} riders.")
+
+        stats, counters = asyncio.run(self._run(data, options))
+        summary = stats.summary()
+        summary['counters'] = counters
+        self._print(summary)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(summary, fh, indent=2)
+
+    async def _run(self, data, options):
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + options['duration']
+        stats    = LoadStats()
+        active   = {}   # driver_id -> {'trip_id', 'device_id'}: الأتوبيسات اللي ينفع الركوب فيها
+        counters = {'trips_started': 0, 'trips_ended': 0, 'pings': 0, 'nfc_taps': 0, 'qr_taps': 0, 'topups': 0}
+        paths    = {r['id']: seeding.route_path(r['stops']) for r in data['routes']}
+        url      = options['url']
+
+        qr_token = sync_to_async(
+            lambda trip_id: Trip.objects.filter(id=trip_id).values_list('qr_token', flat=True).first())
+
+        async def bus(index, driver):
+            rng    = random.Random(options['seed'] * 100003 + index)
+            client = AsyncHTTPClient(url, timeout=options['timeout'])
+            auth   = {'Authorization': f"Bearer {seeding.driver_token(driver['id'])}"}
+            device = driver['device_id']
+            path   = paths[driver['route_id']]
+            legs   = options['pings_per_leg']
+
+            async def ensure_trip():
+                # الرحلة بتتقفل على السيرفر أول ما الأتوبيس يدخل محطة؛ نبدأ واحدة جديدة
+                status, body = await timed_request(stats, 'active-trip', client, 'POST', '/api/device/active-trip/',
+                                                   body={'device_id': device})
+                if status == 200 and json.loads(body).get('active'):
+                    return
+                active.pop(driver['id'], None)
+                status, body = await timed_request(
+                    stats, 'trip-start', client, 'POST', '/api/trips/start/',
+                    body={'vehicle_id': driver['vehicle_id'], 'route_id': driver['route_id']}, headers=auth)
+                if status != 201:
+                    return
+                trip_id = json.loads(body)['id']
+                counters['trips_started'] += 1
+                await timed_request(stats, 'generate-qr', client, 'GET', f'/api/trips/{trip_id}/generate-qr/')
+                active[driver['id']] = {'trip_id': trip_id, 'device_id': device}
+
+            # بداية متفرّقة حتى لا تضرب كل الأتوبيسات في نفس اللحظة
+            await asyncio.sleep(rng.uniform(0, options['ping_interval']))
+            try:
+                while loop.time() < deadline:
+                    await ensure_trip()
+                    for a, b in zip(path, path[1:]):
+                        for k in range(legs):
+                            if loop.time() >= deadline:
+                                return
+                            # أول نقطتين جوه المحطة (تأكيد الدخول)، والباقي في الطريق للمحطة الجاية
+                            t = 0.0 if k < 2 else (k - 1) / legs
+                            await timed_request(stats, 'location', client, 'POST', '/api/device/location/', body={
+                                'device_id': device,
+                                'latitude':  a[0] + (b[0] - a[0]) * t + rng.uniform(-2e-5, 2e-5),
+                                'longitude': a[1] + (b[1] - a[1]) * t + rng.uniform(-2e-5, 2e-5),
+                            })
+                            counters['pings'] += 1
+                            await asyncio.sleep(options['ping_interval'] * rng.uniform(0.8, 1.2))
+                        await ensure_trip()
+
+                    # آخر المسار: إنهاء الرحلة يدويًا والرجوع من الأول
+                    if active.pop(driver['id'], None):
+                        status, _ = await timed_request(stats, 'trip-end', client, 'POST', '/api/trips/end/',
+                                                        body={}, headers=auth)
+                        if status == 200:
+                            counters['trips_ended'] += 1
+                    path = path[::-1]
+            finally:
+                await client.close()
+
+        async def rider(index, uid):
+            rng     = random.Random(options['seed'] * 7919 + index)
+            client  = AsyncHTTPClient(url, timeout=options['timeout'])
+            balance = Decimal('1000.00')
+
+            def remember(status, body):
+                nonlocal balance
+                if status == 200:
+                    balance = Decimal(str(json.loads(body)['new_balance']))
+
+            try:
+                while True:
+                    await asyncio.sleep(rng.expovariate(1.0 / options['tap_interval']))
+                    if loop.time() >= deadline:
+                        return
+                    if not active:
+                        continue
+
+                    if balance < FARE * 2:
+                        status, body = await timed_request(
+                            stats, 'topup', client, 'POST', '/api/payments/update_balance/',
+                            body={'uid': uid, 'action': 'topup', 'new_balance': str(balance + Decimal('200.00'))})
+                        remember(status, body)
+                        counters['topups'] += 1
+
+                    ride = active.get(rng.choice(list(active)))
+                    if ride is None:
+                        continue
+                    if rng.random() < options['qr_ratio']:
+                        # الراكب "بيصوّر" الـ QR المعروض: نقرأ التوكن الحالي من قاعدة البيانات
+                        token = await qr_token(ride['trip_id'])
+                        status, body = await timed_request(
+                            stats, 'qr-tap', client, 'POST', '/api/qr-uid-payment/',
+                            body={'token': token, 'uid': uid, 'fare': str(FARE)})
+                        counters['qr_taps'] += 1
+                    else:
+                        status, body = await timed_request(
+                            stats, 'nfc-tap', client, 'POST', '/api/payments/update_balance/',
+                            body={'uid': uid, 'action': 'payment', 'device_id': ride['device_id'],
+                                  'new_balance': str(balance - FARE)})
+                        counters['nfc_taps'] += 1
+                    remember(status, body)
+            finally:
+                await client.close()
+
+        await asyncio.gather(
+            *(bus(i, d) for i, d in enumerate(data['drivers'])),
+            *(rider(i, uid) for i, uid in enumerate(data['customers'])),
+        )
+        stats.stop()
+        return stats, counters
+
+    def _print(self, summary):
+        self.stdout.write(
+            f"{summary['requests']} requests in {summary['wall_seconds']}s "
+            f"= {summary['throughput_rps']} req/s"
+        )
+        for endpoint, row in sorted(summary['endpoints'].items()):
+            self.stdout.write(
+                f"  {endpoint:<12} n={row['requests']:<6} p50={row['p50_ms']}ms p95={row['p95_ms']}ms "
+                f"p99={row['p99_ms']}ms errors={row['error_rate']:.2%}"
+            )
+        self.stdout.write("  " + ", ".join(f"{k}={v}" for k, v in summary['counters'].items()))
+        if summary['transport_errors']:
+            self.stdout.write(self.style.WARNING(f"  transport errors: {summary['transport_errors']}"))
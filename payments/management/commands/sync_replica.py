@@ -0,0 +1,56 @@
+# payments/management/commands/sync_replica.py
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    python manage.py sync_replica [--interval 2]
+
+    بديل محلي للتكرار (replication) لما الـ primary والـ replica ملفين SQLite:
+    ينسخ الـ primary كله للـ replica بـ sqlite3 backup API (نسخة متسقة حتى والكتابة شغالة).
+    --interval يكرر النسخ كل N ثانية لحد Ctrl+C، وده عمليًا تأخير الـ replica.
+    """
+    help = "Copy the SQLite primary into the SQLite read replica (stand-in for real replication)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every N seconds until interrupted (0 = copy once).')
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages per backup step; the primary is unlocked between steps.')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+        if not alias or alias not in connections:
+            raise CommandError("No read replica configured (set PTPAY_DB_REPLICA_NAME).")
+        primary, replica = connections['default'].settings_dict, connections[alias].settings_dict
+        if connections['default'].vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError("sync_replica only copies SQLite files; use the server's replication otherwise.")
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError("Primary and replica point at the same file.")
+
+        while True:
+            started = time.perf_counter()
+            self._copy(str(primary['NAME']), str(replica['NAME']), options['pages'])
+            self.stdout.write(f"Synced {replica['NAME']} in {(time.perf_counter() - started) * 1000:.0f}ms")
+            if not options['interval']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
+
+    @staticmethod
+    def _copy(source_path, target_path, pages):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path, timeout=30)
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:08
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_topup_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Settlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('batch', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='payments.driver')),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='settlement', to='payments.trip')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_settlement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devicelocation',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
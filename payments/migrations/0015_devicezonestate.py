@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0014_devicelocation_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceZoneState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('confirmed_in_zone', models.BooleanField(blank=True, null=True)),
+                ('candidate_in_zone', models.BooleanField(blank=True, null=True)),
+                ('candidate_since', models.DateTimeField(blank=True, null=True)),
+                ('candidate_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='zone_state', to='payments.device')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0015_devicezonestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_sequences', to='payments.driver')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('driver', 'date'), name='unique_trip_sequence_per_driver_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:17
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0016_tripsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDriverStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('trips_closed', models.PositiveIntegerField(default=0)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='payments.driver')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily driver stats',
+                'constraints': [models.UniqueConstraint(fields=('driver', 'date'), name='unique_daily_driver_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRouteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('trips_closed', models.PositiveIntegerField(default=0)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='payments.route')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily route stats',
+                'constraints': [models.UniqueConstraint(fields=('route', 'date'), name='unique_daily_route_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRidership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_ridership', to='payments.route')),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly ridership',
+                'constraints': [models.UniqueConstraint(fields=('route', 'date', 'hour'), name='unique_hourly_ridership')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0017_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardDirectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('uid', 'UID'), ('phone', 'Phone'), ('device', 'Device')], max_length=6)),
+                ('key', models.CharField(max_length=100)),
+                ('shard', models.CharField(max_length=50)),
+            ],
+            options={
+                'verbose_name_plural': 'Shard directory',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='unique_shard_directory_key')],
+            },
+        ),
+    ]
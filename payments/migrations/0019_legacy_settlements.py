@@ -0,0 +1,46 @@
+# payments/migrations/0019_legacy_settlements.py
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    """
+    الرحلات اللي اتقفلت قبل 0013 اترحّلت بالكود القديم (pending_balance كله → balance
+    عند الإغلاق) من غير صف Settlement، فأول settle_trips كان هيرحّلها تاني. نسجّل لها
+    Settlement(batch='legacy') بمجموع أجرتها، من غير ما نلمس المحافظ.
+    """
+    alias      = schema_editor.connection.alias
+    Trip       = apps.get_model('payments', 'Trip')
+    Settlement = apps.get_model('payments', 'Settlement')
+    zero       = models.Value(Decimal('0.00'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+
+    rows = (
+        Trip.objects.using(alias)
+            .filter(end_time__isnull=False, settlement__isnull=True)
+            .annotate(total=Coalesce(models.Sum('payment__fare'), zero))
+            .values_list('id', 'driver_id', 'total')
+    )
+    Settlement.objects.using(alias).bulk_create(
+        (Settlement(trip_id=trip_id, driver_id=driver_id, amount=total, batch='legacy')
+         for trip_id, driver_id, total in rows.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+def unbackfill(apps, schema_editor):
+    Settlement = apps.get_model('payments', 'Settlement')
+    Settlement.objects.using(schema_editor.connection.alias).filter(batch='legacy').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0018_sharddirectory'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, unbackfill, hints={'model_name': 'settlement'}),
+    ]
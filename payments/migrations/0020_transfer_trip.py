@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0019_legacy_settlements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='trip',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fare_transfers', to='payments.trip'),
+        ),
+    ]
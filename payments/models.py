@@ -5,12 +5,15 @@ from decimal import Decimal
 from django.contrib.auth.hashers import make_password, identify_hasher
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.utils.crypto import get_random_string
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.db.models import Q, UniqueConstraint
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Governorate(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -32,11 +35,27 @@ class DeviceLocation(models.Model):
     device    = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='locations')
     latitude  = models.FloatField()
     longitude = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default بدل auto_now_add حتى تُحفظ أوقات النقاط المرسلة من الجهاز (binary / batch)
+    timestamp = models.DateTimeField(default=timezone.now)
     class Meta:
         ordering = ['-timestamp']
     def __str__(self):
-        return f"Loc {self.id} of Device {self.device.id} at {self.timestamp}"
+        return f"Loc {self.id} of Device {self.device_id} at {self.timestamp}"
+
+class DeviceZoneState(models.Model):
+    """
+    snapshot لحالة المنطقة للجهاز (payments/zones.py)، يُكتب عند الانتقالات المؤكدة فقط.
+    confirmed_in_zone = None: غير معروف (بعد بداية الرحلة).
+    """
+    device            = models.OneToOneField(Device, on_delete=models.CASCADE, related_name='zone_state')
+    confirmed_in_zone = models.BooleanField(null=True, blank=True)
+    candidate_in_zone = models.BooleanField(null=True, blank=True)
+    candidate_since   = models.DateTimeField(null=True, blank=True)
+    candidate_count   = models.PositiveIntegerField(default=0)
+    updated_at        = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Zone state of Device {self.device_id}: {self.confirmed_in_zone}"
 
 class Customer(models.Model):
     name        = models.CharField(max_length=100)
@@ -157,6 +176,16 @@ class Driver(models.Model):
         except:
             self.password = make_password(raw)
         super().save(*args, **kwargs)
+        # بعد الحفظ تصبح القيمة الحالية هي المرجع لأي تغيير قادم
+        self._loaded_in_zone = self.in_zone
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # snapshot لقيمة in_zone وقت التحميل، بدل إعادة جلب السائق قبل كل save
+        instance = super().from_db(db, field_names, values)
+        if 'in_zone' in field_names:
+            instance._loaded_in_zone = instance.in_zone
+        return instance
 
     def __str__(self):
         return f"{self.name} ({self.national_id})"
@@ -165,6 +194,8 @@ class Driver(models.Model):
 class CustomerWallet(models.Model):
     customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name='wallet')
     balance  = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # آخر رصيد تمّت مطابقته بواسطة reconcile_wallets (null = لم يُطابق بعد)
+    reconciled_balance = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     def __str__(self): return f"Wallet of {self.customer.name}"
 
 class DriverWallet(models.Model):
@@ -257,6 +288,25 @@ class Trip(models.Model):
 
 
 
+class TripSequence(models.Model):
+    """
+    عدّاد رقم الرحلة لكل سائق في اليوم؛ يتزوّد بـ F() بدل SELECT … ORDER BY.
+    """
+    driver      = models.ForeignKey('Driver', on_delete=models.CASCADE, related_name='trip_sequences')
+    date        = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['driver', 'date'], name='unique_trip_sequence_per_driver_day'),
+        ]
+
+    def __str__(self):
+        return f"Driver {self.driver_id} on {self.date}: {self.last_number}"
+
+
+
+
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = (
         ('nfc','NFC Card'),('qr','QR'),('cash','Cash'),('unk','Unknown'),
@@ -279,49 +329,143 @@ class Transfer(models.Model):
     receiver_phone = models.CharField(max_length=11, validators=[MinLengthValidator(11), RegexValidator(r'^\d{11}$')])
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # أجرة من عميل في shard تاني (services.pay_fare): الرحلة اللي اتدفعت عليها
+    trip = models.ForeignKey('Trip', on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='fare_transfers')
 
     def __str__(self):
         return f"Transfer {self.id}: {self.amount} from {self.sender_phone} to {self.receiver_phone}"
 
 
+class Settlement(models.Model):
+    """
+    ترحيل pending_balance إلى balance لرحلة واحدة (صف واحد لكل رحلة).
+    batch فارغ في الوضع الفوري، ومعرّف الدفعة في وضع settle_trips.
+    """
+    trip       = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name='settlement')
+    driver     = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='settlements')
+    amount     = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    batch      = models.CharField(max_length=32, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Settlement {self.id}: {self.amount} for trip {self.trip_id}"
+
+
+# ============================
+# Rollups (payments/rollups.py)
+# ============================
+class DailyRouteStats(models.Model):
+    route        = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='daily_stats')
+    date         = models.DateField()
+    trips_closed = models.PositiveIntegerField(default=0)
+    payments     = models.PositiveIntegerField(default=0)
+    revenue      = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['route', 'date'], name='unique_daily_route_stats')]
+        verbose_name_plural = 'Daily route stats'
+
+    def __str__(self):
+        return f"Route {self.route_id} on {self.date}"
+
+
+class DailyDriverStats(models.Model):
+    driver       = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='daily_stats')
+    date         = models.DateField()
+    trips_closed = models.PositiveIntegerField(default=0)
+    payments     = models.PositiveIntegerField(default=0)
+    revenue      = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['driver', 'date'], name='unique_daily_driver_stats')]
+        verbose_name_plural = 'Daily driver stats'
+
+    def __str__(self):
+        return f"Driver {self.driver_id} on {self.date}"
+
+
+class HourlyRidership(models.Model):
+    route    = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='hourly_ridership')
+    date     = models.DateField()
+    hour     = models.PositiveSmallIntegerField()
+    payments = models.PositiveIntegerField(default=0)
+    revenue  = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['route', 'date', 'hour'], name='unique_hourly_ridership')]
+        verbose_name_plural = 'Hourly ridership'
+
+    def __str__(self):
+        return f"Route {self.route_id} on {self.date} {self.hour:02d}:00"
+
+
+class TopUp(models.Model):
+    """
+    سجل شحن رصيد محفظة العميل (update_balance بـ action=topup).
+    amount هو الفرق بين الرصيد الجديد والقديم.
+    """
+    customer    = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='topups')
+    amount      = models.DecimalField(max_digits=12, decimal_places=2)
+    new_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    timestamp   = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"TopUp {self.id}: {self.amount} for customer {self.customer_id}"
+
+
+class ReconciliationCheckpoint(models.Model):
+    """
+    High-water marks لآخر Payment / Transfer / TopUp تمت معالجتها
+    في مطابقة المحافظ، حتى تعمل المطابقة على نشاط اليوم فقط.
+    """
+    name             = models.CharField(max_length=50, unique=True, default='wallets')
+    last_payment_id  = models.BigIntegerField(default=0)
+    last_transfer_id = models.BigIntegerField(default=0)
+    last_topup_id    = models.BigIntegerField(default=0)
+    last_run_at      = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Checkpoint {self.name} (payment {self.last_payment_id}, transfer {self.last_transfer_id})"
+
+
+# ============================
+# Governorate shards (payments/sharding.py)
+# ============================
+class ShardDirectory(models.Model):
+    """
+    دليل uid / phone / device → shard (alias قاعدة البيانات). يعيش في الـ default دايمًا.
+    """
+    KIND_CHOICES = (('uid', 'UID'), ('phone', 'Phone'), ('device', 'Device'))
+
+    kind  = models.CharField(max_length=6, choices=KIND_CHOICES)
+    key   = models.CharField(max_length=100)
+    shard = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['kind', 'key'], name='unique_shard_directory_key')]
+        verbose_name_plural = 'Shard directory'
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} → {self.shard}"
+
 
-@receiver(pre_save, sender=Driver)
-def _cache_old_in_zone(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old = Driver.objects.get(pk=instance.pk)
-            instance._old_in_zone = old.in_zone
-        except Driver.DoesNotExist:
-            instance._old_in_zone = False
 
 @receiver(post_save, sender=Driver)
-def _on_in_zone_changed(sender, instance, created, **kwargs):
-    if created or not hasattr(instance, '_old_in_zone'):
+def _on_in_zone_changed(sender, instance, created, update_fields=None, **kwargs):
+    # القيمة القديمة من snapshot التحميل (Driver.from_db) بدون أي SELECT إضافي
+    if created or not hasattr(instance, '_loaded_in_zone'):
+        return
+    if update_fields is not None and 'in_zone' not in update_fields:
         return
 
-    was_in = instance._old_in_zone
+    was_in = instance._loaded_in_zone
     now_in = instance.in_zone
     if not was_in and now_in:
-        # طباعة للتتبع (اختياري)
-        print(f"[signal] Driver {instance.id} دخل in_zone – سيُنهى Trip ويرحّل الرصيد.")
+        logger.debug("Driver %s entered in_zone: closing the active trip", instance.id)
 
-        try:
-            trip = Trip.objects.filter(
-                driver=instance, end_time__isnull=True
-            ).latest('start_time')
-            trip.end_time = timezone.now()
-            trip.in_zone  = True
-            trip.save(update_fields=['end_time', 'in_zone'])
-        except Trip.DoesNotExist:
-            return
-
-        try:
-            dw = DriverWallet.objects.get(driver=instance)
-            dw.balance         += dw.pending_balance
-            dw.pending_balance  = Decimal('0.00')
-            dw.save(update_fields=['balance', 'pending_balance'])
-        except DriverWallet.DoesNotExist:
-            pass
+        from .services import close_active_trip
+        close_active_trip(instance, in_zone=True)
 
 
 
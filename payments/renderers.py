@@ -0,0 +1,65 @@
+# payments/renderers.py
+
+"""
+JSON renderer / parser أسرع لـ DRF (REST_FRAMEWORK في settings).
+
+orjson (في requirements.txt) بيعمل الـ encode/decode (C/Rust، أسرع بكتير من json +
+JSONEncoder بتاع DRF على قوائم المدفوعات والمسارات الكبيرة)؛ ولو مش متسطب الاتنين
+بيرجعوا لـ JSONRenderer / JSONParser الأصليين.
+
+المخرجات نفس قيم JSON بتاعة DRF (tests.RendererParityTests): compact، UTF-8 من غير
+escaping، و \\u2028 / \\u2029 متعملهم escape، وأي نوع orjson ما يعرفوش (Decimal،
+datetime، lazy strings ...) بيروح لـ encoders.JSONEncoder.default بتاع DRF. الفرق:
+  - كتابة الـ float ممكن تختلف (1.5e-7 بدل 1.5e-07)، والقيمة هي هي
+  - NaN / Infinity بتطلع null، و DRF (STRICT_JSON) بيرفضها بـ ValueError
+  - int أكبر من 64 bit: orjson بيرفضه فبنرجع لـ DRF
+"""
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+backend = 'orjson' if orjson is not None else 'json'
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def __init__(self):
+        self._default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # indent (الـ browsable API أو ?indent=) و ensure_ascii: نسيبهم لـ DRF
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # datetime بتعدي على DRF عشان "+00:00" تبقى "Z" زي الـ encoder الأصلي
+        try:
+            ret = orjson.dumps(data, default=self._default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding       = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,67 @@
+# payments/rollups.py
+
+"""
+جداول التجميع اليومية/بالساعة (DailyRouteStats, DailyDriverStats, HourlyRidership)
+تتحدّث تدريجيًا مع كل دفع (post_save على Payment) ومع إغلاق كل رحلة
+(services.close_trip)، وتتبني من الصفر بأمر backfill_rollups.
+"""
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import sharding
+from .models import (
+    DailyDriverStats, DailyRouteStats, HourlyRidership,
+    Payment, Trip,
+)
+
+
+def _bump(model, keys, **increments):
+    """
+    UPDATE … SET col = col + n، ولو الصف مش موجود يتعمل؛
+    لو طلب تاني سبقنا للإنشاء نرجع للـ UPDATE.
+    """
+    updates = {field: F(field) + value for field, value in increments.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with sharding.atomic():
+            model.objects.create(**keys, **increments)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**updates)
+
+
+def record_payment(payment):
+    if not payment.trip_id:
+        return
+
+    if Payment._meta.get_field('trip').is_cached(payment):
+        route_id, driver_id = payment.trip.route_id, payment.trip.driver_id
+    else:
+        route_id, driver_id = Trip.objects.values_list('route_id', 'driver_id').get(pk=payment.trip_id)
+
+    local = timezone.localtime(payment.timestamp)
+    fare  = payment.fare
+    with sharding.atomic():
+        _bump(DailyRouteStats,  {'route_id': route_id, 'date': local.date()}, payments=1, revenue=fare)
+        _bump(DailyDriverStats, {'driver_id': driver_id, 'date': local.date()}, payments=1, revenue=fare)
+        _bump(HourlyRidership,  {'route_id': route_id, 'date': local.date(), 'hour': local.hour},
+              payments=1, revenue=fare)
+
+
+def record_trip_closed(trip):
+    day = timezone.localtime(trip.end_time).date()
+    with sharding.atomic():
+        _bump(DailyRouteStats,  {'route_id': trip.route_id, 'date': day}, trips_closed=1)
+        _bump(DailyDriverStats, {'driver_id': trip.driver_id, 'date': day}, trips_closed=1)
+
+
+@receiver(post_save, sender=Payment)
+def _rollup_payment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # جداول التجميع في نفس الـ shard بتاع الدفع
+        with sharding.use_shard(instance._state.db):
+            record_payment(instance)
@@ -0,0 +1,133 @@
+# payments/seeding.py
+
+"""
+مولّد بيانات تجريبية حتمي (نفس seed = نفس البيانات) للـ benchmarks والمحاكي:
+محافظات → مدن → مسارات بمحطات (bbox لكل محطة) → سائقين بأجهزة ومركبات → عملاء بمحافظ.
+
+كله bulk_create (بدون signals ولا hashing لكل صف)، فـ آلاف العملاء في ثواني.
+"""
+
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils.crypto import get_random_string
+
+from .models import (
+    City, Customer, CustomerWallet, Device, Driver, DriverWallet,
+    Governorate, Route, Stop, Vehicle,
+)
+
+# القاهرة الكبرى تقريبًا: min_lat, min_lng, max_lat, max_lng
+DEFAULT_BBOX   = (29.90, 31.10, 30.20, 31.45)
+STOP_HALF_SIZE = 0.0005   # نص ضلع bbox المحطة بالدرجات (≈ 50 متر)
+PASSWORD       = 'bench-password'
+
+
+def _offset(model):
+    # أرقام فريدة (هاتف / رقم قومي ...) حتى لو القاعدة فيها بيانات من تشغيل سابق
+    return (model.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+
+
+def _digits(prefix, number, width):
+    return f"{prefix}{number:0{width - len(prefix)}d}"
+
+
+def route_path(stops):
+    """مراكز المحطات بالترتيب: المسار اللي الأتوبيس بيمشي عليه."""
+    return [((s[0] + s[1]) / 2, (s[2] + s[3]) / 2) for s in stops]
+
+
+@transaction.atomic
+def seed(governorates=1, cities=2, routes=4, stops=8, drivers=20, customers=200,
+         balance=Decimal('1000.00'), bbox=DEFAULT_BBOX, seed=0):
+    """
+    cities لكل محافظة، routes لكل مدينة، stops لكل مسار.
+    يرجع dict فيه ids و uids اللي يحتاجها الـ benchmark / المحاكي:
+        routes:    [{'id', 'stops': [(min_lat, max_lat, min_lng, max_lng), ...]}]
+        drivers:   [{'id', 'uid', 'device_id', 'vehicle_id', 'route_id'}]
+        customers: [uid, ...]
+    """
+    rng    = random.Random(seed)
+    hashed = make_password(PASSWORD)   # hash واحد لكل الحسابات
+
+    # 1) محافظات ومدن
+    gov_base = _offset(Governorate)
+    govs = Governorate.objects.bulk_create(
+        [Governorate(name=f"Bench Governorate {gov_base + i}") for i in range(governorates)])
+    city_objs = City.objects.bulk_create(
+        [City(name=f"Bench City {gov.id}-{j}", governorate=gov) for gov in govs for j in range(cities)])
+
+    # 2) مسارات بمحطات على خط مستقيم بين نقطتين عشوائيتين
+    min_lat, min_lng, max_lat, max_lng = bbox
+    route_objs = Route.objects.bulk_create([Route(city=city) for city in city_objs for _ in range(routes)])
+    stop_objs, route_rows = [], []
+    for route in route_objs:
+        a = (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+        b = (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+        boxes = []
+        for k in range(stops):
+            t   = k / max(stops - 1, 1)
+            lat = a[0] + (b[0] - a[0]) * t
+            lng = a[1] + (b[1] - a[1]) * t
+            box = (lat - STOP_HALF_SIZE, lat + STOP_HALF_SIZE, lng - STOP_HALF_SIZE, lng + STOP_HALF_SIZE)
+            boxes.append(box)
+            stop_objs.append(Stop(route=route, name=f"Stop {route.id}-{k + 1}",
+                                  min_lat=box[0], max_lat=box[1], min_lng=box[2], max_lng=box[3]))
+        route_rows.append({'id': route.id, 'stops': boxes})
+    Stop.objects.bulk_create(stop_objs, batch_size=1000)
+
+    # 3) سائقين: جهاز + مركبة + مسار لكل سائق
+    drv_base = _offset(Driver)
+    devices  = Device.objects.bulk_create(
+        [Device(name=f"Bench Device {drv_base + i}") for i in range(drivers)])
+    driver_objs = []
+    for i, device in enumerate(devices):
+        n     = drv_base + i
+        route = route_objs[i % len(route_objs)]
+        driver_objs.append(Driver(
+            uid=get_random_string(12), name=f"Bench Driver {n}",
+            national_id=_digits('2', n, 14), phone=_digits('010', n, 11),
+            email=f"bench.driver{n}@gmail.com", password=hashed, license_number=f"BENCH-{n}",
+            governorate=route.city.governorate, city=route.city,
+            assigned_device=device, assigned_route=route,
+        ))
+    driver_objs = Driver.objects.bulk_create(driver_objs, batch_size=500)
+    DriverWallet.objects.bulk_create([DriverWallet(driver=d) for d in driver_objs], batch_size=500)
+    vehicles = Vehicle.objects.bulk_create(
+        [Vehicle(number=f"BENCH-{d.id}", driver=d) for d in driver_objs], batch_size=500)
+
+    # 4) عملاء بمحافظ مشحونة
+    cus_base = _offset(Customer)
+    customer_objs = []
+    for i in range(customers):
+        n    = cus_base + i
+        city = city_objs[i % len(city_objs)]
+        customer_objs.append(Customer(
+            uid=get_random_string(10), name=f"Bench Rider {n}",
+            national_id=_digits('3', n, 14), phone=_digits('011', n, 11),
+            email=f"bench.rider{n}@gmail.com", password=hashed,
+            governorate=city.governorate, city=city,
+        ))
+    customer_objs = Customer.objects.bulk_create(customer_objs, batch_size=500)
+    CustomerWallet.objects.bulk_create(
+        [CustomerWallet(customer=c, balance=balance) for c in customer_objs], batch_size=500)
+
+    return {
+        'routes':    route_rows,
+        'drivers':   [{'id': d.id, 'uid': d.uid, 'device_id': d.assigned_device_id,
+                       'vehicle_id': v.id, 'route_id': d.assigned_route_id}
+                      for d, v in zip(driver_objs, vehicles)],
+        'customers': [c.uid for c in customer_objs],
+    }
+
+
+def driver_token(driver_id):
+    """access token زي اللي بيرجعه driver/token/ (فيه driver_id)."""
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    access = RefreshToken.for_user(Driver(id=driver_id)).access_token
+    access['driver_id'] = driver_id
+    return str(access)
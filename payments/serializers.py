@@ -13,11 +13,16 @@ from .models import (
     Transfer, Payment, DeviceLocation,
     CustomerWallet, DriverWallet,Stop,
 )
+from .fieldsets import SparseFieldsMixin
+
+
+class SparseModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ModelSerializer بـ ?fields= / ?omit= (payments/fieldsets.py)."""
 
 # ============================
 # Serializer for Governorate
 # ============================
-class GovernorateSerializer(serializers.ModelSerializer):
+class GovernorateSerializer(SparseModelSerializer):
     class Meta:
         model = Governorate
         fields = '__all__'
@@ -26,7 +31,7 @@ class GovernorateSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for City
 # ============================
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(SparseModelSerializer):
     class Meta:
         model = City
         fields = '__all__'
@@ -35,7 +40,9 @@ class CitySerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Customer (Passenger)
 # ============================
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseModelSerializer):
+    sparse_sources = {'balance': ('wallet',)}
+
     balance    = SerializerMethodField()
     governorate = serializers.PrimaryKeyRelatedField(
         queryset=Governorate.objects.all(),
@@ -91,7 +98,12 @@ from django.contrib.auth.hashers import make_password
 
 from .models import Driver, Governorate, City, Route, Customer
 
-class DriverSerializer(serializers.ModelSerializer):
+class DriverSerializer(SparseModelSerializer):
+    sparse_sources = {
+        'assigned_route_name': ('assigned_route__stops',),
+        'vehicles':            ('vehicles',),
+    }
+
     assigned_route      = serializers.PrimaryKeyRelatedField(
         queryset=Route.objects.all(),
         required=False,
@@ -162,14 +174,14 @@ class DriverSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Vehicle
 # ============================
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(SparseModelSerializer):
     class Meta:
         model  = Vehicle
         fields = '__all__'
 
 
 
-class StopSerializer(serializers.ModelSerializer):
+class StopSerializer(SparseModelSerializer):
     class Meta:
         model  = Stop
         fields = ['id', 'name', 'min_lat', 'min_lng', 'max_lat', 'max_lng']
@@ -180,7 +192,9 @@ class StopSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Route
 # ============================
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(SparseModelSerializer):
+    sparse_sources = {'display_name': ('stops',)}
+
     stops        = StopSerializer(many=True, read_only=True)
     display_name = serializers.SerializerMethodField()
 
@@ -193,7 +207,17 @@ class RouteSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Trip (with nested route & vehicle)
 # ============================
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(SparseModelSerializer):
+    # paid_passengers بيعدّ بـ count() لكل رحلة: prefetch للمدفوعات كلها أتقل
+    sparse_sources = {
+        'route_name':      ('route__stops',),
+        'start_stop_name': ('route__stops',),
+        'end_stop_name':   ('route__stops',),
+        'vehicle_number':  ('vehicle',),
+        'start_time_iso':  ('start_time',),
+        'paid_passengers': (),
+    }
+
     route             = RouteSerializer(read_only=True)
     vehicle           = VehicleSerializer(read_only=True)
     route_name        = SerializerMethodField()
@@ -231,7 +255,7 @@ class TripSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for CustomerWallet
 # ============================
-class CustomerWalletSerializer(serializers.ModelSerializer):
+class CustomerWalletSerializer(SparseModelSerializer):
     class Meta:
         model  = CustomerWallet
         fields = '__all__'
@@ -240,7 +264,7 @@ class CustomerWalletSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for DriverWallet
 # ============================
-class DriverWalletSerializer(serializers.ModelSerializer):
+class DriverWalletSerializer(SparseModelSerializer):
     class Meta:
         model  = DriverWallet
         fields = '__all__'
@@ -249,7 +273,7 @@ class DriverWalletSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for NFC Card
 # ============================
-class NFCCardSerializer(serializers.ModelSerializer):
+class NFCCardSerializer(SparseModelSerializer):
     class Meta:
         model  = NFCCard
         fields = '__all__'
@@ -258,7 +282,7 @@ class NFCCardSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Transfer
 # ============================
-class TransferSerializer(serializers.ModelSerializer):
+class TransferSerializer(SparseModelSerializer):
     class Meta:
         model  = Transfer
         fields = '__all__'
@@ -267,7 +291,9 @@ class TransferSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for Payment  (بعد التعديل)
 # ============================
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseModelSerializer):
+    sparse_sources = {'customer_name': ('customer',)}
+
     # ❶ للقراءة فقط: يُرجع تفاصيل الرحلة (كما كان) حتى لا يكسر الـ Flutter
     trip = TripSerializer(read_only=True)
 
@@ -303,7 +329,7 @@ class PaymentSerializer(serializers.ModelSerializer):
 # ============================
 # Serializer for DeviceLocation
 # ============================
-class DeviceLocationSerializer(serializers.ModelSerializer):
+class DeviceLocationSerializer(SparseModelSerializer):
     class Meta:
         model  = DeviceLocation
         fields = '__all__'
@@ -0,0 +1,648 @@
+# payments/services.py
+
+import datetime
+import logging
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, router
+from django.db.models import CharField, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.crypto import get_random_string
+
+from . import geoindex, rollups, sharding, zones
+from .models import (
+    Customer, Driver, Trip, Payment,
+    Device, DeviceLocation,
+    CustomerWallet, DriverWallet, Transfer, Settlement,
+    TopUp, TripSequence,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceError(Exception):
+    """
+    خطأ منطقي من طبقة الخدمات؛ الـ view يحوّله لـ Response بنفس الـ status.
+    """
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message     = message
+        self.status_code = status_code
+
+
+# ============================
+# Transfers
+# ============================
+def resolve_parties(*phones):
+    """
+    يرجع {phone: ('customer' | 'driver', id)} باستعلام UNION واحد
+    على أعمدة phone (unique => indexed) في جدولي Customer و Driver.
+    لو الرقم موجود في الاتنين، العميل له الأولوية (نفس ترتيب الكود القديم).
+    """
+    customers = (Customer.objects
+                 .filter(phone__in=phones)
+                 .annotate(kind=Value('customer', output_field=CharField()))
+                 .values_list('phone', 'kind', 'id'))
+    drivers   = (Driver.objects
+                 .filter(phone__in=phones)
+                 .annotate(kind=Value('driver', output_field=CharField()))
+                 .values_list('phone', 'kind', 'id'))
+
+    parties = {}
+    for phone, kind, pk in customers.union(drivers, all=True):
+        if kind == 'customer' or phone not in parties:
+            parties[phone] = (kind, pk)
+    return parties
+
+
+def _wallet_queryset(kind, pk):
+    if kind == 'customer':
+        return CustomerWallet.objects.filter(customer_id=pk)
+    return DriverWallet.objects.filter(driver_id=pk)
+
+
+def _phone_shard(phone):
+    if not sharding.enabled():
+        return sharding.current_shard()
+    return sharding.lookup('phone', phone) or sharding.current_shard()
+
+
+def transfer_balance(from_phone, to_phone, amount):
+    """
+    تحويل رصيد بين محفظتين (عميل أو سائق) بالهاتف.
+    الخصم update مشروط (balance >= amount) والإضافة update بـ F()،
+    الاتنين مع إنشاء سجل Transfer في نفس المعاملة.
+    لو الطرفين في shards مختلفة: _transfer_across_shards.
+    """
+    if not amount.is_finite():
+        raise ServiceError('Invalid amount')
+    if amount <= Decimal('0.00'):
+        raise ServiceError('المبلغ يجب أن يكون أكبر من صفر')
+    if from_phone == to_phone:
+        raise ServiceError('لا يمكن التحويل لنفس الرقم')
+
+    from_shard, to_shard = _phone_shard(from_phone), _phone_shard(to_phone)
+    if from_shard != to_shard:
+        return _transfer_across_shards(from_phone, to_phone, amount, from_shard, to_shard)
+
+    with sharding.use_shard(from_shard):
+        parties  = resolve_parties(from_phone, to_phone)
+        sender   = parties.get(from_phone)
+        receiver = parties.get(to_phone)
+        if not sender or not receiver:
+            raise ServiceError('العميل أو السائق غير موجود', status_code=404)
+
+        def debit():
+            return _wallet_queryset(*sender) \
+                .filter(balance__gte=amount) \
+                .update(balance=F('balance') - amount)
+
+        def credit():
+            return _wallet_queryset(*receiver).update(balance=F('balance') + amount)
+
+        # نقفل الصفوف دائماً بنفس الترتيب عشان تحويلين متعاكسين ما يعملوش deadlock
+        steps = [(sender, debit), (receiver, credit)]
+        steps.sort(key=lambda step: step[0])
+
+        with sharding.atomic():
+            for party, step in steps:
+                if step():
+                    continue
+                if step is debit:
+                    raise ServiceError('رصيد المرسل غير كافٍ')
+                raise ServiceError('محفظة المستقبل غير موجودة', status_code=404)
+
+            return Transfer.objects.create(
+                sender_phone   = from_phone,
+                receiver_phone = to_phone,
+                amount         = amount,
+            )
+
+
+def _transfer_across_shards(from_phone, to_phone, amount, from_shard, to_shard):
+    """
+    مفيش معاملة واحدة على قاعدتين: الخصم + Transfer في shard المرسل (معاملة)،
+    ثم الإضافة + Transfer في shard المستقبل (معاملة). لو الإضافة فشلت الخصم يرجع
+    بقيد عكسي في shard المرسل (compensation) والطلب يرجع بالخطأ.
+    """
+    with sharding.use_shard(from_shard):
+        sender = resolve_parties(from_phone).get(from_phone)
+    with sharding.use_shard(to_shard):
+        receiver = resolve_parties(to_phone).get(to_phone)
+    if not sender or not receiver:
+        raise ServiceError('العميل أو السائق غير موجود', status_code=404)
+
+    def debit():
+        if not _wallet_queryset(*sender).filter(balance__gte=amount).update(balance=F('balance') - amount):
+            raise ServiceError('رصيد المرسل غير كافٍ')
+        return Transfer.objects.create(sender_phone=from_phone, receiver_phone=to_phone, amount=amount)
+
+    def credit():
+        if not _wallet_queryset(*receiver).update(balance=F('balance') + amount):
+            raise ServiceError('محفظة المستقبل غير موجودة', status_code=404)
+        return Transfer.objects.create(sender_phone=from_phone, receiver_phone=to_phone, amount=amount)
+
+    def refund():
+        _wallet_queryset(*sender).update(balance=F('balance') + amount)
+        Transfer.objects.create(sender_phone=to_phone, receiver_phone=from_phone, amount=amount)
+
+    try:
+        transfer, _ = sharding.cross_shard(from_shard, to_shard, debit, credit, refund)
+    except sharding.CompensationError:
+        logger.exception("cross-shard transfer %s -> %s (%s) left unbalanced", from_phone, to_phone, amount)
+        raise ServiceError('فشل التحويل، برجاء التواصل مع الدعم', status_code=500)
+    except DatabaseError:
+        # الخصم اترد؛ الـ shard التاني مش متاح دلوقتي
+        raise ServiceError('الخدمة غير متاحة حاليًا، حاول مرة أخرى', status_code=503)
+    return transfer
+
+
+# ============================
+# Trip close & settlement
+# ============================
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def settlement_mode():
+    """'immediate' (يُرحَّل عند إغلاق الرحلة) أو 'batch' (يُرحَّل بأمر settle_trips)."""
+    return getattr(settings, 'PAYMENTS_SETTLEMENT_MODE', 'immediate')
+
+
+def close_trip(trip, in_zone, end_time=None):
+    """
+    إغلاق الرحلة، وفي الوضع الفوري ترحيل أجرتها لرصيد السائق.
+    """
+    trip.end_time = end_time or timezone.now()
+    trip.in_zone  = in_zone
+    with sharding.use_shard(trip._state.db):
+        trip.save(update_fields=['end_time', 'in_zone'])
+        rollups.record_trip_closed(trip)
+
+        if settlement_mode() == 'immediate':
+            settle_trip(trip)
+    return trip
+
+
+def close_active_trip(driver, in_zone, end_time=None):
+    """
+    إغلاق أحدث رحلة نشطة للسائق (إن وجدت) وإرجاعها، أو None.
+    """
+    try:
+        trip = (
+            Trip.objects
+                .filter(driver=driver, end_time__isnull=True)
+                .latest('start_time')
+        )
+    except Trip.DoesNotExist:
+        return None
+    return close_trip(trip, in_zone, end_time=end_time)
+
+
+def next_trip_sequence(driver_id, date):
+    """
+    يحجز رقم الرحلة التالي للسائق في اليوم ذرّيًا (لازم يُستدعى جوه transaction).
+    أول رحلة في اليوم تنشئ العدّاد بدايةً من أكبر رقم موجود فعلاً.
+    """
+    counter = TripSequence.objects.filter(driver_id=driver_id, date=date)
+    if not counter.update(last_number=F('last_number') + 1):
+        existing = Trip.objects.filter(driver_id=driver_id, date=date) \
+                               .aggregate(m=Max('sequence_number'))['m'] or 0
+        try:
+            with sharding.atomic():
+                TripSequence.objects.create(driver_id=driver_id, date=date, last_number=existing + 1)
+            return existing + 1
+        except IntegrityError:
+            # طلب تاني أنشأ العدّاد في نفس اللحظة
+            counter.update(last_number=F('last_number') + 1)
+    return counter.values_list('last_number', flat=True).get()
+
+
+def start_trip(driver, vehicle, route):
+    """
+    يبدأ رحلة في معاملة واحدة: حجز رقم التسلسل، إنشاء الرحلة،
+    وتحديث السائق (in_zone + assigned_route) بـ UPDATE واحد.
+    """
+    today = timezone.localdate()
+    try:
+        with sharding.use_shard(driver._state.db), sharding.atomic():
+            seq  = next_trip_sequence(driver.id, today)
+            trip = Trip.objects.create(
+                driver          = driver,
+                vehicle         = vehicle,
+                route           = route,
+                sequence_number = seq,
+                start_time      = timezone.now(),
+                in_zone         = False,
+            )
+            Driver.objects.filter(pk=driver.pk).update(in_zone=False, assigned_route=route)
+    except IntegrityError:
+        # unique_active_trip_per_vehicle
+        raise ServiceError('This vehicle already has an active trip.', status_code=409)
+
+    driver.in_zone = driver._loaded_in_zone = False
+    driver.assigned_route = route
+
+    # موقع الأتوبيس لحظة البداية غير معروف: أول حالة مؤكدة لا تنهي الرحلة
+    if driver.assigned_device_id:
+        zones.reset_state(driver.assigned_device_id)
+    return trip
+
+
+def _lock_trips(trip_ids):
+    # الترحيل والدفع على نفس الرحلة يتسلسلوا (SQLite بيسلسلهم أصلاً بـ IMMEDIATE)
+    if connections[router.db_for_write(Trip)].features.has_select_for_update:
+        list(Trip.objects.select_for_update().filter(pk__in=trip_ids).order_by('pk').values_list('pk'))
+
+
+def settle_trip(trip):
+    """
+    ينقل مجموع أجرة الرحلة من pending_balance إلى balance بـ update واحد بـ F(),
+    ويسجّل Settlement للرحلة. لو الرحلة اترحّلت قبل كده يرجع None.
+    """
+    with sharding.use_shard(trip._state.db), sharding.atomic():
+        _lock_trips([trip.id])
+        amount = Payment.objects.filter(trip=trip) \
+                                .aggregate(total=Coalesce(Sum('fare'), ZERO))['total']
+        try:
+            with sharding.atomic():
+                settlement = Settlement.objects.create(
+                    trip_id   = trip.id,
+                    driver_id = trip.driver_id,
+                    amount    = amount,
+                )
+        except IntegrityError:
+            return None
+
+        if amount:
+            DriverWallet.objects.filter(driver_id=trip.driver_id).update(
+                balance         = F('balance') + amount,
+                pending_balance = F('pending_balance') - amount,
+            )
+    return settlement
+
+
+def record_payment(customer, trip, fare, new_balance, payment_method):
+    """
+    ينشئ Payment ويضيف الأجرة لمحفظة السائق في نفس المعاملة: pending_balance لو الرحلة
+    لسه ما اترحّلتش، وإلا balance مباشرة مع زيادة مبلغ الـ Settlement بتاعها (دفعة
+    متأخرة على رحلة اتقفلت ما تفضلش في pending_balance للأبد).
+    """
+    with sharding.use_shard(trip._state.db), sharding.atomic():
+        _lock_trips([trip.id])
+        payment = Payment.objects.create(
+            customer       = customer,
+            trip           = trip,
+            fare           = fare,
+            new_balance    = new_balance,
+            payment_method = payment_method,
+        )
+        wallet = DriverWallet.objects.filter(driver_id=trip.driver_id)
+        if Settlement.objects.filter(trip_id=trip.id).update(amount=F('amount') + fare):
+            wallet.update(balance=F('balance') + fare)
+        else:
+            wallet.update(pending_balance=F('pending_balance') + fare)
+    return payment
+
+
+def settle_closed_trips(chunk_size=500):
+    """
+    وضع الدفعات: يسجّل Settlement لكل رحلة مغلقة لم تُرحّل بعد، ويحدّث محافظ السائقين
+    المعنيين بجملة UPDATE واحدة لكل chunk من الرحلات.
+    كل chunk في معاملة قصيرة (على SQLite الكتابة مقفولة طول المعاملة) بيقفل صفوف رحلاته
+    الأول: record_payment بيقفل الرحلة قبل ما يقرر pending_balance ولا balance، فدفعة
+    متأخرة يا إما تدخل في مجموع الـ chunk يا إما تشوف الـ Settlement وتروح للـ balance.
+    يرجع (batch_id, عدد الرحلات).
+    """
+    batch    = get_random_string(32)
+    # 1) الرحلات المرشحة: قراءة بس، برا أي معاملة
+    trip_ids = list(
+        Trip.objects
+            .filter(end_time__isnull=False, settlement__isnull=True)
+            .order_by('id')
+            .values_list('id', flat=True)
+    )
+    settled = 0
+    for i in range(0, len(trip_ids), chunk_size):
+        chunk = trip_ids[i:i + chunk_size]
+        with sharding.atomic():
+            # 2) قفل الرحلات ثم المجموع: ما فيش دفعة تدخل بين الحساب والترحيل
+            _lock_trips(chunk)
+            rows = (
+                Trip.objects
+                    .filter(pk__in=chunk, settlement__isnull=True)
+                    .annotate(total=Coalesce(Sum('payment__fare'), ZERO))
+                    .values_list('id', 'driver_id', 'total')
+            )
+            settlements = [
+                Settlement(trip_id=trip_id, driver_id=driver_id, amount=total, batch=batch)
+                for trip_id, driver_id, total in rows
+            ]
+            if not settlements:
+                continue
+            # ignore_conflicts: رحلة اترحّلت فوريًا في نفس اللحظة لا تدخل الدفعة
+            Settlement.objects.bulk_create(settlements, ignore_conflicts=True)
+
+            # 3) محافظ السائقين بمجموع الـ chunk ده بس
+            chunk_qs   = Settlement.objects.filter(batch=batch, trip_id__in=chunk)
+            per_driver = Subquery(
+                chunk_qs.filter(driver_id=OuterRef('driver_id'))
+                        .values('driver_id')
+                        .annotate(total=Sum('amount'))
+                        .values('total'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+            DriverWallet.objects.filter(driver_id__in=chunk_qs.values('driver_id')).update(
+                balance         = F('balance') + per_driver,
+                pending_balance = F('pending_balance') - per_driver,
+            )
+            settled += chunk_qs.count()
+    return batch, settled
+
+
+# ============================
+# Fares (update_balance / QR / payments/process/)
+# ============================
+def _uid_shard(uid):
+    if not sharding.enabled():
+        return sharding.current_shard()
+    return sharding.lookup('uid', uid) or sharding.current_shard()
+
+
+def _device_shard(device_id):
+    if not sharding.enabled():
+        return sharding.current_shard()
+    return sharding.lookup('device', device_id) or sharding.current_shard()
+
+
+def find_trip(**lookup):
+    """
+    الرحلة بـ lookup فريد (qr_token مثلاً) في الـ shard الحالي، وإلا في باقي الـ shards:
+    الـ middleware بيختار الـ shard من uid الراكب، والأتوبيس ممكن يكون في محافظة تانية.
+    """
+    current = sharding.current_shard()
+    aliases = [current, *(alias for alias in sharding.shards() if alias != current)] \
+        if sharding.enabled() else [current]
+    for alias in aliases:
+        trip = Trip.objects.using(alias).filter(**lookup).first()
+        if trip is not None:
+            return trip
+    raise Http404('No Trip matches the given query.')
+
+
+def pay_fare(uid, trip, payment_method, fare=None, new_balance=None):
+    """
+    يخصم أجرة من محفظة العميل (uid) ويسجّلها على الرحلة، بطريقة من اتنين:
+      - fare:        خصم مشروط (الرصيد >= الأجرة): QR و payments/process/
+      - new_balance: الجهاز بيبعت الرصيد الجديد والأجرة = الفرق: update_balance
+    العميل في الـ shard بتاعه (الدليل بالـ uid) والرحلة في الـ shard بتاعها:
+      - نفس الـ shard: الخصم و record_payment في معاملة واحدة
+      - shards مختلفة: زي التحويلات (sharding.cross_shard): الخصم + Payment من غير رحلة
+        في shard العميل، ثم الأجرة لـ balance السائق مباشرة + Transfer على الرحلة + التجميعات
+        في shard الرحلة. لو الإضافة فشلت الخصم يرجع والـ Payment يتشال.
+    يرجع الـ Payment (في shard العميل). عميل مش موجود = Http404.
+    """
+    if fare is not None and not (fare.is_finite() and fare >= 0):
+        raise ServiceError('Invalid fare')
+
+    customer_shard, trip_shard = _uid_shard(uid), trip._state.db
+    local = customer_shard == trip_shard
+    state = {}
+
+    def debit():
+        wallet = (CustomerWallet.objects
+                      .select_for_update()
+                      .select_related('customer')
+                      .filter(customer__uid__iexact=uid)
+                      .first())
+        if wallet is None:
+            raise Http404('No Customer matches the given query.')
+        amount  = fare if fare is not None else wallet.balance - new_balance
+        balance = wallet.balance - amount
+        if fare is not None and balance < 0:
+            raise ServiceError('رصيد العميل غير كافٍ')
+        CustomerWallet.objects.filter(pk=wallet.pk).update(balance=balance)
+
+        if local:
+            return record_payment(wallet.customer, trip, amount, balance, payment_method)
+        state['customer'] = wallet.customer
+        return Payment.objects.create(
+            customer       = wallet.customer,
+            trip           = None,
+            fare           = amount,
+            new_balance    = balance,
+            payment_method = payment_method,
+        )
+
+    if local:
+        with sharding.use_shard(trip_shard), sharding.atomic():
+            return debit()
+
+    def credit():
+        amount = state['payment'].fare
+        if not DriverWallet.objects.filter(driver_id=trip.driver_id).update(balance=F('balance') + amount):
+            raise ServiceError('محفظة السائق غير موجودة', status_code=404)
+        # مفيش Payment هنا (العميل مش في الـ shard ده): الأجرة مرحّلة فورًا وسجلها Transfer
+        # مربوط بالرحلة عشان backfill_rollups يعيد حسابها من الـ shard ده
+        transfer = Transfer.objects.create(
+            sender_phone   = state['customer'].phone,
+            receiver_phone = trip.driver.phone,
+            amount         = amount,
+            trip           = trip,
+        )
+        rollups.record_payment(Payment(trip=trip, fare=amount, timestamp=transfer.timestamp))
+
+    def refund():
+        payment = state['payment']
+        CustomerWallet.objects.filter(customer_id=payment.customer_id) \
+                              .update(balance=F('balance') + payment.fare)
+        Payment.objects.filter(pk=payment.pk).delete()
+
+    def debit_and_keep():
+        state['payment'] = debit()
+        return state['payment']
+
+    try:
+        payment, _ = sharding.cross_shard(customer_shard, trip_shard, debit_and_keep, credit, refund)
+    except sharding.CompensationError:
+        logger.exception("cross-shard fare %s on trip %s@%s left unbalanced", uid, trip.id, trip_shard)
+        raise ServiceError('فشل الدفع، برجاء التواصل مع الدعم', status_code=500)
+    except DatabaseError:
+        raise ServiceError('الخدمة غير متاحة حاليًا، حاول مرة أخرى', status_code=503)
+    return payment
+
+
+def tap_from_payload(data):
+    """
+    body الـ update_balance → (uid, action, new_balance, device_id).
+    يرفع ValueError لو البيانات غير صالحة (body مش object، uid مش نص، رصيد مش رقم).
+    """
+    if not hasattr(data, 'get'):
+        raise ValueError('body must be an object')
+    uid = data.get('uid') or ''
+    if not isinstance(uid, str):
+        raise ValueError('invalid uid')
+    try:
+        new_balance = Decimal(str(data.get('new_balance', '0.00')))
+    except InvalidOperation:
+        raise ValueError('invalid new_balance')
+    if not new_balance.is_finite():
+        raise ValueError('invalid new_balance')
+    return uid.strip(), data.get('action', 'topup'), new_balance, data.get('device_id')
+
+
+def _active_trip_for_device(device_id):
+    with sharding.use_shard(_device_shard(device_id)):
+        device = get_object_or_404(Device.objects.select_related('driver'), id=device_id)
+        driver = getattr(device, 'driver', None)
+        trip   = None
+        if driver is not None:
+            trip = (Trip.objects
+                        .filter(driver_id=driver.id, end_time__isnull=True)
+                        .order_by('-start_time')
+                        .first())
+    if trip is None:
+        raise Http404('No active trip for this device.')
+    return trip
+
+
+def apply_tap(uid, action, new_balance, device_id=None):
+    """
+    منطق update_balance للـ view العادي والـ async:
+      - topup:   رصيد المحفظة = new_balance وسجل TopUp بالفرق
+      - payment: الأجرة = الرصيد الحالي - new_balance، على الرحلة النشطة لسائق الجهاز
+    الجهاز والرحلة يتجابوا (من shard الجهاز) قبل أي كتابة، والخصم في pay_fare.
+    عميل / جهاز / رحلة مش موجودين = Http404. يرجع body الرد.
+    """
+    if action not in ('topup', 'payment'):
+        raise ServiceError('Invalid action')
+
+    if action == 'payment':
+        trip    = _active_trip_for_device(device_id)
+        payment = pay_fare(uid, trip, 'nfc', new_balance=new_balance)
+        return {
+            "status":      "paid",
+            "fare":        float(payment.fare),
+            "new_balance": float(payment.new_balance),
+        }
+
+    with sharding.use_shard(_uid_shard(uid)), sharding.atomic():
+        wallet = get_object_or_404(
+            CustomerWallet.objects.select_for_update().select_related('customer'),
+            customer__uid__iexact=uid,
+        )
+        CustomerWallet.objects.filter(pk=wallet.pk).update(balance=new_balance)
+        # سجل الشحن حتى تقدر المطابقة تربط الرصيد بالحركات
+        TopUp.objects.create(
+            customer    = wallet.customer,
+            amount      = new_balance - wallet.balance,
+            new_balance = new_balance,
+        )
+    return {"status": "recharged", "new_balance": float(new_balance)}
+
+
+# ============================
+# Device locations & zones
+# ============================
+MAX_BATCH_POINTS = 512
+
+
+def fixes_from_payload(data):
+    """
+    يحوّل body الـ JSON لقائمة (lat, lng, timestamp | None):
+      - ping واحد:  {"latitude": .., "longitude": ..}
+      - دفعة:       {"points": [{"latitude": .., "longitude": .., "timestamp": ISO | epoch}, ...]}
+    يرفع ValueError (بس) لو البيانات غير صالحة، أيًا كان شكل الـ body.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('body must be an object')
+    points = data.get('points')
+    if points is None:
+        points = [data]
+    if not isinstance(points, list) or not 0 < len(points) <= MAX_BATCH_POINTS:
+        raise ValueError('points must be a non-empty list')
+
+    fixes = []
+    for point in points:
+        if not isinstance(point, dict):
+            raise ValueError('each point must be an object')
+        ts = point.get('timestamp')
+        if isinstance(ts, (int, float)):
+            try:
+                ts = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+            except (OverflowError, OSError, ValueError):
+                raise ValueError('timestamp out of range')
+        elif isinstance(ts, str) and ts:
+            ts = parse_datetime(ts)
+            if ts is None:
+                raise ValueError('invalid timestamp')
+            if timezone.is_naive(ts):
+                ts = timezone.make_aware(ts)
+        elif ts:
+            raise ValueError('invalid timestamp')
+        try:
+            lat, lng = float(point['latitude']), float(point['longitude'])
+        except (KeyError, TypeError):
+            raise ValueError('latitude and longitude are required numbers')
+        if not (math.isfinite(lat) and math.isfinite(lng)):
+            raise ValueError('invalid coordinates')
+        fixes.append((lat, lng, ts or None))
+    return fixes
+
+
+def device_id_from_payload(data):
+    """device_id من الـ body كرقم؛ ValueError لو ناقص أو مش رقم (مش TypeError من الـ ORM)."""
+    device_id = data.get('device_id') if isinstance(data, dict) else None
+    if isinstance(device_id, bool) or not isinstance(device_id, (int, str)):
+        raise ValueError('device_id must be an integer')
+    return int(device_id)
+
+
+def ingest_fixes(device, fixes):
+    """
+    يسجّل مواقع الجهاز (bulk_create) ويمرّر المسار كله على آلة الحالات (zones.track)،
+    في معاملة واحدة بعد التأكد إن الجهاز عليه سائق ومسار:
+      - أول دخول مؤكد للمنطقة ينهي الرحلة، و end_time = وقت أول نقطة في الدخول ده
+      - in_zone للسائق = الحالة المؤكدة، ويُكتب فقط لو اتغيّرت
+
+    fixes: قائمة (lat, lng, timestamp) و timestamp ممكن يكون None (= وقت الاستلام).
+    الجهاز يُفضّل يكون محمّل بـ select_related('driver', 'zone_state').
+    يرجع (آخر DeviceLocation, in_zone بعد آخر نقطة, وقت الدخول أو None).
+    """
+    # 1) التحقق قبل أي كتابة: جهاز من غير سائق أو مسار ما يسيبش مواقع وراه
+    driver = getattr(device, 'driver', None)
+    if driver is None:
+        raise ServiceError('Device not assigned')
+    if not driver.assigned_route_id:
+        raise ServiceError('No route assigned')
+
+    now   = timezone.now()
+    fixes = sorted(((lat, lng, ts or now) for lat, lng, ts in fixes), key=lambda fix: fix[2])
+    boxes = geoindex.route_boxes(driver.assigned_route_id, using=driver._state.db)
+
+    # 2) المواقع وحالة المنطقة و in_zone وإغلاق الرحلة: كلهم أو ولا واحد
+    with sharding.atomic():
+        locations = DeviceLocation.objects.bulk_create([
+            DeviceLocation(device=device, latitude=lat, longitude=lng, timestamp=ts)
+            for lat, lng, ts in fixes
+        ])
+
+        # الانتقالات المؤكدة فقط (debounce + hysteresis) هي اللي تكتب في Driver/Trip/DriverWallet
+        confirmed, events = zones.track(device, driver.in_zone, fixes, boxes)
+        entered_at        = next((at for kind, at in events if kind == zones.ENTER), None)
+
+        in_zone = driver.in_zone if confirmed is None else confirmed
+        if in_zone != driver.in_zone:
+            # update مباشر بدل save(): الإغلاق هنا صريح وبوقت النقطة، مش من الـ signal
+            Driver.objects.filter(pk=driver.pk).update(in_zone=in_zone)
+            driver.in_zone = driver._loaded_in_zone = in_zone
+
+        if entered_at is not None:
+            close_active_trip(driver, in_zone=True, end_time=entered_at)
+
+    return locations[-1], in_zone, entered_at
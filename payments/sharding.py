@@ -0,0 +1,276 @@
+# payments/sharding.py
+
+"""
+تقسيم بيانات payments أفقيًا بالمحافظة (SHARDS / GOVERNORATE_SHARDS في settings).
+
+- كل shard قاعدة كاملة لتطبيق payments لمحافظة أو أكثر؛ المحافظات اللي مش في
+  GOVERNORATE_SHARDS تفضل في الـ default.
+- ShardDirectory (في الـ default) يربط uid / phone / device بالـ shard، ويتكاش في
+  الـ process لمدة SHARD_DIRECTORY_TTL_SECONDS.
+- Governorate و City بيانات مرجعية: أي حفظ/حذف في الـ default يتنسخ لكل الـ shards
+  (بنفس الـ pk) عشان الـ foreign keys جوه كل shard.
+- ShardRoutingMiddleware يختار الـ shard لكل طلب، والخدمات تستخدم atomic() من هنا
+  عشان المعاملة تبقى على نفس قاعدة الكتابات.
+
+بدون SHARDS كل ده ما بيعملش حاجة: current_shard() = 'default'.
+"""
+
+import json
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from myproject.middleware import on_stream_end
+from myproject.routers import _shard_alias, current_shard, sharding_enabled, use_shard
+
+from .models import City, Customer, Driver, Governorate, ShardDirectory
+
+enabled = sharding_enabled
+
+
+def shards():
+    """كل قواعد بيانات payments: الـ default + الـ shards."""
+    return [DEFAULT_DB_ALIAS, *getattr(settings, 'SHARDS', {})]
+
+
+def shard_for_governorate(governorate_id):
+    mapping = getattr(settings, 'GOVERNORATE_SHARDS', {})
+    return mapping.get(int(governorate_id), DEFAULT_DB_ALIAS) if governorate_id else DEFAULT_DB_ALIAS
+
+
+def atomic(using=None):
+    """transaction.atomic على الـ shard الحالي (أو الـ default لو التقسيم مقفول)."""
+    return transaction.atomic(using=using or current_shard())
+
+
+# ============================
+# Directory
+# ============================
+_cache      = {}   # (kind, key) -> (shard, expires_at)
+_cache_lock = threading.Lock()
+_CACHE_MAX  = 100000
+
+
+def lookup(kind, key):
+    """الـ shard بتاع uid / phone / device، أو None لو مش متسجل."""
+    if key in (None, ''):
+        return None
+    cache_key = (kind, str(key))
+    now       = time.monotonic()
+    hit       = _cache.get(cache_key)
+    if hit is not None and hit[1] > now:
+        return hit[0]
+
+    shard = (ShardDirectory.objects.using(DEFAULT_DB_ALIAS)
+             .filter(kind=kind, key=str(key))
+             .values_list('shard', flat=True).first())
+    if shard is not None:
+        with _cache_lock:
+            if len(_cache) >= _CACHE_MAX:
+                _cache.clear()
+            _cache[cache_key] = (shard, now + getattr(settings, 'SHARD_DIRECTORY_TTL_SECONDS', 300))
+    return shard
+
+
+def register(kind, key, shard):
+    if key in (None, ''):
+        return
+    ShardDirectory.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        kind=kind, key=str(key), defaults={'shard': shard})
+    with _cache_lock:
+        _cache.pop((kind, str(key)), None)
+
+
+@receiver(post_save, sender=Customer)
+def _register_customer(sender, instance, raw=False, **kwargs):
+    if enabled() and not raw:
+        shard = instance._state.db
+        register('uid', instance.uid, shard)
+        register('phone', instance.phone, shard)
+
+
+@receiver(post_save, sender=Driver)
+def _register_driver(sender, instance, raw=False, **kwargs):
+    if enabled() and not raw:
+        shard = instance._state.db
+        register('uid', instance.uid, shard)
+        register('phone', instance.phone, shard)
+        register('device', instance.assigned_device_id, shard)
+
+
+# ============================
+# Reference data fan-out
+# ============================
+@receiver(post_save, sender=Governorate)
+@receiver(post_save, sender=City)
+def _replicate_reference(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not enabled() or raw or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.SHARDS:
+        # save_base مباشرة: نفس الـ pk بدون ما الـ signal يتكرر
+        instance.save_base(using=alias, raw=True)
+    instance._state.db = DEFAULT_DB_ALIAS
+
+
+@receiver(post_delete, sender=Governorate)
+@receiver(post_delete, sender=City)
+def _delete_reference(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not enabled() or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.SHARDS:
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+# ============================
+# Middleware
+# ============================
+def _request_keys(request):
+    """المفاتيح من الـ URL و query string وجسم JSON/form (بدون ما نستهلك الـ stream)."""
+    keys = dict(request.GET.items())
+    if request.method not in ('GET', 'HEAD'):
+        if request.content_type == 'application/json':
+            try:
+                body = json.loads(request.body or b'{}')
+            except ValueError:
+                body = {}
+            if isinstance(body, dict):
+                keys.update(body)
+        elif request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+            keys.update(request.POST.items())
+    return keys
+
+
+def _token_claims(request):
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return {}
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        return AccessToken(header[len('Bearer '):])
+    except TokenError:
+        # DRF هيرفضه بعدين بالرد المعتاد
+        return {}
+
+
+def resolve_request_shard(request, view_kwargs=None):
+    """
+    أول مفتاح معروف يحدد الـ shard:
+      claim 'shard' في الـ JWT → governorate (تسجيل) → device_id → uid → phone / from_phone
+    """
+    claims = _token_claims(request)
+    if claims.get('shard'):
+        return claims['shard']
+
+    keys = {**_request_keys(request), **(view_kwargs or {})}
+    if keys.get('governorate'):
+        try:
+            return shard_for_governorate(keys['governorate'])
+        except (TypeError, ValueError):
+            pass
+    for kind, names in (('device', ('device_id',)), ('uid', ('uid',)), ('phone', ('phone', 'from_phone'))):
+        for name in names:
+            shard = lookup(kind, keys.get(name))
+            if shard:
+                return shard
+    if claims.get('uid'):
+        return lookup('uid', claims['uid'])
+    return None
+
+
+class ShardRoutingMiddleware:
+    """
+    يشتغل في process_view (بعد الـ URL resolving) ويثبّت الـ shard لباقي الطلب.
+    sync أو async (ASGI): البحث في ShardDirectory بيلمس الـ DB فبيتعمل في sync_to_async.
+    الرد الـ streaming بيقرأ وقت ما السيرفر يلف على الـ body، فالـ shard يفضل لحد الـ close.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode   = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not enabled():
+            return self.get_response(request)
+        token = _shard_alias.set(None)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _shard_alias.reset(token)
+            raise
+        return self._release(response, token)
+
+    async def __acall__(self, request):
+        if not enabled():
+            return await self.get_response(request)
+        token = _shard_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _shard_alias.reset(token)
+            raise
+        return self._release(response, token)
+
+    @staticmethod
+    def _release(response, token):
+        if not response.streaming:
+            _shard_alias.reset(token)
+            return response
+        return on_stream_end(response, lambda size: _shard_alias.set(None))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if enabled():
+            shard = resolve_request_shard(request, view_kwargs)
+            if shard:
+                # نفس الـ context بتاع __call__، فالـ reset هناك بيرجّعه
+                _shard_alias.set(shard)
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if enabled():
+            shard = await sync_to_async(resolve_request_shard)(request, view_kwargs)
+            if shard:
+                _shard_alias.set(shard)
+        return None
+
+
+# ============================
+# Cross-shard transfers
+# ============================
+class CompensationError(Exception):
+    """الخصم اتعمل والإضافة فشلت ورد الخصم كمان فشل: يحتاج تدخل يدوي."""
+
+
+def cross_shard(from_alias, to_alias, debit, credit, compensate):
+    """
+    debit() على from_alias ثم credit() على to_alias، كل واحدة في معاملتها.
+    لو credit فشلت: compensate() على from_alias ترجّع الخصم، والاستثناء الأصلي يطلع.
+    """
+    with use_shard(from_alias), atomic(from_alias):
+        debit_result = debit()
+    try:
+        with use_shard(to_alias), atomic(to_alias):
+            return debit_result, credit()
+    except Exception as exc:
+        try:
+            with use_shard(from_alias), atomic(from_alias):
+                compensate()
+        except Exception as comp_exc:
+            raise CompensationError(
+                f"credit on {to_alias} failed ({exc!r}) and refund on {from_alias} failed ({comp_exc!r})"
+            ) from comp_exc
+        raise
+
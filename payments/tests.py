@@ -0,0 +1,724 @@
+# payments/tests.py
+
+import datetime
+import io
+import json
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from myproject.middleware import gate
+
+from . import fast_serializers, fieldsets, geoindex, renderers, services, sharding, throttling, wire, zones
+from .models import (
+    City, Customer, CustomerWallet, DailyDriverStats, DailyRouteStats, Device, DeviceLocation,
+    DeviceZoneState, Driver, DriverWallet, Governorate, HourlyRidership, Payment,
+    ReconciliationCheckpoint, Route, Settlement, Stop, Transfer, Trip, TripSequence, Vehicle,
+)
+from .serializers import DriverSerializer, PaymentSerializer, TripSerializer
+
+# الـ throttling مقفول في الاختبارات: كل الطلبات من نفس الـ IP
+NO_THROTTLE = {scope: (0, 1) for scope in ('device', 'tap', 'customer', 'ip')}
+
+
+class FleetTestCase(TestCase):
+    """
+    مسار بمحطتين، عميل برصيد 100، وسائق بجهاز وأتوبيس ورحلة مفتوحة.
+    """
+    # مع PTPAY_SHARDS المحافظات والمدن بتتنسخ لكل الـ shards
+    databases = {'default', *settings.SHARDS}
+
+    @classmethod
+    def setUpTestData(cls):
+        governorate  = Governorate.objects.create(name='Cairo')
+        city         = City.objects.create(name='Nasr City', governorate=governorate)
+        cls.route    = Route.objects.create(city=city)
+        Stop.objects.create(route=cls.route, name='Start', min_lat=30.00, min_lng=31.00, max_lat=30.01, max_lng=31.01)
+        Stop.objects.create(route=cls.route, name='End',   min_lat=30.10, min_lng=31.10, max_lat=30.11, max_lng=31.11)
+
+        cls.customer = Customer.objects.create(
+            name='Rider', national_id='1' * 14, phone='0' * 11,
+            email='rider@gmail.com', password='12345678',
+        )
+        CustomerWallet.objects.filter(customer=cls.customer).update(balance=Decimal('100.00'))
+
+        cls.device  = Device.objects.create(name='validator-1')
+        cls.driver  = Driver.objects.create(
+            name='Driver', national_id='2' * 14, phone='01111111111',
+            email='driver@gmail.com', password='12345678', license_number='L-1',
+            assigned_device=cls.device, assigned_route=cls.route,
+        )
+        cls.vehicle = Vehicle.objects.create(number='B-1', driver=cls.driver)
+
+    def setUp(self):
+        # الفهرس و buckets الـ throttling في ذاكرة الـ process: نبدأ من الصفر
+        caches['default'].clear()
+        throttling._buckets = None
+        geoindex.reload_index()
+        self.trip = services.start_trip(self.driver, self.vehicle, self.route)
+
+
+# ============================
+# device/location/ query budget
+# ============================
+@override_settings(THROTTLE_BUCKETS=NO_THROTTLE)
+class DeviceLocationQueryCountTests(FleetTestCase):
+    """
+    ping عادي (مفيش انتقال منطقة ولا مرشّح) = SELECT الجهاز مع السائق وحالة المنطقة +
+    INSERT الموقع جوه معاملة ingest_fixes (SAVEPOINT / RELEASE هنا، BEGIN / COMMIT في الإنتاج)؛
+    الفهرس من الذاكرة والحالة ما بتتكتبش لأنها ما اتغيّرتش.
+    أي استعلام زيادة في المسار الساخن يبان هنا.
+    """
+    PING_QUERIES = 4
+
+    def ping_json(self, lat, lng):
+        return self.client.post(
+            '/api/device/location/',
+            json.dumps({'device_id': self.device.id, 'latitude': lat, 'longitude': lng}),
+            content_type='application/json',
+        )
+
+    def ping_binary(self, lat, lng):
+        return self.client.post(
+            '/api/device/location/bin/',
+            wire.encode_frame(self.device.id, [(lat, lng, 0)]),
+            content_type=wire.CONTENT_TYPE,
+        )
+
+    def warm_up(self, ping):
+        # أول نقطتين بيأكدوا الحالة المبدئية (BASELINE) في DeviceZoneState
+        for _ in range(2):
+            self.assertEqual(ping(30.05, 31.05).status_code, 200)
+
+    def test_json_ping(self):
+        self.warm_up(self.ping_json)
+        with self.assertNumQueries(self.PING_QUERIES):
+            response = self.ping_json(30.051, 31.051)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['in_zone'], 0)
+
+    def test_binary_ping(self):
+        self.warm_up(self.ping_binary)
+        with self.assertNumQueries(self.PING_QUERIES):
+            response = self.ping_binary(30.051, 31.051)
+        self.assertEqual(response.status_code, 200)
+        status, in_zone, accepted, _ = wire.ACK.unpack(response.content)
+        self.assertEqual((status, in_zone, accepted), (wire.STATUS_OK, 0, 1))
+
+    def test_ack_keeps_large_location_ids(self):
+        # id بعد 2^32 ما يتقصش في الـ ack
+        location_id = 2 ** 32 + 7
+        self.assertEqual(wire.ACK.unpack(wire.encode_ack(wire.STATUS_OK, location_id=location_id))[3],
+                         location_id)
+
+
+@override_settings(THROTTLE_BUCKETS=NO_THROTTLE)
+class DeviceLocationValidationTests(FleetTestCase):
+    """
+    body غلط = 400 (مش 500)، وجهاز من غير سائق ما يسيبش مواقع في الجدول.
+    """
+    def post(self, body):
+        return self.client.post('/api/device/location/', json.dumps(body), content_type='application/json')
+
+    def test_bad_payloads(self):
+        point = {'latitude': 30.05, 'longitude': 31.05}
+        for body in (
+            [point],
+            {'device_id': [self.device.id], **point},
+            {'device_id': 'x', **point},
+            {'device_id': 999, **point},
+            {'device_id': self.device.id, 'points': ['30.05,31.05']},
+            {'device_id': self.device.id, 'points': [{**point, 'timestamp': 1e20}]},
+            {'device_id': self.device.id, 'points': [{**point, 'timestamp': ['2025-01-01']}]},
+            {'device_id': self.device.id, 'latitude': None, 'longitude': 31.05},
+            {'device_id': self.device.id},
+        ):
+            self.assertEqual(self.post(body).status_code, 400, body)
+        self.assertFalse(DeviceLocation.objects.exists())
+
+    def test_unassigned_device_writes_nothing(self):
+        spare = Device.objects.create(name='validator-2')
+        response = self.post({'device_id': spare.id, 'latitude': 30.05, 'longitude': 31.05})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DeviceLocation.objects.filter(device=spare).exists())
+
+
+# ============================
+# zones (debounce + hysteresis)
+# ============================
+@override_settings(ZONE_ENTRY_MIN_FIXES=2, ZONE_ENTRY_MIN_DWELL_SECONDS=0,
+                   ZONE_EXIT_MIN_FIXES=2, ZONE_EXIT_MARGIN_DEG=0.0002)
+class ZoneTrackingTests(FleetTestCase):
+    """
+    آلة الحالات في zones.track على bbox محطة البداية، والحالة بتتقري من DeviceZoneState كل مرة
+    زي ما الـ view بيعمل.
+    """
+    BOXES = [(30.00, 30.01, 31.00, 31.01)]
+
+    def track(self, *points):
+        device = Device.objects.select_related('zone_state').get(pk=self.device.pk)
+        start  = timezone.now()
+        fixes  = [(lat, 31.005, start + datetime.timedelta(seconds=i)) for i, lat in enumerate(points)]
+        return zones.track(device, None, fixes, self.BOXES)
+
+    def test_baseline_after_reset(self):
+        # بداية الرحلة: الحالة غير معروفة، فأول تأكيد جوه المحطة BASELINE مش ENTER
+        zones.reset_state(self.device.id)
+        confirmed, events = self.track(30.005, 30.005)
+        self.assertTrue(confirmed)
+        self.assertEqual([kind for kind, _ in events], [zones.BASELINE])
+
+        confirmed, events = self.track(30.02, 30.02, 30.005, 30.005)
+        self.assertEqual([kind for kind, _ in events], [zones.EXIT, zones.ENTER])
+
+    def test_exit_margin(self):
+        zones.reset_state(self.device.id, in_zone=True)
+        before = DeviceZoneState.objects.get(device=self.device).updated_at
+
+        # برا الـ bbox بس جوه الهامش: لسه جوه، ومفيش مرشّح خروج
+        confirmed, events = self.track(30.0101, 30.0101, 30.0101)
+        self.assertEqual((confirmed, events), (True, []))
+        self.assertIsNone(DeviceZoneState.objects.get(device=self.device).candidate_in_zone)
+
+        # نقطة واحدة برا الهامش مرشّح بس، والتانية تأكّد الخروج
+        confirmed, events = self.track(30.0105)
+        self.assertTrue(confirmed)
+        state = DeviceZoneState.objects.get(device=self.device)
+        self.assertEqual((state.candidate_in_zone, state.candidate_count), (False, 1))
+        self.assertGreater(state.updated_at, before)
+
+        confirmed, events = self.track(30.0105)
+        self.assertFalse(confirmed)
+        self.assertEqual([kind for kind, _ in events], [zones.EXIT])
+
+
+# ============================
+# fast_serializers parity
+# ============================
+class FastSerializerParityTests(FleetTestCase):
+    """
+    payment_rows / driver_rows / trip_rows لازم يطلعوا نفس JSON الـ serializers الأصلية،
+    كامل ومع ?fields= / ?omit= (payments/fieldsets.py).
+    """
+    QUERIES = (
+        '',
+        '?fields=id,fare,trip.route_name,trip.vehicle.number',
+        '?omit=trip',
+        '?omit=customer_name,trip.route,trip.vehicle',
+        '?fields=id,name,vehicles,assigned_route_name',
+        '?omit=driver_photo,vehicles',
+        '?fields=id,route.stops.name,paid_passengers',
+        '?fields=nothing_here',
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        other = Vehicle.objects.create(number='B-2', driver=self.driver)
+        services.close_trip(self.trip, in_zone=True)
+        self.open_trip = services.start_trip(self.driver, other, self.route)
+        Driver.objects.filter(pk=self.driver.pk).update(driver_photo='drivers/photos/d.jpg')
+        Driver.objects.create(
+            name='Spare', national_id='3' * 14, phone='01222222222',
+            email='spare@gmail.com', password='12345678', license_number='L-2',
+        )
+        for i, trip in enumerate([self.trip, self.open_trip, None, self.open_trip]):
+            Payment.objects.create(customer=self.customer, trip=trip, fare=Decimal('7.50'),
+                                   new_balance=Decimal('100') - i, payment_method='nfc')
+
+    def assertSameJSON(self, drf, fast, query):
+        renderer = JSONRenderer()
+        self.assertEqual(json.loads(renderer.render(fast)), json.loads(renderer.render(drf)), query)
+
+    def test_payment_rows(self):
+        for query in self.QUERIES:
+            request = self.factory.get('/api/payments/' + query)
+            qs      = Payment.objects.order_by('-timestamp', '-id')
+            self.assertSameJSON(
+                PaymentSerializer(qs, many=True, context={'request': request}).data,
+                fast_serializers.payment_rows(qs, request),
+                query,
+            )
+
+    def test_driver_rows(self):
+        for query in self.QUERIES:
+            request = self.factory.get('/api/drivers/' + query)
+            qs      = Driver.objects.order_by('id')
+            self.assertSameJSON(
+                DriverSerializer(qs, many=True, context={'request': request}).data,
+                fast_serializers.driver_rows(qs, request),
+                query,
+            )
+
+    def test_trip_rows(self):
+        for query in self.QUERIES:
+            request = self.factory.get('/api/trips/' + query)
+            qs      = Trip.objects.order_by('id')
+            rows    = fast_serializers.trip_rows(qs.values_list('id', flat=True),
+                                                 fieldset=fieldsets.from_request(request))
+            self.assertSameJSON(
+                TripSerializer(qs, many=True, context={'request': request}).data,
+                [rows[pk] for pk in qs.values_list('id', flat=True)],
+                query,
+            )
+
+
+# ============================
+# exports
+# ============================
+@override_settings(THROTTLE_BUCKETS=NO_THROTTLE)
+class ExportTests(FleetTestCase):
+    """
+    حدود اليوم بتوقيت المشروع (datetime مش DATE())، ونفس الـ body تحت WSGI و ASGI.
+    """
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('finance', password='x', is_staff=True)
+        local = timezone.get_current_timezone()
+        for stamp in ('2025-01-01 00:00', '2025-01-01 23:59', '2025-01-02 00:00'):
+            payment = Payment.objects.create(customer=self.customer, trip=self.trip, fare=Decimal('7.50'),
+                                             new_balance=Decimal('92.50'), payment_method='nfc')
+            # timestamp عليه auto_now_add
+            Payment.objects.filter(pk=payment.pk).update(
+                timestamp=datetime.datetime.fromisoformat(stamp).replace(tzinfo=local))
+
+    def test_local_day_bounds(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/exports/payments/?from=2025-01-01&output=jsonl')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        stamps = [json.loads(line)['timestamp'] for line in b''.join(response.streaming_content).splitlines()]
+        # القيم بالـ UTC زي ما اتخزنت
+        self.assertEqual(stamps, ['2024-12-31T22:00:00+00:00', '2025-01-01T21:59:00+00:00'])
+
+    async def test_asgi_streams_async(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/api/exports/payments/?from=2025-01-01&to=2025-01-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 4)   # header + 3
+
+
+# ============================
+# rollups across shards
+# ============================
+@skipUnless(settings.SHARDS, "needs a shard: PTPAY_SHARDS=alias=path manage.py test payments")
+class CrossShardRollupTests(TestCase):
+    """
+    عميل على الـ default وأتوبيس على shard تاني: الأجرة تتسجل في تجميعات shard الرحلة
+    و backfill_rollups يعيد حسابها من الـ Transfer بنفس الأرقام.
+    """
+    databases = {'default', *settings.SHARDS}
+
+    def setUp(self):
+        sharding._cache.clear()
+        self.shard = next(iter(settings.SHARDS))
+        city = City.objects.create(name='Tanta', governorate=Governorate.objects.create(name='Gharbia'))
+        self.customer = Customer.objects.create(
+            name='Rider', national_id='1' * 14, phone='0' * 11,
+            email='rider@gmail.com', password='12345678',
+        )
+        CustomerWallet.objects.filter(customer=self.customer).update(balance=Decimal('100.00'))
+        with sharding.use_shard(self.shard):
+            route  = Route.objects.create(city=City.objects.get(pk=city.pk))
+            device = Device.objects.create(name='validator-1')
+            driver = Driver.objects.create(
+                name='Driver', national_id='2' * 14, phone='01111111111',
+                email='driver@gmail.com', password='12345678', license_number='L-1',
+                assigned_device=device, assigned_route=route,
+            )
+            self.trip = services.start_trip(driver, Vehicle.objects.create(number='B-1', driver=driver), route)
+
+    def rollups(self):
+        with sharding.use_shard(self.shard):
+            return (list(DailyRouteStats.objects.values_list('route_id', 'trips_closed', 'payments', 'revenue')),
+                    list(DailyDriverStats.objects.values_list('driver_id', 'trips_closed', 'payments', 'revenue')),
+                    list(HourlyRidership.objects.values_list('route_id', 'hour', 'payments', 'revenue')))
+
+    def test_backfill_keeps_cross_shard_fares(self):
+        payment = services.pay_fare(self.customer.uid, self.trip, 'nfc', fare=Decimal('7.50'))
+        self.assertIsNone(payment.trip_id)
+        live = self.rollups()
+        self.assertEqual(live[0][0][2:], (1, Decimal('7.50')))
+
+        call_command('backfill_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), live)
+
+
+# ============================
+# load shedding
+# ============================
+@override_settings(THROTTLE_BUCKETS=NO_THROTTLE, LOAD_SHED_CAPACITY=10, LOAD_SHED_WSGI_THREADS=10)
+class LoadSheddingPriorityTests(FleetTestCase):
+    """
+    worker مليان 80%: الـ GPS (نصيبه 70%) يترفض بعد ما يستنى، والدفع (100%) يدخل.
+    """
+    BUSY = 8
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(self.BUSY):
+            gate.enter('default', {'share': 1.0, 'max_in_flight': 0}, 10)
+        self.addCleanup(lambda: [gate.leave('default') for _ in range(self.BUSY)])
+
+    def test_telemetry_shed_before_fares(self):
+        response = self.client.post(
+            '/api/device/location/',
+            json.dumps({'device_id': self.device.id, 'latitude': 30.05, 'longitude': 31.05}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+        response = self.client.post(
+            '/api/payments/update_balance/',
+            json.dumps({'uid': self.customer.uid, 'action': 'payment', 'new_balance': '93.00',
+                        'device_id': self.device.id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(gate.total, self.BUSY)
+
+
+# ============================
+# FastJSONRenderer parity
+# ============================
+@skipUnless(renderers.orjson, "orjson is not installed")
+class RendererParityTests(TestCase):
+    """
+    FastJSONRenderer (orjson) قصاد JSONRenderer بتاع DRF: نفس قيم JSON حتى لو كتابة الـ float
+    اختلفت، و NaN / Infinity هي الفرق الوحيد المقصود (payments/renderers.py).
+    """
+    PAYLOADS = (
+        {'fare': Decimal('7.50'), 'balance': Decimal('-0.01'), 'big': Decimal('12345678901234.99')},
+        {'lat': 30.0444196, 'tiny': 1.5e-7, 'huge': 1e16, 'neg': -0.0, 'max': 1.7976931348623157e308},
+        {'utc': datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc),
+         'cairo': datetime.datetime(2025, 1, 1, 14, 0, 0, 123456,
+                                    tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+         'naive': datetime.datetime(2025, 1, 1, 12, 0), 'day': datetime.date(2025, 1, 1),
+         'at': datetime.time(7, 30)},
+        {'text': 'محطة رمسيس', 'sep': 'a\u2028b', 'ids': [1, 2 ** 63 - 1], 'beyond': 2 ** 70, 1: None},
+    )
+
+    def test_same_values(self):
+        drf, fast = JSONRenderer(), renderers.FastJSONRenderer()
+        for payload in self.PAYLOADS:
+            body = fast.render(payload)
+            self.assertEqual(json.loads(body), json.loads(drf.render(payload)), payload)
+            self.assertNotIn(b'\xe2\x80\xa8', body)
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'v': value})
+            self.assertEqual(renderers.FastJSONRenderer().render({'v': value}), b'{"v":null}')
+
+
+# ============================
+# admin changelists
+# ============================
+class AdminChangelistQueryTests(FleetTestCase):
+    """
+    عدد استعلامات الـ changelist ثابت مهما زادت الصفوف: Route.__str__ بيلف على المحطات،
+    و Vehicle.__str__ على السائق.
+    """
+    CHANGELISTS = ('trip', 'vehicle', 'dailyroutestats', 'hourlyridership', 'route')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+    def add_fleet(self, n):
+        start = Driver.objects.count()
+        for i in range(start, start + n):
+            route = Route.objects.create(city=self.route.city)
+            Stop.objects.create(route=route, name=f'S{i}', min_lat=0, min_lng=0, max_lat=1, max_lng=1)
+            driver = Driver.objects.create(
+                name=f'D{i}', national_id=f'{i:014d}', phone=f'015{i:08d}',
+                email=f'd{i}@gmail.com', password='12345678', license_number=f'L-{i + 10}',
+                assigned_device=Device.objects.create(name=f'v-{i}'), assigned_route=route,
+            )
+            trip = services.start_trip(driver, Vehicle.objects.create(number=f'V-{i}', driver=driver), route)
+            Payment.objects.create(customer=self.customer, trip=trip, fare=Decimal('7.50'),
+                                   new_balance=Decimal('92.50'), payment_method='nfc')
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_fleet(2)
+        counts = {}
+        for name in self.CHANGELISTS:
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(f'/admin/payments/{name}/').status_code, 200)
+            counts[name] = len(ctx.captured_queries)
+
+        self.add_fleet(5)
+        for name in self.CHANGELISTS:
+            with self.assertNumQueries(counts[name]):
+                self.client.get(f'/admin/payments/{name}/')
+
+
+# ============================
+# reconcile_wallets
+# ============================
+class ReconcileWalletsTests(FleetTestCase):
+    """
+    المطابقة بتكمل من الـ high-water marks (الحركات القديمة ما تتقراش تاني)
+    وبتطلع أي فرق بين الرصيد والحركات.
+    """
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_wallets', *args, stdout=out)
+        return out.getvalue()
+
+    def pay(self):
+        return services.pay_fare(self.customer.uid, self.trip, 'nfc', fare=Decimal('7.50'))
+
+    def test_resumes_from_checkpoint(self):
+        self.pay()
+        self.assertIn('Checked 1 wallets (1 initialised), 0 discrepancies', self.reconcile())
+
+        payment    = self.pay()
+        checkpoint = ReconciliationCheckpoint.objects.get(name='wallets')
+        self.assertIn('Checked 1 wallets (0 initialised), 0 discrepancies', self.reconcile())
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.last_payment_id, payment.id)
+        self.assertEqual(CustomerWallet.objects.get(customer=self.customer).reconciled_balance, Decimal('85.00'))
+
+        # مفيش حركات جديدة: ولا محفظة تتقري
+        self.assertIn('Checked 0 wallets', self.reconcile())
+
+    def test_reports_drift(self):
+        self.pay()
+        self.reconcile()
+        # تعديل على الرصيد من غير حركة، وبعده دفعة تخلي المحفظة تتراجع
+        CustomerWallet.objects.filter(customer=self.customer).update(balance=F('balance') + 5)
+        self.pay()
+
+        output = self.reconcile('--dry-run')
+        self.assertIn('expected 85.00 actual 90.00 drift 5.00', output)
+        self.assertIn('(dry run)', output)
+        # الـ dry run ما قدّمش الـ checkpoint: نفس الفرق يظهر تاني
+        self.assertIn('1 discrepancies', self.reconcile())
+        self.assertIn('Checked 0 wallets', self.reconcile())
+
+
+# ============================
+# transfers/
+# ============================
+class TransferTests(FleetTestCase):
+    """
+    التحويل بالهاتف: خصم مشروط + إضافة + سجل Transfer كلهم أو ولا حاجة.
+    """
+    def transfer(self, amount, to_phone='01111111111'):
+        return self.client.post(
+            '/api/transfers/',
+            json.dumps({'from_phone': self.customer.phone, 'to_phone': to_phone, 'amount': amount}),
+            content_type='application/json',
+        )
+
+    def balances(self):
+        return (CustomerWallet.objects.get(customer=self.customer).balance,
+                DriverWallet.objects.get(driver=self.driver).balance)
+
+    def test_customer_to_driver(self):
+        before = self.balances()
+        response = self.transfer('30.00')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.balances(), (before[0] - 30, before[1] + 30))
+        self.assertEqual(Transfer.objects.get().receiver_phone, self.driver.phone)
+
+    def test_second_transfer_over_balance_is_refused(self):
+        # نفس اللي بيحصل لو الاتنين جم مع بعض: الخصم المشروط (balance >= amount) بيعدّي واحد بس
+        before = self.balances()
+        self.assertEqual(self.transfer('60.00').status_code, 201)
+        self.assertEqual(self.transfer('60.00').status_code, 400)
+        self.assertEqual(self.balances(), (before[0] - 60, before[1] + 60))
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_invalid_amounts(self):
+        before = self.balances()
+        for amount in ('NaN', 'Infinity', '-Infinity', 'abc', '0', '-5'):
+            self.assertEqual(self.transfer(amount).status_code, 400, amount)
+        self.assertEqual(self.transfer('10', to_phone='01999999999').status_code, 404)
+        self.assertEqual(self.balances(), before)
+        self.assertFalse(Transfer.objects.exists())
+
+
+# ============================
+# settlement (settle_trips + late payments)
+# ============================
+@override_settings(PAYMENTS_SETTLEMENT_MODE='batch')
+class SettlementTests(FleetTestCase):
+    """
+    وضع الدفعات: الأجرة تفضل في pending_balance لحد settle_trips، ودفعة متأخرة على
+    رحلة اترحّلت تروح لـ balance مباشرة وتزود مبلغ الـ Settlement بتاعها.
+    """
+    def pay(self, trip, fare):
+        return services.pay_fare(self.customer.uid, trip, 'nfc', fare=Decimal(fare))
+
+    def wallet(self):
+        return DriverWallet.objects.values_list('balance', 'pending_balance').get(driver=self.driver)
+
+    def test_batch_settles_every_closed_trip_in_chunks(self):
+        balance, pending = self.wallet()
+        trip = self.trip
+        for _ in range(3):
+            self.pay(trip, '10.00')
+            services.close_trip(trip, in_zone=True)
+            trip = services.start_trip(self.driver, self.vehicle, self.route)
+        self.pay(trip, '5.00')   # الرحلة المفتوحة ما تترحّلش
+        self.assertEqual(self.wallet(), (balance, pending + 35))
+
+        out = io.StringIO()
+        call_command('settle_trips', '--chunk-size', '2', stdout=out)
+        self.assertIn('Settled 3 trips', out.getvalue())
+        self.assertEqual(self.wallet(), (balance + 30, pending + 5))
+        self.assertEqual(Settlement.objects.values('batch').distinct().count(), 1)
+        self.assertFalse(Settlement.objects.filter(trip=trip).exists())
+
+        # التشغيل التاني ما يلاقيش حاجة
+        self.assertEqual(services.settle_closed_trips(chunk_size=2)[1], 0)
+        self.assertEqual(self.wallet(), (balance + 30, pending + 5))
+
+    def test_late_payment_on_settled_trip_is_credited(self):
+        balance, pending = self.wallet()
+        self.pay(self.trip, '10.00')
+        services.close_trip(self.trip, in_zone=True)
+        services.settle_closed_trips()
+
+        self.pay(self.trip, '7.50')
+        self.assertEqual(self.wallet(), (balance + Decimal('17.50'), pending))
+        self.assertEqual(Settlement.objects.get(trip=self.trip).amount, Decimal('17.50'))
+
+    @override_settings(PAYMENTS_SETTLEMENT_MODE='immediate')
+    def test_immediate_mode_settles_on_close(self):
+        balance, pending = self.wallet()
+        self.pay(self.trip, '10.00')
+        services.close_trip(self.trip, in_zone=True)
+        self.assertEqual(self.wallet(), (balance + 10, pending))
+        self.assertEqual(Settlement.objects.get(trip=self.trip).batch, '')
+
+
+# ============================
+# trip sequence numbers
+# ============================
+class TripSequenceTests(FleetTestCase):
+    """
+    next_trip_sequence: أول رحلة في اليوم تنشئ العدّاد، ولو طلب تاني سبقها في إنشائه
+    (IntegrityError) تزوّده هي بـ F() وتاخد الرقم اللي بعده بدل ما تكرر رقمه.
+    """
+    def allocate(self, date):
+        with sharding.use_shard(self.driver._state.db), sharding.atomic():
+            return services.next_trip_sequence(self.driver.id, date)
+
+    def test_counter_starts_after_existing_trips(self):
+        today = self.trip.date
+        TripSequence.objects.filter(driver=self.driver).delete()
+        self.assertEqual(self.allocate(today), self.trip.sequence_number + 1)
+        self.assertEqual(self.allocate(today), self.trip.sequence_number + 2)
+
+    def test_losing_the_create_race_takes_the_next_number(self):
+        tomorrow = self.trip.date + datetime.timedelta(days=1)
+        raced    = []
+
+        def racer(execute, sql, params, many, context):
+            # طلب تاني ينشئ العدّاد بين الـ UPDATE الفاضي والـ INSERT بتاعنا
+            if not raced and 'MAX' in sql and 'sequence_number' in sql:
+                raced.append(True)
+                TripSequence.objects.create(driver=self.driver, date=tomorrow, last_number=1)
+            return execute(sql, params, many, context)
+
+        with connections[self.driver._state.db].execute_wrapper(racer):
+            self.assertEqual(self.allocate(tomorrow), 2)
+        self.assertTrue(raced)
+        self.assertEqual(TripSequence.objects.get(driver=self.driver, date=tomorrow).last_number, 2)
+
+
+# ============================
+# throttling (token buckets + X-Forwarded-For)
+# ============================
+@override_settings(THROTTLE_BUCKETS={**NO_THROTTLE, 'device': (2, 3)})
+class TokenBucketTests(SimpleTestCase):
+    """
+    burst طلبات ورا بعض تعدّي، اللي بعدها يترفض بوقت الانتظار لحد الـ token الجاي،
+    والـ bucket يتملى تاني بالـ rate. الوقت متثبّت بـ mock عشان الحساب يبقى مضبوط.
+    """
+    def setUp(self):
+        caches['default'].clear()
+        throttling._buckets = None
+        self.addCleanup(setattr, throttling, '_buckets', None)
+        self.now = 1000.0
+        for clock in ('monotonic', 'time'):
+            patcher = mock.patch.object(throttling.time, clock, lambda: self.now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assert_refill_and_deny(self):
+        for _ in range(3):
+            self.assertIsNone(throttling.check('device', 'd1'))
+        self.assertAlmostEqual(throttling.check('device', 'd1'), 0.5)
+        self.assertIsNone(throttling.check('device', 'd2'))   # كل مفتاح bucket لوحده
+
+        self.now += 0.5
+        self.assertIsNone(throttling.check('device', 'd1'))
+        self.assertAlmostEqual(throttling.check('device', 'd1'), 0.5)
+
+        self.now += 10   # ما يتملاش أكتر من الـ burst
+        for _ in range(3):
+            self.assertIsNone(throttling.check('device', 'd1'))
+        self.assertIsNotNone(throttling.check('device', 'd1'))
+
+    def test_local_buckets(self):
+        self.assertIsInstance(throttling.buckets(), throttling.LocalBuckets)
+        self.assert_refill_and_deny()
+
+    @override_settings(THROTTLE_CACHE='default')
+    def test_cache_buckets(self):
+        self.assertIsInstance(throttling.buckets(), throttling.CacheBuckets)
+        self.assert_refill_and_deny()
+
+    def test_disabled_scope_and_missing_ident_pass(self):
+        for _ in range(10):
+            self.assertIsNone(throttling.check('tap', 'd1'))
+            self.assertIsNone(throttling.check('device', None))
+
+
+@override_settings(TRUSTED_PROXIES=['10.0.0.0/8'])
+class ClientIPTests(SimpleTestCase):
+    """
+    X-Forwarded-For يتصدّق بس لو الاتصال جاي من proxy موثوق، وساعتها أول hop
+    من اليمين مش proxy هو العميل؛ اللي على الشمال العميل ممكن يزوّره.
+    """
+    def client_ip(self, remote, xff=None):
+        extra = {'REMOTE_ADDR': remote}
+        if xff is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = xff
+        return throttling.client_ip(RequestFactory().get('/', **extra))
+
+    def test_untrusted_remote_ignores_header(self):
+        self.assertEqual(self.client_ip('203.0.113.9', '198.51.100.1'), '203.0.113.9')
+
+    def test_trusted_proxy_takes_rightmost_untrusted_hop(self):
+        self.assertEqual(self.client_ip('10.0.0.2', '1.2.3.4, 198.51.100.7, 10.0.0.1'), '198.51.100.7')
+
+    def test_all_hops_trusted_or_missing(self):
+        self.assertEqual(self.client_ip('10.0.0.2', '10.1.1.1, 10.0.0.1'), '10.1.1.1')
+        self.assertEqual(self.client_ip('10.0.0.2'), '10.0.0.2')
+        self.assertEqual(self.client_ip('10.0.0.2', ' , '), '10.0.0.2')
+
+    def test_garbage_hop_is_not_trusted(self):
+        self.assertEqual(self.client_ip('10.0.0.2', '1.2.3.4, not-an-ip'), 'not-an-ip')
+
+    @override_settings(TRUSTED_PROXIES=[])
+    def test_no_trusted_proxies(self):
+        self.assertEqual(self.client_ip('10.0.0.2', '198.51.100.7'), '10.0.0.2')
@@ -0,0 +1,218 @@
+# payments/throttling.py
+
+"""
+Token buckets لكل جهاز / عميل / IP على endpoints الأجهزة (device/location/ و
+payments/update_balance/) عشان جهاز بايظ واحد ما يجوّعش باقي الأجهزة.
+
+- الخوارزمية GCRA (مكافئة لـ token bucket): لكل مفتاح رقم واحد بس، "وقت الوصول
+  النظري" للطلب الجاي، فالفحص O(1) ومن غير عدّاد لكل فترة.
+- THROTTLE_BUCKETS في settings: scope -> (طلبات في الثانية، أقصى burst). rate = 0 يقفل الـ scope.
+- THROTTLE_CACHE فاضي: الحالة في ذاكرة الـ process (لكل gunicorn worker لوحده).
+  اسم cache مشترك (Redis / Memcached) في CACHES: كل الـ workers على نفس الـ buckets.
+- DeviceRateThrottle / CustomerRateThrottle / ClientIPRateThrottle لـ views الـ DRF،
+  و check_all() / acheck_all() للـ views العادية والـ async.
+"""
+
+import ipaddress
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+
+def _bucket(scope):
+    rate, burst = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope, (0, 0))
+    return float(rate), max(1, int(burst))
+
+
+class LocalBuckets:
+    """الحالة في dict جوه الـ process، أقدم المفاتيح تتشال بعد max_keys."""
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._tat     = OrderedDict()   # key -> theoretical arrival time
+        self._lock    = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """يرجع 0 لو الطلب مسموح، وإلا عدد الثواني لحد ما يبقى فيه token."""
+        now, interval = time.monotonic(), 1.0 / rate
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            if tat - now > (burst - 1) * interval:
+                return tat - now - (burst - 1) * interval
+            self._tat[key] = tat + interval
+            self._tat.move_to_end(key)
+            if len(self._tat) > self.max_keys:
+                self._tat.popitem(last=False)
+        return 0.0
+
+
+class CacheBuckets:
+    """
+    نفس الحساب على Django cache مشترك بين الـ workers. get ثم set مش ذرّيين، فطلبين
+    متزامنين على نفس المفتاح ممكن يعدّوا الاتنين: تجاوز بسيط مقبول لحماية من الإغراق.
+    """
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, rate, burst):
+        now, interval = time.time(), 1.0 / rate
+        key = 'throttle:' + key
+        tat = max(self.cache.get(key) or now, now)
+        if tat - now > (burst - 1) * interval:
+            return tat - now - (burst - 1) * interval
+        self.cache.set(key, tat + interval, timeout=int(burst * interval) + 1)
+        return 0.0
+
+
+_buckets      = None
+_buckets_lock = threading.Lock()
+
+
+def buckets():
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                alias    = getattr(settings, 'THROTTLE_CACHE', '')
+                _buckets = CacheBuckets(alias) if alias else LocalBuckets()
+    return _buckets
+
+
+def check(scope, ident):
+    """
+    ياخد token من bucket الـ (scope, ident). يرجع None لو مسموح،
+    وإلا الثواني المطلوبة قبل المحاولة تاني (لـ Retry-After).
+    """
+    rate, burst = _bucket(scope)
+    if rate <= 0 or ident in (None, ''):
+        return None
+    wait = buckets().take(f'{scope}:{ident}', rate, burst)
+    return wait or None
+
+
+@lru_cache(maxsize=8)
+def _networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _trusted(addr):
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in _networks(tuple(getattr(settings, 'TRUSTED_PROXIES', ()))))
+
+
+def client_ip(request):
+    """
+    X-Forwarded-For يتصدّق بس لو REMOTE_ADDR نفسه proxy من TRUSTED_PROXIES؛ وساعتها
+    أول hop من اليمين مش من الـ proxies بتوعنا (اللي على الشمال العميل بيكتبه بنفسه).
+    """
+    remote = request.META.get('REMOTE_ADDR', '')
+    if not _trusted(remote):
+        return remote
+    hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else remote
+
+
+def request_value(request, name):
+    """
+    قيمة من الـ query string أو جسم JSON/form بدون ما نستهلك الـ stream
+    (الـ view لسه هيقرا request.body أو request.data بعدنا).
+    """
+    request = getattr(request, '_request', request)
+    if name in request.GET:
+        return request.GET[name]
+    if request.method != 'POST':
+        return None
+    if not hasattr(request, '_throttle_body'):
+        body = {}
+        if request.content_type == 'application/json':
+            try:
+                body = json.loads(request.body or b'{}')
+            except ValueError:
+                pass
+        elif request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+            body = request.POST
+        request._throttle_body = body if hasattr(body, 'get') else {}
+    return request._throttle_body.get(name)
+
+
+def throttled_response(wait):
+    """رد 429 للـ views اللي مش DRF (نفس شكل رد DRF)."""
+    response = JsonResponse({'detail': 'Request was throttled.'}, status=429)
+    response['Retry-After'] = str(max(1, round(wait)))
+    return response
+
+
+# ============================
+# DRF throttles
+# ============================
+class _KeyedThrottle(BaseThrottle):
+    scope = None
+
+    def get_ident(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        # طلب من غير المفتاح ده (شحن من غير device_id مثلاً) ما يتحسبش على الـ scope
+        self.wait_seconds = check(self.scope, self.get_ident(request))
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class DeviceRateThrottle(_KeyedThrottle):
+    scope = 'device'
+
+    def get_ident(self, request):
+        return request_value(request, 'device_id')
+
+
+class TapDeviceRateThrottle(DeviceRateThrottle):
+    """bucket منفصل لدفع الجهاز: إغراق الـ GPS ما يوقفش تحصيل الأجرة على نفس الأتوبيس."""
+    scope = 'tap'
+
+
+class CustomerRateThrottle(_KeyedThrottle):
+    scope = 'customer'
+
+    def get_ident(self, request):
+        uid = request_value(request, 'uid')
+        return uid.strip().lower() if isinstance(uid, str) else uid
+
+
+class ClientIPRateThrottle(_KeyedThrottle):
+    """أوسع bucket: يمسك الإغراق بمفاتيح عشوائية أو من غير مفاتيح."""
+    scope = 'ip'
+
+    def get_ident(self, request):
+        return client_ip(request)
+
+
+DEVICE_THROTTLES = [ClientIPRateThrottle, DeviceRateThrottle]
+TAP_THROTTLES    = [ClientIPRateThrottle, TapDeviceRateThrottle, CustomerRateThrottle]
+
+
+def check_all(request, throttles):
+    """نفس DEVICE_THROTTLES / TAP_THROTTLES للـ views اللي مش DRF: أطول انتظار أو None."""
+    waits = [wait for wait in (check(t.scope, t().get_ident(request)) for t in throttles) if wait]
+    return max(waits) if waits else None
+
+
+async def acheck_all(request, throttles):
+    if isinstance(buckets(), LocalBuckets):
+        # ذاكرة بس: مفيش I/O يستاهل thread
+        return check_all(request, throttles)
+    return await sync_to_async(check_all)(request, throttles)
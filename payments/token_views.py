@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from django.contrib.auth.hashers import check_password
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from . import sharding
 from .models import Customer, Driver
 
 
@@ -42,6 +43,9 @@ class PassengerTokenView(APIView):
 
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
+        if sharding.enabled():
+            # الـ shard في الـ refresh كمان عشان التوكنات المتجددة تحمله
+            refresh["shard"] = user._state.db
         access = refresh.access_token
         access["uid"] = user.uid
 
@@ -85,6 +89,9 @@ class DriverTokenView(APIView):
 
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
+        if sharding.enabled():
+            # الـ shard في الـ refresh كمان عشان التوكنات المتجددة تحمله
+            refresh["shard"] = user._state.db
         access = refresh.access_token
         access["driver_id"] = user.id
 
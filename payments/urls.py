@@ -1,8 +1,11 @@
 # ===== File: payments/urls.py =====
 
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from . import async_views
+
 
 from .views import (
     GovernorateListCreateAPIView,
@@ -13,6 +16,7 @@ from .views import (
     SingleDriverAPIView,
     VehicleListCreateAPIView,
     RouteListCreateAPIView,
+    StopLookupAPIView,
     StartTripAPIView,
     DeviceLocationUpdateAPIView,
     ProcessPaymentAPIView,
@@ -30,7 +34,9 @@ from .views import (
     TripPaymentsListAPIView,
     PublicQRPageView,
     CustomerPaymentsAPIView,
+    ExportAPIView,
     device_active_trip,
+    device_location_binary,
     update_balance,
     SingleDriverByUidAPIView,
     driver_make_payment,
@@ -41,6 +47,16 @@ from .views import (
 
 from .token_views import PassengerTokenView, DriverTokenView
 
+# تحت ASGI نخدم endpoints الأجهزة بالنسخ الـ async (async ORM)
+if getattr(settings, 'ASYNC_DEVICE_ENDPOINTS', False):
+    device_location_view    = async_views.device_location
+    device_active_trip_view = async_views.device_active_trip
+    update_balance_view     = async_views.update_balance
+else:
+    device_location_view    = DeviceLocationUpdateAPIView.as_view()
+    device_active_trip_view = device_active_trip
+    update_balance_view     = update_balance
+
 urlpatterns = [
     # إدارة المحافظ المنفصلة
     path('wallets/customers/', CustomerWalletAPIView.as_view(), name='customer-wallets'),
@@ -68,6 +84,7 @@ urlpatterns = [
     # Vehicles & Routes
     path('vehicles/', VehicleListCreateAPIView.as_view(), name='vehicle-list-create'),
     path('routes/',   RouteListCreateAPIView.as_view(),   name='route-list-create'),
+    path('stops/lookup/', StopLookupAPIView.as_view(),      name='stop-lookup'),
 
     # Trips
     path('trips/start/',      StartTripAPIView.as_view(),         name='start-trip'),
@@ -78,7 +95,8 @@ urlpatterns = [
     path('payments/trip/',    TripPaymentsListAPIView.as_view(), name='trip-payments'),
 
     # Device location
-    path('device/location/', DeviceLocationUpdateAPIView.as_view(), name='device-location'),
+    path('device/location/', device_location_view, name='device-location'),
+    path('device/location/bin/', device_location_binary, name='device-location-binary'),
 
     # Payments & transfers
     path('payments/process/', ProcessPaymentAPIView.as_view(), name='process-payment'),
@@ -92,10 +110,11 @@ urlpatterns = [
     path('qr-uid-payment/',  qr_uid_payment,                     name='qr-uid-payment'),
      # ... المسارات الموجودة
     path('customers/<str:uid>/payments/', CustomerPaymentsAPIView.as_view(), name='customer-payments'),
+    path('exports/<str:dataset>/', ExportAPIView.as_view(), name='export'),
 
-    path('device/active-trip/',device_active_trip,name='device-active-trip'),
+    path('device/active-trip/',device_active_trip_view,name='device-active-trip'),
 
-    path('payments/update_balance/', update_balance, name='update-balance'),
+    path('payments/update_balance/', update_balance_view, name='update-balance'),
 
     path('driver/uid/<str:uid>/', SingleDriverByUidAPIView.as_view(), name='driver-by-uid'),
 
@@ -1,38 +1,45 @@
 # File: payments/views.py
 
+import datetime
 import io
 import json
-import qrcode
-from decimal import Decimal
+import math
+from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.contrib.contenttypes.models import ContentType
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import ListCreateAPIView, RetrieveAPIView, ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.decorators import api_view
-from rest_framework.decorators import permission_classes
+from rest_framework.decorators import permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 
 
 
+from . import exports, fast_serializers, fieldsets, geoindex, sharding, throttling, wire, zones
 from .auth import DriverJWTAuthentication
 from .models import (
     Governorate, City, Customer, Driver,
     Vehicle, Route, Trip, Payment,
-    Device, DeviceLocation,
-    CustomerWallet, DriverWallet, Transfer,
+    Device,
+    CustomerWallet, DriverWallet,
     Driver,
 )
+from .services import (
+    ServiceError, transfer_balance, apply_tap, tap_from_payload,
+    close_trip, ingest_fixes, fixes_from_payload, device_id_from_payload,
+    find_trip, pay_fare, start_trip,
+)
 from .serializers import (
     GovernorateSerializer, CitySerializer,
     CustomerSerializer, DriverSerializer,
@@ -97,7 +104,7 @@ class PublicQRPageView(View):
 
 
 
-class CustomerWalletAPIView(ListAPIView):
+class CustomerWalletAPIView(fieldsets.SparseQuerysetMixin, ListAPIView):
     serializer_class       = CustomerWalletSerializer
     permission_classes     = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
@@ -109,7 +116,7 @@ class CustomerWalletAPIView(ListAPIView):
         return qs
 
 
-class DriverWalletAPIView(ListAPIView):
+class DriverWalletAPIView(fieldsets.SparseQuerysetMixin, ListAPIView):
     serializer_class       = DriverWalletSerializer
     permission_classes     = [IsAuthenticated]
     authentication_classes = [DriverJWTAuthentication]
@@ -134,11 +141,12 @@ class ActiveTripAPIView(APIView):
             ).latest('start_time')
         except Trip.DoesNotExist:
             return Response({'error': 'No active trip.'}, status=status.HTTP_404_NOT_FOUND)
-        return Response(TripSerializer(trip).data)
+        return Response(TripSerializer(trip, fieldset=fieldsets.from_request(request)).data)
 
 
-class TripPaymentsListAPIView(ListAPIView):
+class TripPaymentsListAPIView(fieldsets.SparseQuerysetMixin, fast_serializers.FastListMixin, ListAPIView):
     serializer_class       = PaymentSerializer
+    fast_rows              = staticmethod(fast_serializers.payment_rows)
     permission_classes     = [IsAuthenticated]
     authentication_classes = [DriverJWTAuthentication]
 
@@ -147,12 +155,12 @@ class TripPaymentsListAPIView(ListAPIView):
         return Payment.objects.filter(trip_id=trip_id)
 
 
-class GovernorateListCreateAPIView(ListCreateAPIView):
+class GovernorateListCreateAPIView(fieldsets.SparseQuerysetMixin, ListCreateAPIView):
     queryset         = Governorate.objects.all()
     serializer_class = GovernorateSerializer
 
 
-class CityListCreateAPIView(ListCreateAPIView):
+class CityListCreateAPIView(fieldsets.SparseQuerysetMixin, ListCreateAPIView):
     queryset         = City.objects.all()
     serializer_class = CitySerializer
 
@@ -163,39 +171,72 @@ class CityListCreateAPIView(ListCreateAPIView):
         return qs
 
 
-class CustomerListCreateAPIView(ListCreateAPIView):
+class CustomerListCreateAPIView(fieldsets.SparseQuerysetMixin, ListCreateAPIView):
     queryset         = Customer.objects.all()
     serializer_class = CustomerSerializer
 
 
-class SingleCustomerAPIView(RetrieveAPIView):
+class SingleCustomerAPIView(fieldsets.SparseQuerysetMixin, RetrieveAPIView):
     queryset         = Customer.objects.all()
     serializer_class = CustomerSerializer
     lookup_field     = 'uid'
     lookup_url_kwarg = 'uid'
 
 
-class DriverListCreateAPIView(ListCreateAPIView):
+class DriverListCreateAPIView(fieldsets.SparseQuerysetMixin, fast_serializers.FastListMixin, ListCreateAPIView):
     queryset         = Driver.objects.all()
     serializer_class = DriverSerializer
+    fast_rows        = staticmethod(fast_serializers.driver_rows)
 
 
-class SingleDriverAPIView(RetrieveAPIView):
+class SingleDriverAPIView(fieldsets.SparseQuerysetMixin, RetrieveAPIView):
     queryset         = Driver.objects.all()
     serializer_class = DriverSerializer
     lookup_field     = 'id'
 
 
-class VehicleListCreateAPIView(ListCreateAPIView):
+class VehicleListCreateAPIView(fieldsets.SparseQuerysetMixin, ListCreateAPIView):
     queryset         = Vehicle.objects.all()
     serializer_class = VehicleSerializer
 
 
-class RouteListCreateAPIView(ListCreateAPIView):
+class RouteListCreateAPIView(fieldsets.SparseQuerysetMixin, ListCreateAPIView):
     queryset         = Route.objects.all()
     serializer_class = RouteSerializer
 
 
+class StopLookupAPIView(APIView):
+    """
+    GET /api/stops/lookup/?lat=..&lng=..[&route_id=..]
+    GET /api/stops/lookup/?min_lat=..&min_lng=..&max_lat=..&max_lng=..[&route_id=..]
+    المحطات على مستوى المدينة كلها من الفهرس الشبكي في الذاكرة (payments/geoindex.py).
+    """
+    def get(self, request):
+        params = request.query_params
+
+        def coord(name):
+            # float('inf') / 'nan' بيعدّوا من float() ويكسروا حساب خلايا الشبكة
+            value = float(params[name])
+            if not math.isfinite(value):
+                raise ValueError(name)
+            return value
+
+        try:
+            route_id = int(params['route_id']) if params.get('route_id') else None
+            if 'lat' in params:
+                stops = geoindex.stops_at(coord('lat'), coord('lng'), route_id)
+            else:
+                stops = geoindex.stops_in_bbox(
+                    coord('min_lat'), coord('min_lng'),
+                    coord('max_lat'), coord('max_lng'),
+                    route_id,
+                )
+        except (KeyError, ValueError):
+            return Response({'error': 'Provide lat & lng, or min_lat, min_lng, max_lat & max_lng.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(stops)
+
+
 class StartTripAPIView(APIView):
     authentication_classes = [DriverJWTAuthentication]
     permission_classes     = [IsAuthenticated]
@@ -215,29 +256,11 @@ class StartTripAPIView(APIView):
             return Response({'error': 'المسار لا يحتوي على أية نقاط توقف (Stops).'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # حساب رقم التسلسل لليوم
-        today = timezone.localdate()
-        last  = Trip.objects.filter(driver=driver, date=today) \
-                             .order_by('-sequence_number') \
-                             .first()
-        seq   = last.sequence_number + 1 if last else 1
-
-        driver.in_zone = False
-        driver.save(update_fields=['in_zone'])
-
-        # إنشاء الرحلة بدون expected_passengers
-        trip = Trip.objects.create(
-            driver=driver,
-            vehicle=vehicle,
-            route=route,
-            sequence_number=seq,
-            start_time=timezone.now(),
-            in_zone=False,
-        )
-
-        # ربط السائق بالمسار الجديد
-        driver.assigned_route = route
-        driver.save(update_fields=['assigned_route'])
+        # رقم التسلسل + إنشاء الرحلة + تحديث السائق في معاملة واحدة
+        try:
+            trip = start_trip(driver, vehicle, route)
+        except ServiceError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
 
         return Response(TripSerializer(trip).data, status=status.HTTP_201_CREATED)
 
@@ -245,83 +268,81 @@ class StartTripAPIView(APIView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class DeviceLocationUpdateAPIView(APIView):
+    """
+    POST /api/device/location/
+    Body JSON: { "device_id": <int>, "latitude": <float>, "longitude": <float> }
+           أو: { "device_id": <int>, "points": [ {"latitude", "longitude", "timestamp"}, ... ] }
+    """
+    throttle_classes = throttling.DEVICE_THROTTLES
+
     def post(self, request):
-        # 1) قراءة البيانات من الـ body
+        # 1) قراءة البيانات من الـ body (نقطة واحدة أو دفعة نقاط)
         try:
             data   = json.loads(request.body or '{}')
-            device = get_object_or_404(Device, id=data.get('device_id'))
-            lat    = float(data.get('latitude'))
-            lng    = float(data.get('longitude'))
-        except Exception:
+            device = get_object_or_404(
+                Device.objects.select_related('driver', 'zone_state'),
+                id=device_id_from_payload(data),
+            )
+            fixes  = fixes_from_payload(data)
+        except (ValueError, Http404):
             return JsonResponse({'error': 'Invalid data'}, status=400)
 
-        # 2) حفظ الموقع
-        loc = DeviceLocation.objects.create(
-            device=device,
-            latitude=lat,
-            longitude=lng
-        )
-
-        # 3) جلب السائق والمسار المعيّن
+        # 2) حفظ المواقع وتحديث in_zone للسائق (أول دخول للمنطقة ينهي الرحلة ويرحّل الأجرة)
         try:
-            driver = device.driver
-        except Driver.DoesNotExist:
-            return JsonResponse({'error': 'Device not assigned'}, status=400)
-
-        route = driver.assigned_route
-        if not route:
-            return JsonResponse({'error': 'No route assigned'}, status=400)
-
-        # 4) تحقّق إذا دخل ضمن أي Stop
-        stops = route.stops.all()
-        in_zone = any(
-            (stop.min_lat  <= lat <= stop.max_lat  and
-             stop.min_lng  <= lng <= stop.max_lng)
-            for stop in stops
-        )
+            loc, in_zone, entered_at = ingest_fixes(device, fixes)
+        except ServiceError as exc:
+            return JsonResponse({'error': exc.message}, status=exc.status_code)
 
-        # 5) حدّث حالة in_zone في صفّ السائق
-        was_in = driver.in_zone
-        driver.in_zone = in_zone
-        driver.save(update_fields=['in_zone'])
-
-        # 6) لو انتقل للتوّ من خارج المنطقة إلى داخلها
-        if in_zone and not was_in:
-            # أ) إنهاء الرحلة الحالية
-            try:
-                trip = (
-                    Trip.objects
-                    .filter(driver=driver, end_time__isnull=True)
-                    .latest('start_time')
-                )
-                trip.end_time = timezone.now()
-                trip.in_zone  = True
-                trip.save(update_fields=['end_time', 'in_zone'])
-            except Trip.DoesNotExist:
-                pass
-
-            # ب) نقل الـ pending_balance إلى balance
-            try:
-                dw = get_object_or_404(DriverWallet, driver=driver)
-                dw.balance         += dw.pending_balance
-                dw.pending_balance  = Decimal('0.00')
-                dw.save(update_fields=['balance', 'pending_balance'])
-            except DriverWallet.DoesNotExist:
-                pass
-
-            # ج) إلغاء ربط المسار عن السائق إذا أحببت
-            # driver.assigned_route = None
-            # driver.save(update_fields=['assigned_route'])
-
-        # 7) أرسل الاستجابة
+        # 3) أرسل الاستجابة
         return JsonResponse({
             'status':      'ok',
             'in_zone':     int(in_zone),
-            'location_id': loc.id
+            'location_id': loc.id,
+            'accepted':    len(fixes),
+            'entered_at':  entered_at.isoformat() if entered_at else None,
         })
 
 
 
+@csrf_exempt
+def device_location_binary(request):
+    """
+    POST /api/device/location/bin/
+    Body: إطار ثنائي (payments/wire.py) فيه نقطة أو أكثر لنفس الجهاز.
+    نفس أثر device/location/ (حفظ المواقع، in_zone، إنهاء الرحلة) مع رد ثنائي 12 bytes.
+    """
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+
+    def ack(code, http_status, **kwargs):
+        return HttpResponse(wire.encode_ack(code, **kwargs),
+                            content_type=wire.CONTENT_TYPE, status=http_status)
+
+    try:
+        device_id, fixes = wire.decode_frame(request.body)
+    except wire.FrameError:
+        return ack(wire.STATUS_BAD_FRAME, 400)
+
+    # الـ device_id جوه الإطار، فالـ throttle بعد فك الـ header
+    wait = throttling.check('ip', throttling.client_ip(request)) or throttling.check('device', device_id)
+    if wait:
+        response = ack(wire.STATUS_THROTTLED, 429)
+        response['Retry-After'] = str(max(1, round(wait)))
+        return response
+
+    device = Device.objects.select_related('driver', 'zone_state').filter(id=device_id).first()
+    if device is None:
+        return ack(wire.STATUS_UNKNOWN, 404)
+
+    try:
+        loc, in_zone, _ = ingest_fixes(device, fixes)
+    except ServiceError:
+        return ack(wire.STATUS_NOT_ASSIGNED, 400, accepted=len(fixes))
+
+    return ack(wire.STATUS_OK, 200, in_zone=in_zone, accepted=len(fixes), location_id=loc.id)
+
+
+
 class ProcessPaymentAPIView(APIView):
     """
     POST /api/payments/process/
@@ -338,45 +359,31 @@ class ProcessPaymentAPIView(APIView):
         pm      = request.data.get('payment_method', 'unk').strip().lower()
         fare    = Decimal(request.data.get('fare', '0.00'))
 
-        # 1) جلب الرحلة
-        trip = get_object_or_404(Trip, id=trip_id)
-
-        # 2) جلب العميل
-        customer = get_object_or_404(Customer, uid__iexact=uid)
+        # 1) جلب الرحلة: في shard السائق (توكن السائق أو device_id)، مش shard الراكب
+        trip_shard = None
+        if isinstance(request.user, Driver):
+            trip_shard = request.user._state.db
+        elif request.data.get('device_id'):
+            trip_shard = sharding.lookup('device', request.data.get('device_id'))
+        trip = get_object_or_404(Trip.objects.using(trip_shard or sharding.current_shard()), id=trip_id)
 
-        # 3) منع السائق من الدفع لنفسه
+        # 2) منع السائق من الدفع لنفسه
         if trip.driver.uid and trip.driver.uid.strip().lower() == uid.lower():
             return Response({"error": "You cannot pay for your own trip."},
                             status=status.HTTP_403_FORBIDDEN)
 
-        # 4) جلب محفظة العميل وفحص الرصيد
-        customer_wallet = get_object_or_404(CustomerWallet, customer=customer)
-        if customer_wallet.balance < fare:
-            return Response({"error": "رصيد العميل غير كافٍ للدفع"},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        # 5) حساب الرصيد الجديد وإنشاء سجل الدفع
-        new_balance = customer_wallet.balance - fare
-        serializer = PaymentSerializer(data={
-            'customer':      customer.id,
-            'trip_id':     trip.id,
-            'fare':          fare,
-            'new_balance':   new_balance,
-            'payment_method': pm,
-        })
+        # 3) التحقق من الأجرة وطريقة الدفع
+        serializer = PaymentSerializer(data={'fare': fare, 'payment_method': pm},
+                                       fields='fare,payment_method')
         serializer.is_valid(raise_exception=True)
-        payment = serializer.save()
 
-        # 6) خصم الرصيد من العميل
-        customer_wallet.balance = new_balance
-        customer_wallet.save(update_fields=['balance'])
-
-        # 7) إضافة المبلغ إلى pending_balance للسائق
-        dw = get_object_or_404(DriverWallet, driver=trip.driver)
-        dw.pending_balance += fare
-        dw.save(update_fields=['pending_balance'])
+        # 4) خصم مشروط من محفظة العميل (في الـ shard بتاعه) + الدفع + محفظة السائق
+        try:
+            payment = pay_fare(uid, trip, serializer.validated_data['payment_method'], fare=fare)
+        except ServiceError as exc:
+            return Response({"error": exc.message}, status=exc.status_code)
 
-        # 8) إعادة البيانات للعميل
+        # 5) إعادة البيانات للعميل
         return Response({
             "trip_id":     trip.id,
             "fare":        float(payment.fare),
@@ -387,53 +394,27 @@ class ProcessPaymentAPIView(APIView):
 
 
 class TransferAPIView(APIView):
+    """
+    POST /api/transfers/
+    Body JSON: { "from_phone": "...", "to_phone": "...", "amount": <decimal> }
+    """
     def post(self, request):
         # استرجاع البيانات المطلوبة من الـ request
-        from_phone = request.data.get('from_phone')
-        to_phone = request.data.get('to_phone')
-        amount = Decimal(request.data.get('amount', '0.00'))
-
-        # تحقق من وجود المرسل والمستقبل
-        sender = Customer.objects.filter(phone=from_phone).first() or Driver.objects.filter(phone=from_phone).first()
-        receiver = Customer.objects.filter(phone=to_phone).first() or Driver.objects.filter(phone=to_phone).first()
-
-        # إذا لم يتم العثور على المرسل أو المستقبل
-        if not sender or not receiver:
-            return Response({'error': 'العميل أو السائق غير موجود'}, status=status.HTTP_404_NOT_FOUND)
-
-        # التحقق من الرصيد
-        if isinstance(sender, Customer):
-            sender_wallet = get_object_or_404(CustomerWallet, customer=sender)
-        else:
-            sender_wallet = get_object_or_404(DriverWallet, driver=sender)
-
-        if isinstance(receiver, Customer):
-            receiver_wallet = get_object_or_404(CustomerWallet, customer=receiver)
-        else:
-            receiver_wallet = get_object_or_404(DriverWallet, driver=receiver)
-
-        # التحقق من أن المرسل يمتلك رصيد كافٍ
-        if sender_wallet.balance < amount:
-            return Response({'error': 'رصيد المرسل غير كافٍ'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # خصم المبلغ من رصيد المرسل وإضافته إلى رصيد المستقبل
-        sender_wallet.balance -= amount
-        receiver_wallet.balance += amount
-
-        sender_wallet.save(update_fields=['balance'])
-        receiver_wallet.save(update_fields=['balance'])
-
-        # إنشاء سجل التحويل
-        ct_sw = ContentType.objects.get_for_model(sender_wallet)
-        ct_rw = ContentType.objects.get_for_model(receiver_wallet)
-
-        transfer = Transfer.objects.create(
-            sender_content_type=ct_sw,
-            sender_object_id=sender_wallet.id,
-            receiver_content_type=ct_rw,
-            receiver_object_id=receiver_wallet.id,
-            amount=amount
-        )
+        from_phone = (request.data.get('from_phone') or '').strip()
+        to_phone   = (request.data.get('to_phone') or '').strip()
+        try:
+            amount = Decimal(str(request.data.get('amount', '0.00')))
+        except InvalidOperation:
+            return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
+        # Decimal('NaN') و 'Infinity' بيعدّوا من الـ parse
+        if not amount.is_finite():
+            return Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # حل الطرفين + الخصم والإضافة + سجل التحويل في معاملة واحدة
+        try:
+            transfer = transfer_balance(from_phone, to_phone, amount)
+        except ServiceError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
 
         return Response(TransferSerializer(transfer).data, status=status.HTTP_201_CREATED)
 
@@ -441,16 +422,18 @@ class TransferAPIView(APIView):
 
 class PaymentAPIView(APIView):
     def get(self, request, *args, **kwargs):
-        qs = Customer.objects.all()
-        return Response(CustomerSerializer(qs, many=True).data)
+        fieldset = fieldsets.from_request(request)
+        qs = fieldsets.prune_queryset(Customer.objects.all(), CustomerSerializer(fieldset=fieldset))
+        return Response(CustomerSerializer(qs, many=True, fieldset=fieldset).data)
     def post(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
 class CustomerListAPIViewOriginal(APIView):
     def get(self, request, *args, **kwargs):
-        qs = Customer.objects.all()
-        return Response(CustomerSerializer(qs, many=True).data)
+        fieldset = fieldsets.from_request(request)
+        qs = fieldsets.prune_queryset(Customer.objects.all(), CustomerSerializer(fieldset=fieldset))
+        return Response(CustomerSerializer(qs, many=True, fieldset=fieldset).data)
 
 
 class QrPaymentAPIViewOriginal(APIView):
@@ -479,42 +462,23 @@ def qr_uid_payment(request):
     data  = json.loads(request.body or '{}')
     token = data.get('token')
     uid   = data.get('uid')
-    fare  = Decimal(data.get('fare', '0.00'))
+    try:
+        fare = Decimal(str(data.get('fare', '0.00')))
+    except InvalidOperation:
+        return JsonResponse({"error": "Invalid fare"}, status=400)
 
     if not token or not uid:
         return JsonResponse({"error": "Missing token or uid"}, status=400)
 
-    # 1) جلب الرحلة عن طريق التوكن
-    trip = get_object_or_404(Trip, qr_token=token)
-
-    # 2) جلب العميل ومحفظته
-    customer = get_object_or_404(Customer, uid__iexact=uid)
-    wallet   = get_object_or_404(CustomerWallet, customer=customer)
+    # 1) جلب الرحلة عن طريق التوكن (ممكن تكون في shard غير shard الراكب)
+    trip = find_trip(qr_token=token)
 
-    # 3) التحقق من الرصيد
-    if wallet.balance < fare:
-        return JsonResponse({"error": "رصيد العميل غير كافٍ"}, status=400)
-
-    # 4) حساب الرصيد الجديد
-    new_balance = wallet.balance - fare
-
-    # 5) تسجيل الدفع مربوط بالرحلة
-    Payment.objects.create(
-        customer       = customer,
-        trip           = trip,
-        fare           = fare,
-        new_balance    = new_balance,
-        payment_method = 'qr'
-    )
-
-    # 6) تحديث رصيد العميل
-    wallet.balance = new_balance
-    wallet.save(update_fields=['balance'])
-
-    # 7) إضافة الفارق إلى pending_balance لمحفظة السائق
-    dw = get_object_or_404(DriverWallet, driver=trip.driver)
-    dw.pending_balance += fare
-    dw.save(update_fields=['pending_balance'])
+    # 2) خصم مشروط من محفظة العميل + تسجيل الدفع مربوط بالرحلة + محفظة السائق
+    try:
+        payment = pay_fare(uid, trip, 'qr', fare=fare)
+    except ServiceError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status_code)
+    new_balance = payment.new_balance
 
     return JsonResponse({
         "status":      "ok",
@@ -523,6 +487,15 @@ def qr_uid_payment(request):
     }, status=200)
 
 
+def _qr_png(data):
+    # qrcode بيسحب PIL معاه (~20ms import لكل عامل): يتحمّل مع أول صورة QR بس
+    import qrcode
+
+    buf = io.BytesIO()
+    qrcode.make(data).save(buf, format="PNG")
+    return buf.getvalue()
+
+
 def generate_trip_qr(request, trip_id):
     """
     GET /api/trips/<trip_id>/generate-qr/
@@ -552,10 +525,7 @@ def generate_trip_qr(request, trip_id):
         f"&vehicleNumber={trip.vehicle.number}"
     )
 
-    img = qrcode.make(qr_data)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return HttpResponse(buf.getvalue(), content_type="image/png")
+    return HttpResponse(_qr_png(qr_data), content_type="image/png")
 
 # payments/views.py  – EndTripAPIView (بعد التعديل)
 
@@ -575,27 +545,18 @@ class EndTripAPIView(APIView):
         except Trip.DoesNotExist:
             return Response(
                 {'error': 'No active trip to end.'},
-                status=status.HTTP_404_BAD_REQUEST
+                status=status.HTTP_404_NOT_FOUND
             )
 
-        # ➤ أغلق الرحلة
-        trip.end_time = timezone.now()
-        trip.in_zone  = False     # لا نهتم بالموقع
-        trip.save(update_fields=['end_time', 'in_zone'])
+        # ➤ أغلق الرحلة ورحّل أجرتها (لا نهتم بالموقع)
+        close_trip(trip, in_zone=False)
+        if driver.assigned_device_id:
+            zones.reset_state(driver.assigned_device_id)
 
         # ➤ صفِّر in_zone في جدول السائق
         driver.in_zone = False
         driver.save(update_fields=['in_zone'])
 
-        # ✅  حوِّل pending_balance إلى balance دائماً
-        try:
-            dw = DriverWallet.objects.get(driver=driver)
-            dw.balance         += dw.pending_balance
-            dw.pending_balance  = Decimal('0.00')
-            dw.save(update_fields=['balance', 'pending_balance'])
-        except DriverWallet.DoesNotExist:
-            pass
-
         return Response(TripSerializer(trip).data)
 
 
@@ -635,19 +596,17 @@ class DriverActiveTripQRAPIView(APIView):
             f"&to={end}"
         )
 
-        img = qrcode.make(qr_data)
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        return HttpResponse(buf.getvalue(), content_type="image/png")
+        return HttpResponse(_qr_png(qr_data), content_type="image/png")
 
 
 
-class CustomerPaymentsAPIView(ListAPIView):
+class CustomerPaymentsAPIView(fieldsets.SparseQuerysetMixin, fast_serializers.FastListMixin, ListAPIView):
     """
     ListAPIView لإرجاع جميع دفعات العميل بناءً على الـ uid
     GET /api/customers/<uid>/payments/
     """
     serializer_class = PaymentSerializer
+    fast_rows        = staticmethod(fast_serializers.payment_rows)
 
     def get_queryset(self):
         uid = self.kwargs['uid']
@@ -656,6 +615,37 @@ class CustomerPaymentsAPIView(ListAPIView):
         return Payment.objects.filter(customer=customer).order_by('-timestamp')
 
 
+class ExportAPIView(APIView):
+    """
+    GET /api/exports/<dataset>/?from=2025-01-01&to=2025-01-31[&output=csv|jsonl]
+    تصدير payments / trips / transfers / locations للإدارة المالية كـ stream
+    (payments/exports.py) بذاكرة ثابتة، تحت WSGI أو ASGI، ومن كل الـ shards.
+    للـ staff فقط (جلسة الـ admin أو JWT).
+    """
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes     = [IsAdminUser]
+
+    def get(self, request, dataset):
+        params = request.query_params
+        fmt    = params.get('output', 'csv')   # 'format' محجوز لـ content negotiation في DRF
+        try:
+            date_from = datetime.date.fromisoformat(params['from'])
+            date_to   = datetime.date.fromisoformat(params.get('to', params['from']))
+            lines     = exports.stream(dataset, date_from, date_to, fmt)
+        except KeyError:
+            return Response({'error': 'from is required (YYYY-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(request._request, ASGIRequest):
+            # تحت ASGI: async iterator وإلا Django يجمع الـ body كله في list قبل الإرسال
+            lines = exports.aiterate(lines)
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(lines, content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{dataset}-{date_from}-{date_to}.{fmt}"'
+        return response
+
+
 from rest_framework.permissions import AllowAny
 import logging
 
@@ -715,67 +705,22 @@ def device_active_trip(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(throttling.TAP_THROTTLES)
 def update_balance(request):
-    uid       = request.data.get('uid', '').strip()
-    new_bal   = Decimal(request.data.get('new_balance', '0.00'))
-    action    = request.data.get('action', 'topup')
-    device_id = request.data.get('device_id')  # لازم ترسل device_id
-
-    # 1) جلب العميل ومحفظته
-    customer = get_object_or_404(Customer, uid__iexact=uid)
-    wallet   = get_object_or_404(CustomerWallet, customer=customer)
-
-    if action == 'topup':
-        # شحن الرصيد فقط
-        wallet.balance = new_bal
-        wallet.save(update_fields=['balance'])
-        return Response({
-            "status":      "recharged",
-            "new_balance": float(wallet.balance)
-        }, status=200)
-
-    elif action == 'payment':
-        # 2) احفظ الرصيد القديم وحسب المبلغ المدفوع
-        old_balance = wallet.balance
-        fare        = old_balance - new_bal
-
-        # 3) خصم الرصيد
-        wallet.balance = new_bal
-        wallet.save(update_fields=['balance'])
-
-        # 4) جلب الجهاز والسائق
-        device = get_object_or_404(Device, id=device_id)
-        driver = device.driver
-
-        # 5) جلب الرحلة النشطة للسائق
-        trip = (
-            Trip.objects
-                .filter(driver=driver, end_time__isnull=True)
-                .latest('start_time')
-        )
-
-        # 6) إنشاء سجل الدفع
-        Payment.objects.create(
-            customer       = customer,
-            trip           = trip,
-            fare           = fare,
-            new_balance    = new_bal,
-            payment_method = 'nfc',
-        )
-
-        # 7) إضافة إلى pending_balance للسائق
-        dw = get_object_or_404(DriverWallet, driver=driver)
-        dw.pending_balance += fare
-        dw.save(update_fields=['pending_balance'])
-
-        return Response({
-            "status":      "paid",
-            "fare":        float(fare),
-            "new_balance": float(wallet.balance)
-        }, status=200)
+    """
+    POST /api/payments/update_balance/
+    Body JSON: { "uid": "...", "new_balance": <decimal>, "action": "topup" | "payment", "device_id": <int> }
+    المنطق كله في services.apply_tap (نفس النسخة الـ async).
+    """
+    try:
+        uid, action, new_bal, device_id = tap_from_payload(request.data)
+    except ValueError:
+        return Response({"error": "Invalid data"}, status=400)
 
-    else:
-        return Response({"error": "Invalid action"}, status=400)
+    try:
+        return Response(apply_tap(uid, action, new_bal, device_id), status=200)
+    except ServiceError as exc:
+        return Response({"error": exc.message}, status=exc.status_code)
 
 
 @api_view(['POST'])
@@ -818,7 +763,7 @@ class SingleDriverByUidAPIView(APIView):
     permission_classes = [AllowAny]  # أو IsAuthenticated إذا تبي محدد
     def get(self, request, uid, *args, **kwargs):
         driver = get_object_or_404(Driver, uid=uid)
-        serializer = DriverSerializer(driver)
+        serializer = DriverSerializer(driver, fieldset=fieldsets.from_request(request))
         return Response(serializer.data)
 
 
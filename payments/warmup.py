@@ -0,0 +1,51 @@
+# payments/warmup.py
+
+"""
+تسخين العامل بعد الـ fork وقبل أول طلب (post_worker_init في gunicorn_asgi.conf.py و gunicorn_wsgi.conf.py)،
+عشان أول طلبات العامل الجديد وقت الـ autoscaling ما تدفعش تمن التحميل:
+  1) الـ URL resolver (أول resolve بيبني كل الـ patterns)
+  2) فهرس المحطات (payments/geoindex.py) لكل shard: المسارات ومحطاتها وصناديق الـ geofence
+خطوة تفشل (قاعدة مش جاهزة مثلاً) بتتسجل وتتساب: العامل يكمل بالتحميل الكسول العادي.
+"""
+
+import json
+import logging
+import time
+
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+from . import geoindex, sharding
+
+logger = logging.getLogger('ptpay.warmup')
+
+
+def _urls():
+    return len(get_resolver().reverse_dict)
+
+
+def _stops():
+    return sum(len(geoindex.reload_index(alias).stops) for alias in sharding.shards())
+
+
+STEPS = (
+    ('urls',  _urls),
+    ('stops', _stops),
+)
+
+
+def warm_up():
+    """يشغّل STEPS بالترتيب ويرجع {step: {'ms', 'items'}} (items = None لو فشلت)."""
+    report = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            items = step()
+        except DatabaseError as exc:
+            logger.warning("warm-up step %s skipped: %s", name, exc)
+            items = None
+        report[name] = {'ms': round((time.perf_counter() - started) * 1000, 2), 'items': items}
+    # اتصالات الـ thread الرئيسي مش هتخدم طلبات (الـ views في thread pool)
+    connections.close_all()
+    logger.info(json.dumps(report))
+    return report
@@ -0,0 +1,133 @@
+# payments/zones.py
+
+"""
+آلة حالات لكل جهاز لتأكيد دخول/خروج المنطقة (debounce + hysteresis)
+بدل تبديل in_zone مع كل اهتزاز في الـ GPS على حدود الـ Stop.
+
+- الدخول يتأكد بعد ZONE_ENTRY_MIN_FIXES نقطة متتالية داخل bbox
+  ومدة بقاء ZONE_ENTRY_MIN_DWELL_SECONDS من أول نقطة فيهم.
+- الخروج يتأكد بعد ZONE_EXIT_MIN_FIXES نقطة متتالية خارج bbox
+  موسّع بـ ZONE_EXIT_MARGIN_DEG (hysteresis).
+- الحالة في DeviceZoneState: نقاط الجهاز الواحد ممكن تروح لأي worker، فالحالة لازم
+  تبقى مشتركة. بتتقري مع الجهاز (select_related('zone_state')) وتتكتب بس لما تتغيّر:
+  ping عادي جوه/برا المنطقة من غير مرشّح ما بيكتبش حاجة.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DeviceZoneState
+
+ENTER    = 'enter'
+EXIT     = 'exit'
+BASELINE = 'baseline'   # أول حالة مؤكدة بعد بداية رحلة، بدون أثر على الرحلة
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _from_stamp(stamp):
+    return datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc)
+
+
+def _inside(lat, lng, boxes, margin=0.0):
+    for min_lat, max_lat, min_lng, max_lng in boxes:
+        if (min_lat - margin <= lat <= max_lat + margin and
+                min_lng - margin <= lng <= max_lng + margin):
+            return True
+    return False
+
+
+def load_state(device, default_in_zone):
+    """
+    الحالة من DeviceZoneState (من غير استعلام لو الجهاز متحمّل بـ select_related('zone_state'))،
+    وإلا من in_zone الحالي للسائق.
+    """
+    try:
+        snapshot = device.zone_state
+    except DeviceZoneState.DoesNotExist:
+        return {'confirmed': default_in_zone, 'candidate': None, 'since': None, 'count': 0}
+    return _from_snapshot(snapshot)
+
+
+def _from_snapshot(snapshot):
+    return {
+        'confirmed': snapshot.confirmed_in_zone,
+        'candidate': snapshot.candidate_in_zone,
+        'since':     snapshot.candidate_since.timestamp() if snapshot.candidate_since else None,
+        'count':     snapshot.candidate_count,
+    }
+
+
+def save_state(device_id, state, using=None):
+    since  = state['since']
+    fields = {
+        'confirmed_in_zone': state['confirmed'],
+        'candidate_in_zone': state['candidate'],
+        'candidate_since':   _from_stamp(since) if since else None,
+        'candidate_count':   state['count'],
+        # auto_now ما بيشتغلش مع update()
+        'updated_at':        timezone.now(),
+    }
+    # UPDATE واحد في العادي، والـ INSERT مرة واحدة لكل جهاز
+    states = DeviceZoneState.objects.db_manager(using)
+    if not states.filter(device_id=device_id).update(**fields):
+        states.update_or_create(device_id=device_id, defaults=fields)
+
+
+def reset_state(device_id, in_zone=None):
+    """
+    تُستدعى عند بداية/نهاية الرحلة يدويًا. in_zone=None يعني "غير معروف":
+    أول حالة مؤكدة بعدها تكون BASELINE (مثلاً الأتوبيس واقف في محطة البداية)
+    ولا تنهي الرحلة.
+    """
+    state = {'confirmed': in_zone, 'candidate': None, 'since': None, 'count': 0}
+    save_state(device_id, state)
+
+
+def track(device, default_in_zone, fixes, boxes):
+    """
+    يمرّر النقاط (lat, lng, timestamp) المرتبة زمنيًا على آلة الحالات ويكتب الحالة لو اتغيّرت.
+    يرجع (الحالة المؤكدة, [(ENTER | EXIT | BASELINE, وقت أول نقطة في الانتقال), ...]).
+    """
+    entry_fixes = _setting('ZONE_ENTRY_MIN_FIXES', 2)
+    entry_dwell = _setting('ZONE_ENTRY_MIN_DWELL_SECONDS', 0)
+    exit_fixes  = _setting('ZONE_EXIT_MIN_FIXES', 2)
+    margin      = _setting('ZONE_EXIT_MARGIN_DEG', 0.0)
+
+    state  = load_state(device, default_in_zone)
+    before = dict(state)
+    events = []
+    for lat, lng, ts in fixes:
+        confirmed = state['confirmed']
+        # hysteresis: وإحنا جوه، الخروج محسوب على bbox موسّع
+        raw_in = _inside(lat, lng, boxes, margin if confirmed else 0.0)
+
+        if raw_in == confirmed:
+            state['candidate'], state['since'], state['count'] = None, None, 0
+            continue
+
+        stamp = ts.timestamp()
+        if state['candidate'] != raw_in:
+            state['candidate'], state['since'], state['count'] = raw_in, stamp, 0
+        state['count'] += 1
+
+        if raw_in:
+            ready = state['count'] >= entry_fixes and stamp - state['since'] >= entry_dwell
+        else:
+            ready = state['count'] >= exit_fixes
+        if not ready:
+            continue
+
+        at   = _from_stamp(state['since'])
+        kind = BASELINE if confirmed is None else (ENTER if raw_in else EXIT)
+        events.append((kind, at))
+        state['confirmed'] = raw_in
+        state['candidate'], state['since'], state['count'] = None, None, 0
+
+    if state != before:
+        save_state(device.id, state, using=device._state.db)
+    return state['confirmed'], events